@@ -1,15 +1,9 @@
 """BEMServer API"""
 import flask
-import click
 
 from . import database
 from . import api
-
-
-@click.command()
-@flask.cli.with_appcontext
-def setup_db():
-    database.db.setup_tables()
+from . import commands
 
 
 def create_app(config_override=None):
@@ -25,7 +19,6 @@ def create_app(config_override=None):
 
     database.init_app(app)
     api.init_app(app)
-
-    app.cli.add_command(setup_db)
+    commands.init_app(app)
 
     return app
@@ -0,0 +1,42 @@
+"""JSON encoder"""
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONEncoder(JSONEncoder):
+    """JSON encoder using orjson
+
+    Same as Flask's encoder, except that output is always compact (unless
+    indented), non-ASCII characters are not escaped and NaN and infinity are
+    encoded as null. Subclasses of native types (e.g. OrderedDict, IntEnum)
+    are serialized natively. Types orjson does not serialize natively, as
+    well as datetimes and dataclasses, are serialized by Flask's encoder
+    default method.
+    """
+
+    def encode(self, o):
+        option = (
+            orjson.OPT_NON_STR_KEYS |
+            orjson.OPT_PASSTHROUGH_DATACLASS |
+            orjson.OPT_PASSTHROUGH_DATETIME
+        )
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
+    def iterencode(self, o, _one_shot=False):
+        yield self.encode(o)
+
+
+def init_app(app):
+    """Use orjson encoder if JSON_USE_ORJSON is set"""
+    if app.config["JSON_USE_ORJSON"]:
+        if orjson is None:
+            raise RuntimeError("JSON_USE_ORJSON requires orjson")
+        app.json_encoder = ORJSONEncoder
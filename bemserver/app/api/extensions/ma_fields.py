@@ -1,4 +1,8 @@
 """Custom marshmallow fields"""
+import base64
+import json
+import re
+
 import pytz
 
 import marshmallow as ma
@@ -19,3 +23,66 @@ class Timezone(ma.fields.String):
         if ret not in pytz.all_timezones:
             raise self.make_error("invalid")
         return ret
+
+
+class BucketWidth(ma.fields.String):
+    """A positive bucket width field.
+
+    Accepts ISO 8601 durations (e.g. "PT15M") and PostgreSQL intervals
+    (e.g. "1 hour 30 minutes").
+
+    :param args: The same positional arguments that :class:`String` receives.
+    :param kwargs: The same keyword arguments that :class:`String` receives.
+    """
+
+    #: Default error messages.
+    default_error_messages = {"invalid": "Not a valid bucket width."}
+
+    ISO_8601_RE = re.compile(
+        r"^P(?!$)(\d+Y)?(\d+M)?(\d+W)?(\d+D)?"
+        r"(T(?=\d)(\d+H)?(\d+M)?(\d+(\.\d+)?S)?)?$"
+    )
+    POSTGRESQL_RE = re.compile(
+        r"^(\s*\d+(\.\d+)?\s*"
+        r"(microsecond|millisecond|second|sec|minute|min|hour|hr|"
+        r"day|week|month|mon|year|yr)s?)+\s*$",
+        re.IGNORECASE,
+    )
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        ret = super()._deserialize(value, attr, data, **kwargs)
+        if (
+                not (
+                    self.ISO_8601_RE.match(ret) or
+                    self.POSTGRESQL_RE.match(ret)
+                ) or
+                # Zero width
+                not re.search(r"[1-9]", ret)
+        ):
+            raise self.make_error("invalid")
+        return ret
+
+
+class Cursor(ma.fields.String):
+    """An opaque pagination cursor field.
+
+    Serializes JSON-serializable values as URL-safe base64 strings.
+
+    :param args: The same positional arguments that :class:`String` receives.
+    :param kwargs: The same keyword arguments that :class:`String` receives.
+    """
+
+    #: Default error messages.
+    default_error_messages = {"invalid": "Not a valid cursor."}
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        ret = super()._deserialize(value, attr, data, **kwargs)
+        try:
+            return json.loads(base64.urlsafe_b64decode(ret.encode()))
+        except ValueError as exc:
+            raise self.make_error("invalid") from exc
@@ -1,9 +1,85 @@
 """REST API extension"""
+from copy import deepcopy
+from functools import wraps
+import http
+import json
+import warnings
 
+from flask import request
+
+import sqlalchemy as sqla
 import marshmallow as ma
 import flask_smorest
+from flask_smorest.utils import unpack_tuple_response
 import marshmallow_sqlalchemy as msa
 
+from .ma_fields import Cursor
+
+
+# Item count modes
+#   exact: count items in the DB
+#   estimate: estimate item count from query plan
+#   none: don't count items
+COUNT_MODES = ("exact", "estimate", "none")
+
+
+class PaginationParameters(flask_smorest.pagination.PaginationParameters):
+    """Holds pagination arguments
+
+    :param int page: Page number
+    :param int page_size: Page size
+    :param cursor: Keyset pagination cursor (key of the last item of
+        previous page)
+    :param str count: Item count mode
+    """
+    def __init__(self, page, page_size, cursor=None, count="exact"):
+        super().__init__(page, page_size)
+        self.cursor = cursor
+        self.count = count
+        self.next_cursor = None
+
+
+def _pagination_parameters_schema_factory(
+        def_page, def_page_size, def_max_page_size):
+    """Generate a PaginationParametersSchema"""
+
+    base_schema = (
+        flask_smorest.pagination._pagination_parameters_schema_factory(
+            def_page, def_page_size, def_max_page_size
+        )
+    )
+
+    class PaginationParametersSchema(base_schema):
+        """Deserializes pagination params into PaginationParameters"""
+
+        cursor = Cursor(
+            metadata={
+                "description": (
+                    "Keyset pagination cursor (supersedes page number)"
+                ),
+            }
+        )
+        count = ma.fields.String(
+            missing="exact",
+            validate=ma.validate.OneOf(COUNT_MODES),
+            metadata={
+                "description": "Item count mode",
+            }
+        )
+
+        @ma.post_load
+        def make_paginator(self, data, **kwargs):
+            return PaginationParameters(**data)
+
+    return PaginationParametersSchema
+
+
+class PaginationMetadataSchema(
+        flask_smorest.pagination.PaginationMetadataSchema
+):
+    """Pagination metadata schema"""
+    next_cursor = Cursor()
+
 
 class Api(flask_smorest.Api):
     """Api class"""
@@ -12,9 +88,145 @@ class Api(flask_smorest.Api):
 class Blueprint(flask_smorest.Blueprint):
     """Blueprint class"""
 
+    def paginate(self, pager=None, *,
+                 page=None, page_size=None, max_page_size=None):
+        """Decorator adding pagination to the endpoint
+
+        Same as flask-smorest's, with keyset pagination cursor and item
+        count mode parameters.
+
+        If the pager provides ETag data (see `SQLCursorPage.etag_data`), the
+        ETag is set from it and the query string before items are loaded, so
+        that an unmodified page returns 304 without loading items.
+        """
+        if page is None:
+            page = self.DEFAULT_PAGINATION_PARAMETERS['page']
+        if page_size is None:
+            page_size = self.DEFAULT_PAGINATION_PARAMETERS['page_size']
+        if max_page_size is None:
+            max_page_size = self.DEFAULT_PAGINATION_PARAMETERS['max_page_size']
+        page_params_schema = _pagination_parameters_schema_factory(
+            page, page_size, max_page_size)
+
+        parameters = {
+            'in': 'query',
+            'schema': page_params_schema,
+        }
+
+        error_status_code = (
+            self.PAGINATION_ARGUMENTS_PARSER.DEFAULT_VALIDATION_STATUS
+        )
+
+        def decorator(func):
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+
+                page_params = self.PAGINATION_ARGUMENTS_PARSER.parse(
+                    page_params_schema, request, location='query')
+
+                # Pagination in resource code: inject page_params as kwargs
+                if pager is None:
+                    kwargs['pagination_parameters'] = page_params
+
+                # Execute decorated function
+                result, status, headers = unpack_tuple_response(
+                    func(*args, **kwargs))
+
+                # Post pagination: use pager class to paginate the result
+                if pager is not None:
+                    page = pager(result, page_params=page_params)
+                    etag_data = getattr(page, "etag_data", None)
+                    if etag_data is not None:
+                        self.set_etag((
+                            etag_data,
+                            sorted(request.args.items(multi=True)),
+                        ))
+                    result = page.items
+
+                # Set pagination metadata in response
+                if self.PAGINATION_HEADER_FIELD_NAME is not None:
+                    if (
+                            page_params.item_count is None and
+                            page_params.count != "none"
+                    ):
+                        warnings.warn(
+                            'item_count not set in endpoint {}.'
+                            .format(request.endpoint)
+                        )
+                    result, headers = self._set_pagination_metadata(
+                        page_params, result, headers)
+
+                return result, status, headers
+
+            # Add pagination params to doc info in wrapper object
+            wrapper._apidoc = deepcopy(getattr(wrapper, '_apidoc', {}))
+            wrapper._apidoc['pagination'] = {
+                'parameters': parameters,
+                'response': {
+                    error_status_code:
+                    http.HTTPStatus(error_status_code).name,
+                }
+            }
+
+            return wrapper
+
+        return decorator
+
+    def _set_pagination_metadata(self, page_params, result, headers):
+        """Add pagination metadata to headers
+
+        Page numbers are only relevant when not using a cursor.
+        """
+        if headers is None:
+            headers = {}
+        page_metadata = {}
+        if page_params.item_count is not None:
+            if page_params.cursor is None:
+                page_metadata = self._make_pagination_metadata(
+                    page_params.page,
+                    page_params.page_size,
+                    page_params.item_count
+                )
+            else:
+                page_metadata["total"] = page_params.item_count
+        if page_params.next_cursor is not None:
+            page_metadata["next_cursor"] = page_params.next_cursor
+        headers[self.PAGINATION_HEADER_FIELD_NAME] = json.dumps(
+            PaginationMetadataSchema().dump(page_metadata)
+        )
+        return result, headers
+
+    def _document_pagination_metadata(self, spec, resp_doc):
+        """Document pagination metadata header"""
+        resp_doc['headers'] = {
+            self.PAGINATION_HEADER_FIELD_NAME: {
+                'description': 'Pagination metadata',
+                'schema': PaginationMetadataSchema,
+            }
+        }
+
+
+def _is_plain_field(field_obj, attribute):
+    """Return True if field value can be read directly from the object"""
+    field_cls = type(field_obj)
+    return (
+        field_cls.serialize is ma.fields.Field.serialize and
+        field_cls.get_value is ma.fields.Field.get_value and
+        field_obj._CHECK_ATTRIBUTE and
+        "." not in attribute
+    )
+
 
 class Schema(ma.Schema):
-    """Schema class"""
+    """Schema class
+
+    The API assumes missing = None/null: None values are not dumped.
+
+    Serialization is optimized for large collections: field accessors are
+    computed once per schema instance and None values are skipped in the
+    dump loop.
+    """
 
     # Ensures the fields are ordered
     set_class = ma.orderedset.OrderedSet
@@ -27,12 +239,54 @@ class Schema(ma.Schema):
         for name in loadable_fields:
             setattr(obj, name, data.get(name))
 
-    # The API assumes missing = None/null
-    @ma.post_dump
-    def remove_none_values(self, data, **kwargs):
-        return {
-            key: value for key, value in data.items() if value is not None
-        }
+    def _init_fields(self):
+        super()._init_fields()
+        # (key, field name, attribute, field, plain) for each dump field
+        # Plain fields values are read with getattr or getitem rather than
+        # field.serialize and the schema accessor
+        plain_accessor = type(self).get_attribute is ma.Schema.get_attribute
+        self._dump_accessors = []
+        for field_name, field_obj in self.dump_fields.items():
+            attribute = field_obj.attribute or field_name
+            self._dump_accessors.append((
+                field_name if field_obj.data_key is None
+                else field_obj.data_key,
+                field_name,
+                attribute,
+                field_obj,
+                plain_accessor and _is_plain_field(field_obj, attribute),
+            ))
+
+    def _serialize(self, obj, *, many=False):
+        if many and obj is not None:
+            return [self._serialize(item) for item in obj]
+        ret = self.dict_class()
+        # Same lookup as marshmallow.utils.get_value
+        getitem = hasattr(obj, "__getitem__")
+        for key, field_name, attribute, field_obj, plain in (
+                self._dump_accessors
+        ):
+            if plain:
+                if getitem:
+                    try:
+                        value = obj[attribute]
+                    except (KeyError, IndexError, TypeError, AttributeError):
+                        value = getattr(obj, attribute, ma.missing)
+                else:
+                    value = getattr(obj, attribute, ma.missing)
+                if value is ma.missing:
+                    default = field_obj.dump_default
+                    value = default() if callable(default) else default
+                    if value is ma.missing:
+                        continue
+                value = field_obj._serialize(value, field_name, obj)
+            else:
+                value = field_obj.serialize(
+                    field_name, obj, accessor=self.get_attribute)
+            if value is None or value is ma.missing:
+                continue
+            ret[key] = value
+        return ret
 
 
 class AutoSchema(msa.SQLAlchemyAutoSchema, Schema):
@@ -40,8 +294,89 @@ class AutoSchema(msa.SQLAlchemyAutoSchema, Schema):
 
 
 class SQLCursorPage(flask_smorest.Page):
-    """SQL cursor pager"""
+    """SQL cursor pager
+
+    Items are ordered by primary key (single column primary key only).
+
+    Supports offset pagination (page number) and keyset pagination (cursor:
+    key of the last item of previous page). Keyset pagination is more
+    efficient for deep pages. The cursor to the next page is returned in
+    pagination metadata.
+
+    Item count may be exact, estimated from query plan, or skipped.
+
+    If items have a version column (see `add_version_trigger`), ETag data
+    is computed from page item keys and versions and item count.
+    """
+
+    def __init__(self, collection, page_params):
+        entity = collection.column_descriptions[0]["entity"]
+        mapper = sqla.inspect(entity).mapper
+        self._key = getattr(
+            entity,
+            mapper.get_property_by_column(mapper.primary_key[0]).key
+        )
+        self._version = getattr(entity, "version", None)
+        self._query = collection
+        super().__init__(collection.order_by(self._key), page_params)
+
+    def _get_page_query(self):
+        query = self.collection
+        cursor = self.page_params.cursor
+        if cursor is None:
+            query = query.offset(self.page_params.first_item)
+        else:
+            # Exact type check: bool is a subclass of int
+            if type(cursor) is not self._key.type.python_type:
+                flask_smorest.abort(400, "Invalid cursor")
+            query = query.filter(self._key > cursor)
+        # Fetch an extra item to know whether there is a next page
+        return query.limit(self.page_params.page_size + 1)
+
+    @property
+    def etag_data(self):
+        """Data identifying page content, without loading items
+
+        Keys and versions of page items (and of next page first item) change
+        on each committed insert, update or delete affecting the page. Item
+        count is reused from pagination.
+
+        None if items have no version.
+        """
+        if self._version is None:
+            return None
+        versions = self._get_page_query().with_entities(
+            self._key, self._version).all()
+        return self.page_params.item_count, [list(row) for row in versions]
+
+    @property
+    def items(self):
+        items = self._get_page_query().all()
+        if len(items) > self.page_params.page_size:
+            items = items[:self.page_params.page_size]
+            self.page_params.next_cursor = getattr(items[-1], self._key.key)
+        return items
 
     @property
     def item_count(self):
-        return self.collection.count()
+        if self.page_params.count == "none":
+            return None
+        if self.page_params.count == "estimate":
+            return self._estimate_item_count()
+        return self._query.count()
+
+    def _estimate_item_count(self):
+        """Estimate item count from PostgreSQL query plan"""
+        statement = self._query.statement
+        connection = self._query.session.connection(
+            bind_arguments={"clause": statement}
+        )
+        # Render expanding IN parameters as individual bound parameters
+        compiled = statement.compile(
+            dialect=connection.dialect,
+            compile_kwargs={"render_postcompile": True},
+        )
+        plan = connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
@@ -1,12 +1,17 @@
 """Events resources"""
+import json
 
+from flask import Response, current_app
 from flask.views import MethodView
+import sqlalchemy as sqla
 from flask_smorest import abort
 from flask_smorest.error_handler import ErrorSchema
 
 from bemserver.core.model import (
-    EventState, EventCategory, EventLevel, EventTarget, Event)
-from bemserver.core.model.exceptions import EventError
+    EventState, EventCategory, EventLevel, EventTarget, Event, EventArchive)
+from bemserver.core.model.exceptions import (
+    EventError, EventNotFoundError, EventConflictError)
+from bemserver.core.notifications import notifier, listen
 
 from bemserver.app.api import Blueprint, SQLCursorPage
 from bemserver.app.database import db
@@ -14,7 +19,9 @@ from bemserver.app.database import db
 from .schemas import (
     EventStateSchema, EventCategorySchema, EventLevelSchema, EventTargetSchema,
     EventSchema, EventQueryArgsSchema,
-    EventPostArgsSchema, EventClosePostArgsSchema)
+    EventPostArgsSchema, EventClosePostArgsSchema,
+    EventBulkOperationSchema, EventBulkResultSchema,
+    EventStatsQueryArgsSchema, EventStatsSchema)
 
 
 blp = Blueprint(
@@ -28,73 +35,266 @@ blp = Blueprint(
 @blp.route('/states')
 class EventStatesViews(MethodView):
 
+    @db.read_only()
+    @blp.etag
     @blp.response(200, EventStateSchema(many=True))
     def get(self):
         """List event states"""
-        return db.session.query(EventState).all()
+        blp.set_etag(EventState.cache.etag)
+        return EventState.cache.rows
 
 
 @blp.route('/levels')
 class EventLevelsViews(MethodView):
 
+    @db.read_only()
+    @blp.etag
     @blp.response(200, EventLevelSchema(many=True))
     def get(self):
         """List event levels"""
-        return db.session.query(EventLevel).all()
+        blp.set_etag(EventLevel.cache.etag)
+        return EventLevel.cache.rows
 
 
 @blp.route('/targets')
 class EventTargetsViews(MethodView):
 
+    @db.read_only()
+    @blp.etag
     @blp.response(200, EventTargetSchema(many=True))
     def get(self):
         """List event targets"""
-        return db.session.query(EventTarget).all()
+        blp.set_etag(EventTarget.cache.etag)
+        return EventTarget.cache.rows
 
 
 @blp.route('/categories')
 class EventCategoriesViews(MethodView):
 
+    @db.read_only()
+    @blp.etag
     @blp.response(200, EventCategorySchema(many=True))
     def get(self):
         """List event categories"""
-        return db.session.query(EventCategory).all()
+        blp.set_etag(EventCategory.cache.etag)
+        return EventCategory.cache.rows
 
 
 @blp.route('/')
 class EventsViews(MethodView):
 
+    @db.read_only()
     @blp.etag
     @blp.arguments(EventQueryArgsSchema, location='query')
     @blp.response(200, EventSchema(many=True))
     @blp.paginate(SQLCursorPage)
     def get(self, args):
         """List events"""
-        return db.session.query(Event).filter_by(**args)
+        include_subcategories = args.pop("include_subcategories")
+        category = args.pop("category", None)
+        time_filters = {
+            name: args.pop(name)
+            for name in ("start_time", "end_time", "updated_since")
+            if name in args
+        }
+        entity = Event.get_source(
+            states=[args["state"]] if "state" in args else None,
+            start_time=time_filters.get("start_time"),
+            updated_since=time_filters.get("updated_since"),
+        )
+        query = db.session.query(entity).filter_by(**args).filter(
+            *Event.filter_time(**time_filters, entity=entity))
+        if category is not None:
+            query = query.filter(Event.filter_category(
+                category, include_subcategories, entity=entity))
+        return query
 
     @blp.etag
     @blp.arguments(EventPostArgsSchema)
     @blp.response(201, EventSchema)
+    @blp.alt_response(409, ErrorSchema)
     def post(self, new_item):
         """Add a new event
 
         Create an event with a `NEW` state.
+        Returns a *409* status code if an event with same category, source
+        and target is `NEW` or `ONGOING`.
         """
-        item = Event.open(**new_item)
-        item.save()
+        try:
+            item = Event.open(**new_item)
+        except sqla.exc.IntegrityError as exc:
+            if not _is_open_event_conflict(exc):
+                raise
+            abort(409, "An open event already exists")
+        blp.set_etag(item.version)
         return item
 
 
+@blp.route('/stats', methods=('GET',))
+@db.read_only()
+@blp.etag
+@blp.arguments(EventStatsQueryArgsSchema, location='query')
+@blp.response(200, EventStatsSchema(many=True))
+def get_stats(args):
+    """Get events statistics
+
+    Count events and compute their total and mean duration, optionally
+    grouped by some fields and by bucket of start time.
+
+    Duration of `NEW` or `ONGOING` events is computed up to their last
+    update.
+    """
+    return Event.get_stats(**args)
+
+
+@blp.route('/stream', methods=('GET',))
+@blp.arguments(
+    EventQueryArgsSchema(
+        exclude=("start_time", "end_time", "updated_since")),
+    location='query'
+)
+@blp.doc(
+    responses={
+        200: {
+            "description": "Event stream",
+            "content": {"text/event-stream": {"schema": {"type": "string"}}},
+        }
+    }
+)
+def get_stream(args):
+    """Stream event changes
+
+    Server-Sent Events stream of created and updated events matching
+    filters. Event type is the operation (`insert` or `update`) and data is
+    the event as JSON.
+
+    Comments are sent periodically to keep the connection alive.
+    """
+    keepalive = current_app.config["EVENT_STREAM_KEEPALIVE"]
+    if args.pop("include_subcategories") and "category" in args:
+        category = args.pop("category")
+        if EventCategory.subcategories_cache_enabled:
+            categories = set(EventCategory.get_subcategories(category))
+        else:
+            categories = set(db.session.execute(
+                EventCategory.select_subcategories(category)
+            ).scalars())
+    else:
+        categories = None
+    # Subscribe before responding so that no change is missed
+    subscriber = notifier.subscribe("event")
+
+    def stream():
+        try:
+            yield ": connected\n\n"
+            for payload in listen(subscriber, keepalive):
+                if payload is None:
+                    yield ": keepalive\n\n"
+                    continue
+                event = payload["event"]
+                if (
+                    all(event.get(k) == v for k, v in args.items()) and
+                    (categories is None or event["category"] in categories)
+                ):
+                    data = json.dumps(
+                        {
+                            k: v for k, v in event.items()
+                            if v is not None and k != "version"
+                        }
+                    )
+                    yield f"event: {payload['operation']}\ndata: {data}\n\n"
+        finally:
+            notifier.unsubscribe("event", subscriber)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@blp.route('/open-or-extend', methods=('POST',))
+@blp.etag
+@blp.arguments(EventPostArgsSchema)
+@blp.response(201, EventSchema)
+@blp.alt_response(200, EventSchema, description="Event extended")
+def post_open_or_extend(new_item):
+    """Open an event or extend the open event with the same target
+
+    Create an event with a `NEW` state, unless an event with same category,
+    source and target is `NEW` or `ONGOING`, in which case this event is
+    extended and a *200* status code is returned.
+    """
+    item = Event.open_or_extend(**new_item)
+    blp.set_etag(item.version)
+    # Extended events are ONGOING
+    return item, 201 if item.state == "NEW" else 200
+
+
+@blp.route('/bulk', methods=('POST',))
+@blp.arguments(EventBulkOperationSchema(many=True))
+@blp.response(200, EventBulkResultSchema(many=True))
+@blp.alt_response(409, ErrorSchema)
+def post_bulk(operations):
+    """Open, extend or close events in bulk
+
+    Operations are applied in a single transaction: events are opened
+    first, then extended, then closed.
+
+    Returns a result for each operation, in order, with a status code and
+    the event or an error message:
+
+    - `201`: success
+    - `400`: event is `CLOSED` and can not be extended
+    - `404`: event not found
+    - `409`: an event with same category, source and target is already
+      `NEW` or `ONGOING`
+
+    Returns a *422* status code if event data is invalid (unknown category,
+    level or target type), or a *409* status code if a concurrent request
+    opened a conflicting event, in which case no operation is applied.
+    """
+    try:
+        results = Event.bulk(operations)
+    except sqla.exc.IntegrityError as exc:
+        if _is_open_event_conflict(exc):
+            abort(409, "An open event already exists")
+        abort(422, "Invalid event data")
+    return [
+        {"status": 201, "event": item} if error is None else
+        {"status": _get_error_status(error), "message": str(error)}
+        for item, error in results
+    ]
+
+
+def _is_open_event_conflict(exc):
+    """Return True if an IntegrityError violates open event unique index"""
+    diag = getattr(exc.orig, "diag", None)
+    return getattr(diag, "constraint_name", None) == "ix_event_open"
+
+
+def _get_error_status(error):
+    if isinstance(error, EventNotFoundError):
+        return 404
+    if isinstance(error, EventConflictError):
+        return 409
+    return 400
+
+
 @blp.route('/<int:item_id>')
 class EventsByIdViews(MethodView):
 
     @blp.etag
     @blp.response(200, EventSchema)
     def get(self, item_id):
-        """Get en event by its ID"""
-        item = Event.get_by_id(item_id)
+        """Get en event by its ID
+
+        Archived events are also returned.
+        """
+        item = Event.get_by_id(item_id) or EventArchive.get_by_id(item_id)
         if item is None:
             abort(404)
+        blp.set_etag(item.version)
         return item
 
     @blp.etag
@@ -104,10 +304,14 @@ class EventsByIdViews(MethodView):
         item = Event.get_by_id(item_id)
         if item is None:
             abort(404)
-        blp.check_etag(item, EventSchema)
+        blp.check_etag(item.version)
         item.delete()
 
 
+def _check_etag(item):
+    blp.check_etag(item.version)
+
+
 @blp.route('/<int:item_id>/extend', methods=('PUT',))
 @blp.etag
 @blp.response(201, EventSchema)
@@ -119,14 +323,13 @@ def put_extend(item_id):
     `timestamp_last_update`.
     Returns a *400* status code if the event is `CLOSED`.
     """
-    item = Event.get_by_id(item_id)
-    if item is None:
-        abort(404)
-    blp.check_etag(item, EventSchema)
     try:
-        item.extend()
+        item = Event.extend_by_id(item_id, precondition=_check_etag)
     except EventError as exc:
         abort(400, str(exc))
+    if item is None:
+        abort(404)
+    blp.set_etag(item.version)
     return item
 
 
@@ -140,9 +343,8 @@ def put_close(args, item_id):
     Mainly change the state of the event to `CLOSED` and update
     `timestamp_last_update`. Nothing is done if the event is already `CLOSED`.
     """
-    item = Event.get_by_id(item_id)
+    item = Event.close_by_id(item_id, **args, precondition=_check_etag)
     if item is None:
         abort(404)
-    blp.check_etag(item, EventSchema)
-    item.close(**args)
+    blp.set_etag(item.version)
     return item
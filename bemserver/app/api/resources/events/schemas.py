@@ -5,8 +5,10 @@ import marshmallow_sqlalchemy as msa
 
 from bemserver.core.model import (
     EventState, EventCategory, EventLevel, EventTarget, Event)
+from bemserver.core.model.event import STATS_GROUP_BY
 
 from bemserver.app.api import Schema, AutoSchema
+from bemserver.app.api.extensions.ma_fields import Timezone, BucketWidth
 
 
 class EventStateSchema(AutoSchema):
@@ -45,6 +47,7 @@ class EventTargetSchema(AutoSchema):
 class EventSchema(AutoSchema):
     class Meta:
         table = Event.__table__
+        exclude = ("version", )
 
     id = msa.auto_field(dump_only=True)
     category = msa.auto_field()
@@ -58,13 +61,23 @@ class EventSchema(AutoSchema):
     timestamp_last_update = msa.auto_field()
 
 
+def validate_reference(model):
+    """Validate value is an ID of a cached reference table"""
+    def validate(value):
+        if value not in model.cache:
+            raise ma.ValidationError(f"Unknown {model.__tablename__}.")
+    return validate
+
+
 class EventPostArgsSchema(Schema):
 
     source = ma.fields.Str(required=True)
-    category = ma.fields.Str(required=True)
-    target_type = ma.fields.Str(required=True)
+    category = ma.fields.Str(
+        required=True, validate=validate_reference(EventCategory))
+    target_type = ma.fields.Str(
+        required=True, validate=validate_reference(EventTarget))
     target_id = ma.fields.Int(required=True)
-    level = ma.fields.Str()
+    level = ma.fields.Str(validate=validate_reference(EventLevel))
     timestamp_start = ma.fields.AwareDateTime()
     description = ma.fields.Str()
 
@@ -74,10 +87,118 @@ class EventClosePostArgsSchema(Schema):
     timestamp_end = ma.fields.AwareDateTime()
 
 
+class EventBulkOperationSchema(Schema):
+
+    action = ma.fields.Str(
+        required=True,
+        validate=ma.validate.OneOf(("open", "extend", "close")),
+    )
+    # extend, close
+    id = ma.fields.Int()
+    # open
+    source = ma.fields.Str()
+    category = ma.fields.Str(validate=validate_reference(EventCategory))
+    target_type = ma.fields.Str(validate=validate_reference(EventTarget))
+    target_id = ma.fields.Int()
+    level = ma.fields.Str(validate=validate_reference(EventLevel))
+    timestamp_start = ma.fields.AwareDateTime()
+    description = ma.fields.Str()
+    # close
+    timestamp_end = ma.fields.AwareDateTime()
+
+    REQUIRED_FIELDS = {
+        "open": ("source", "category", "target_type", "target_id"),
+        "extend": ("id", ),
+        "close": ("id", ),
+    }
+
+    @ma.validates_schema
+    def validate_required_fields(self, data, **kwargs):
+        missing = [
+            name for name in self.REQUIRED_FIELDS[data["action"]]
+            if name not in data
+        ]
+        if missing:
+            raise ma.ValidationError({
+                name: ["Missing data for required field."]
+                for name in missing
+            })
+
+
+class EventBulkResultSchema(Schema):
+
+    status = ma.fields.Int()
+    message = ma.fields.Str()
+    event = ma.fields.Nested(EventSchema)
+
+
 class EventQueryArgsSchema(Schema):
     source = ma.fields.Str()
     category = ma.fields.Str()
+    include_subcategories = ma.fields.Bool(
+        missing=False,
+        metadata={
+            "description": "Category filter also matches subcategories",
+        }
+    )
     target_type = ma.fields.Str()
     target_id = ma.fields.Int()
     level = ma.fields.Str()
     state = ma.fields.Str()
+    start_time = ma.fields.AwareDateTime(
+        metadata={
+            "description": "Start time lower bound",
+        }
+    )
+    end_time = ma.fields.AwareDateTime(
+        metadata={
+            "description": "Start time upper bound (excluded)",
+        }
+    )
+    updated_since = ma.fields.AwareDateTime(
+        metadata={
+            "description": "Last update time lower bound",
+        }
+    )
+
+
+class EventStatsQueryArgsSchema(EventQueryArgsSchema):
+    """Events statistics GET query parameters schema"""
+
+    group_by = ma.fields.List(
+        ma.fields.Str(validate=ma.validate.OneOf(STATS_GROUP_BY)),
+        missing=list,
+        metadata={
+            "description": "Fields to group events by",
+        }
+    )
+    bucket_width = BucketWidth(
+        metadata={
+            "description": (
+                "Bucket width (ISO 8601 duration or PostgreSQL). "
+                "If set, events are grouped by bucket of start time."
+            ),
+        }
+    )
+    timezone = Timezone(
+        missing="UTC",
+        metadata={
+            "description": "Timezone to use for the bucketing",
+        }
+    )
+
+
+class EventStatsSchema(Schema):
+
+    bucket = ma.fields.AwareDateTime()
+    category = ma.fields.Str()
+    level = ma.fields.Str()
+    state = ma.fields.Str()
+    target_type = ma.fields.Str()
+    count = ma.fields.Int()
+    total_duration = ma.fields.Float(
+        metadata={"description": "Total duration in seconds"}
+    )
+    mean_duration = ma.fields.Float(
+        metadata={"description": "Mean duration in seconds"}
+    )
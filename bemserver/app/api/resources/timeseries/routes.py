@@ -1,14 +1,27 @@
 """Timeseries resources"""
+import csv
+import io
 
 from flask.views import MethodView
+import marshmallow as ma
+import sqlalchemy as sqla
 from flask_smorest import abort
+from flask_smorest.error_handler import ErrorSchema
 
+from bemserver.core import timescale
 from bemserver.core.model import Timeseries
 
 from bemserver.app.api import Blueprint, SQLCursorPage
 from bemserver.app.database import db
 
-from .schemas import TimeseriesSchema, TimeseriesQueryArgsSchema
+from .schemas import (
+    TimeseriesSchema,
+    TimeseriesQueryArgsSchema,
+    TimeseriesBulkQueryArgsSchema,
+    TimeseriesBulkCSVFileSchema,
+    TimeseriesDeleteQueryArgsSchema,
+    TimeseriesDeletionSchema,
+)
 
 
 blp = Blueprint(
@@ -28,7 +41,7 @@ class TimeseriesViews(MethodView):
     @blp.paginate(SQLCursorPage)
     def get(self, args):
         """List timeseries"""
-        return db.session.query(Timeseries).filter_by(**args)
+        return db.session.query(Timeseries).filter_by(deleted=False, **args)
 
     @blp.etag
     @blp.arguments(TimeseriesSchema)
@@ -38,9 +51,72 @@ class TimeseriesViews(MethodView):
         item = Timeseries(**new_item)
         db.session.add(item)
         db.session.commit()
+        blp.set_etag(item.version)
         return item
 
 
+@blp.route('/bulk', methods=('POST', ))
+@blp.arguments(TimeseriesBulkQueryArgsSchema, location='query')
+@blp.arguments(TimeseriesSchema(many=True))
+@blp.response(201, TimeseriesSchema(many=True))
+def post_bulk(args, new_items):
+    """Add or update timeseries in bulk
+
+    Timeseries are written in a single transaction. Existing timeseries
+    with same name are updated, unless `update` is false, in which case a
+    *409* status code is returned and nothing is written.
+
+    Returns timeseries in request order.
+    """
+    return _upsert_many(new_items, update=args["update"])
+
+
+# TODO: document response
+# https://github.com/marshmallow-code/flask-smorest/issues/142
+@blp.route('/bulk/csv', methods=('POST', ))
+@blp.arguments(TimeseriesBulkQueryArgsSchema, location='query')
+@blp.arguments(TimeseriesBulkCSVFileSchema, location='files')
+@blp.response(201, TimeseriesSchema(many=True))
+def post_bulk_csv(args, files):
+    """Add or update timeseries in bulk from a CSV file
+
+    The first line contains timeseries attribute names. Empty cells are
+    considered missing.
+
+    See bulk JSON endpoint.
+    """
+    with io.TextIOWrapper(files['csv_file']) as csv_file_txt:
+        try:
+            rows = [
+                {key: val for key, val in row.items() if val != ""}
+                for row in csv.DictReader(csv_file_txt)
+            ]
+        except (csv.Error, UnicodeDecodeError):
+            abort(422, "Invalid csv file content")
+    try:
+        new_items = TimeseriesSchema(many=True).load(rows)
+    except ma.ValidationError as exc:
+        abort(422, errors=exc.messages)
+    return _upsert_many(new_items, update=args["update"])
+
+
+def _upsert_many(new_items, update):
+    try:
+        return Timeseries.upsert_many(new_items, update=update)
+    except ValueError as exc:
+        abort(422, str(exc))
+    except sqla.exc.IntegrityError:
+        abort(409, "Timeseries name already exists")
+
+
+def _get_timeseries(item_id):
+    """Get timeseries by ID, abort if not found or deleted"""
+    item = db.session.get(Timeseries, item_id)
+    if item is None or item.deleted:
+        abort(404)
+    return item
+
+
 @blp.route('/<int:item_id>')
 class TimeseriesByIdViews(MethodView):
 
@@ -48,9 +124,8 @@ class TimeseriesByIdViews(MethodView):
     @blp.response(200, TimeseriesSchema)
     def get(self, item_id):
         """Get timeseries by ID"""
-        item = db.session.get(Timeseries, item_id)
-        if item is None:
-            abort(404)
+        item = _get_timeseries(item_id)
+        blp.set_etag(item.version)
         return item
 
     @blp.etag
@@ -58,22 +133,61 @@ class TimeseriesByIdViews(MethodView):
     @blp.response(200, TimeseriesSchema)
     def put(self, new_item, item_id):
         """Update an existing timeseries"""
-        item = db.session.get(Timeseries, item_id)
-        if item is None:
-            abort(404)
-        blp.check_etag(item, TimeseriesSchema)
+        item = _get_timeseries(item_id)
+        blp.check_etag(item.version)
         TimeseriesSchema().update(item, new_item)
         db.session.add(item)
         db.session.commit()
+        blp.set_etag(item.version)
         return item
 
     @blp.etag
+    @blp.arguments(TimeseriesDeleteQueryArgsSchema, location='query')
     @blp.response(204)
-    def delete(self, item_id):
-        """Delete a timeseries"""
-        item = db.session.get(Timeseries, item_id)
-        if item is None:
-            abort(404)
-        blp.check_etag(item, TimeseriesSchema)
+    @blp.alt_response(
+        202, None, description="Timeseries marked as deleted")
+    @blp.alt_response(409, ErrorSchema)
+    def delete(self, args, item_id):
+        """Delete a timeseries
+
+        A timeseries with data can only be deleted in background: it is
+        marked as deleted and a *202* status code is returned. Its data is
+        deleted by the purge job, then the timeseries itself. Deletion
+        progress is available until then.
+
+        Else, returns a *409* status code if the timeseries has data.
+        """
+        item = _get_timeseries(item_id)
+        blp.check_etag(item.version)
+        if args["background"]:
+            item.deleted = True
+            db.session.commit()
+            return None, 202
         db.session.delete(item)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except sqla.exc.IntegrityError:
+            db.session.rollback()
+            abort(409, "Timeseries has data, use background deletion")
+        return None
+
+
+@blp.route('/<int:item_id>/deletion')
+@blp.response(200, TimeseriesDeletionSchema)
+def get_deletion(item_id):
+    """Get timeseries background deletion progress
+
+    Returns a *404* status code if the timeseries is not being deleted,
+    including once it is deleted.
+    """
+    item = db.session.get(Timeseries, item_id)
+    if item is None or not item.deleted:
+        abort(404)
+    chunks_purged, chunks_total = timescale.get_purge_progress(
+        item.purged_until)
+    return {
+        "id": item.id,
+        "purged_until": item.purged_until,
+        "chunks_purged": chunks_purged,
+        "chunks_total": chunks_total,
+    }
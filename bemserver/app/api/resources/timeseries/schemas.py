@@ -1,6 +1,7 @@
 """Timeseries API schemas"""
 import marshmallow as ma
 import marshmallow_sqlalchemy as msa
+from flask_smorest.fields import Upload
 
 from bemserver.core.model import Timeseries
 
@@ -10,6 +11,7 @@ from bemserver.app.api import Schema, AutoSchema
 class TimeseriesSchema(AutoSchema):
     class Meta:
         table = Timeseries.__table__
+        exclude = ("deleted", "purged_until", "version")
 
     id = msa.auto_field(dump_only=True)
     name = msa.auto_field(validate=ma.validate.Length(1, 80))
@@ -20,3 +22,44 @@ class TimeseriesSchema(AutoSchema):
 class TimeseriesQueryArgsSchema(Schema):
     name = ma.fields.Str()
     unit = ma.fields.Str()
+
+
+class TimeseriesBulkQueryArgsSchema(Schema):
+    update = ma.fields.Bool(
+        missing=True,
+        metadata={
+            "description": "Update existing timeseries with same name",
+        }
+    )
+
+
+class TimeseriesBulkCSVFileSchema(ma.Schema):
+    csv_file = Upload()
+
+
+class TimeseriesDeleteQueryArgsSchema(Schema):
+    background = ma.fields.Bool(
+        missing=False,
+        metadata={
+            "description": "Delete timeseries and its data in background",
+        }
+    )
+
+
+class TimeseriesDeletionSchema(Schema):
+    id = ma.fields.Int()
+    purged_until = ma.fields.AwareDateTime(
+        metadata={
+            "description": "Data older than this was deleted",
+        }
+    )
+    chunks_purged = ma.fields.Int(
+        metadata={
+            "description": "Number of data chunks processed",
+        }
+    )
+    chunks_total = ma.fields.Int(
+        metadata={
+            "description": "Total number of data chunks",
+        }
+    )
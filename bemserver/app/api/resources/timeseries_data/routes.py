@@ -1,17 +1,22 @@
 """Timeseries resources"""
 import io
 
-from flask import Response
+from flask import Response, current_app
 from flask_smorest import abort
 
-from bemserver.core.csv_io import tscsvio
+from bemserver.core import timescale
+from bemserver.core.csv_io import tscsvio, check_timeseries
+from bemserver.core.model import TimeseriesData
 from bemserver.core.exceptions import TimeseriesCSVIOError
 
 from bemserver.app.api import Blueprint
+from bemserver.app.database import db
 
 from .schemas import (
     TimeseriesDataQueryArgsSchema,
     TimeseriesDataAggregateQueryArgsSchema,
+    TimeseriesDataStatsQueryArgsSchema,
+    TimeseriesDataStatsSchema,
     TimeseriesCSVFileSchema,
 )
 
@@ -25,15 +30,22 @@ blp = Blueprint(
 
 
 @blp.route('/', methods=('GET', ))
+@db.read_only()
 @blp.arguments(TimeseriesDataQueryArgsSchema, location='query')
 @blp.response(200)
 def get_csv(args):
     """Get timeseries data as CSV file"""
-    csv_str = tscsvio.export_csv(
-        args['start_time'],
-        args['end_time'],
-        args['timeseries']
-    )
+    with db.statement_timeout(
+        current_app.config["TIMESERIES_DATA_EXPORT_STATEMENT_TIMEOUT"]
+    ):
+        try:
+            csv_str = tscsvio.export_csv(
+                args['start_time'],
+                args['end_time'],
+                args['timeseries']
+            )
+        except TimeseriesCSVIOError as exc:
+            abort(422, str(exc))
 
     response = Response(csv_str, mimetype='text/csv')
     response.headers.set(
@@ -44,19 +56,48 @@ def get_csv(args):
     return response
 
 
+@blp.route('/', methods=('DELETE', ))
+@blp.arguments(TimeseriesDataQueryArgsSchema, location='query')
+@blp.response(204)
+def delete(args):
+    """Delete timeseries data
+
+    Data is deleted in short transactions. If the request fails, part of
+    the data may be deleted.
+
+    Returns a *422* status code if a timeseries is unknown or deleted.
+    """
+    try:
+        check_timeseries(args['timeseries'])
+    except TimeseriesCSVIOError as exc:
+        abort(422, str(exc))
+    timescale.delete_data(
+        args['start_time'],
+        args['end_time'],
+        args['timeseries']
+    )
+
+
 @blp.route('/aggregate', methods=('GET', ))
+@db.read_only()
 @blp.arguments(TimeseriesDataAggregateQueryArgsSchema, location='query')
 @blp.response(200)
 def get_aggregate_csv(args):
     """Get aggregated timeseries data as CSV file"""
-    csv_str = tscsvio.export_csv_bucket(
-        args['start_time'],
-        args['end_time'],
-        args['timeseries'],
-        args['bucket_width'],
-        args['timezone'],
-        args['aggregation'],
-    )
+    with db.statement_timeout(
+        current_app.config["TIMESERIES_DATA_EXPORT_STATEMENT_TIMEOUT"]
+    ):
+        try:
+            csv_str = tscsvio.export_csv_bucket(
+                args['start_time'],
+                args['end_time'],
+                args['timeseries'],
+                args['bucket_width'],
+                args['timezone'],
+                args['aggregation'],
+            )
+        except TimeseriesCSVIOError as exc:
+            abort(422, str(exc))
 
     response = Response(csv_str, mimetype='text/csv')
     response.headers.set(
@@ -67,6 +108,30 @@ def get_aggregate_csv(args):
     return response
 
 
+@blp.route('/stats', methods=('GET', ))
+@db.read_only()
+@blp.arguments(TimeseriesDataStatsQueryArgsSchema, location='query')
+@blp.response(200, TimeseriesDataStatsSchema(many=True))
+def get_stats(args):
+    """Get timeseries data statistics
+
+    Returns first and last timestamps, number of values, number of null
+    values and min, max and average values of each timeseries.
+    """
+    try:
+        check_timeseries(args['timeseries'])
+    except TimeseriesCSVIOError as exc:
+        abort(422, str(exc))
+    with db.statement_timeout(
+        current_app.config["TIMESERIES_DATA_EXPORT_STATEMENT_TIMEOUT"]
+    ):
+        return TimeseriesData.get_stats(
+            args['timeseries'],
+            args.get('start_time'),
+            args.get('end_time'),
+        )
+
+
 # TODO: document response
 # https://github.com/marshmallow-code/flask-smorest/issues/142
 @blp.route('/', methods=('POST', ))
@@ -6,7 +6,7 @@ from bemserver.core.model import TimeseriesData
 from bemserver.core.csv_io import AGGREGATION_FUNCTIONS
 
 from bemserver.app.api import Schema, AutoSchema
-from bemserver.app.api.extensions.ma_fields import Timezone
+from bemserver.app.api.extensions.ma_fields import Timezone, BucketWidth
 
 
 class TimeseriesDataSchema(AutoSchema):
@@ -41,8 +41,7 @@ class TimeseriesDataQueryArgsSchema(Schema):
 class TimeseriesDataAggregateQueryArgsSchema(TimeseriesDataQueryArgsSchema):
     """Timeseries values aggregate GET query parameters schema"""
 
-    # TODO: Create custom field for bucket width
-    bucket_width = ma.fields.String(
+    bucket_width = BucketWidth(
         required=True,
         metadata={
             "description": "Bucket width (ISO 8601 duration or PostgreSQL)",
@@ -60,5 +59,43 @@ class TimeseriesDataAggregateQueryArgsSchema(TimeseriesDataQueryArgsSchema):
     )
 
 
+class TimeseriesDataStatsQueryArgsSchema(Schema):
+    """Timeseries values statistics GET query parameters schema"""
+
+    start_time = ma.fields.AwareDateTime(
+        metadata={
+            "description": "Initial datetime",
+        }
+    )
+    end_time = ma.fields.AwareDateTime(
+        metadata={
+            "description": "End datetime (excluded from the interval)",
+        }
+    )
+    timeseries = ma.fields.List(
+        ma.fields.Int(),
+        required=True,
+        metadata={
+            "description": "List of timeseries ID",
+        }
+    )
+
+
+class TimeseriesDataStatsSchema(Schema):
+
+    timeseries_id = ma.fields.Int()
+    first_timestamp = ma.fields.AwareDateTime()
+    last_timestamp = ma.fields.AwareDateTime()
+    count = ma.fields.Int(
+        metadata={"description": "Number of values, including null values"}
+    )
+    null_count = ma.fields.Int(
+        metadata={"description": "Number of null values"}
+    )
+    min = ma.fields.Float()
+    max = ma.fields.Float()
+    avg = ma.fields.Float()
+
+
 class TimeseriesCSVFileSchema(ma.Schema):
     csv_file = Upload()
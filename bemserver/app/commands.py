@@ -0,0 +1,161 @@
+"""Command line interface"""
+import flask
+import click
+
+from bemserver.core import timescale
+from bemserver.core.model import Event
+
+from . import database
+
+
+@click.command()
+@flask.cli.with_appcontext
+def setup_db():
+    """Recreate database tables"""
+    config = flask.current_app.config
+    database.db.setup_tables()
+    timescale.configure_hypertable(
+        chunk_time_interval=config["TIMESERIES_DATA_CHUNK_TIME_INTERVAL"],
+        number_partitions=config["TIMESERIES_DATA_SPACE_PARTITIONS"],
+    )
+    if config["TIMESERIES_DATA_COMPRESS_AFTER"] is not None:
+        timescale.set_compression(config["TIMESERIES_DATA_COMPRESS_AFTER"])
+
+
+@click.command()
+@flask.cli.with_appcontext
+def setup_compression():
+    """Enable timeseries data compression and set compression policy"""
+    timescale.set_compression(
+        flask.current_app.config["TIMESERIES_DATA_COMPRESS_AFTER"]
+    )
+
+
+@click.command()
+@click.option(
+    "--older-than",
+    help="Interval (PostgreSQL). Defaults to TIMESERIES_DATA_COMPRESS_AFTER.",
+)
+@flask.cli.with_appcontext
+def compress_chunks(older_than):
+    """Compress timeseries data chunks"""
+    if older_than is None:
+        older_than = flask.current_app.config["TIMESERIES_DATA_COMPRESS_AFTER"]
+    if older_than is None:
+        raise click.UsageError("Missing interval")
+    nb_chunks = timescale.compress_chunks(older_than)
+    click.echo(f"Compressed {nb_chunks} chunk(s)")
+
+
+@click.command()
+@click.option(
+    "--reorder/--no-reorder", default=True, help="Reorder chunks",
+)
+@flask.cli.with_appcontext
+def maintain_chunks(reorder):
+    """Analyze and reorder timeseries data chunks modified since last run"""
+    for chunk in timescale.maintain_chunks(reorder=reorder):
+        click.echo(chunk)
+
+
+@click.command()
+@flask.cli.with_appcontext
+def chunk_sizes():
+    """Report timeseries data chunks sizes"""
+    for name, start, end, is_compressed, size in timescale.get_chunk_sizes():
+        click.echo(
+            f"{name}\t{start.isoformat()}\t{end.isoformat()}\t"
+            f"{'compressed' if is_compressed else 'uncompressed'}\t"
+            f"{size}"
+        )
+
+
+@click.command()
+@click.option(
+    "--batch-size", default=10000, show_default=True,
+    help="Maximum number of data rows deleted per transaction",
+)
+@flask.cli.with_appcontext
+def apply_retention(batch_size):
+    """Roll up and delete expired timeseries data"""
+    config = flask.current_app.config
+    nb_buckets, nb_chunks, nb_rows = timescale.apply_retention(
+        retention=config["TIMESERIES_DATA_RETENTION"],
+        rollup_interval=config["TIMESERIES_DATA_ROLLUP_INTERVAL"],
+        batch_size=batch_size,
+    )
+    click.echo(
+        f"Rolled up {nb_buckets} bucket(s), "
+        f"dropped {nb_chunks} chunk(s), deleted {nb_rows} row(s)"
+    )
+
+
+@click.command()
+@click.option(
+    "--batch-size", default=10000, show_default=True,
+    help="Maximum number of data rows deleted per transaction",
+)
+@flask.cli.with_appcontext
+def purge_timeseries(batch_size):
+    """Delete data of deleted timeseries, then deleted timeseries"""
+    nb_timeseries, nb_rows = timescale.purge_deleted_timeseries(
+        batch_size=batch_size)
+    click.echo(
+        f"Deleted {nb_rows} row(s) and {nb_timeseries} timeseries"
+    )
+
+
+@click.command()
+@click.option(
+    "--batch-size", default=1000, show_default=True,
+    help="Maximum number of events closed per transaction",
+)
+@flask.cli.with_appcontext
+def close_stale_events(batch_size):
+    """Close events not updated since timeout"""
+    config = flask.current_app.config
+    nb_events = Event.close_stale(
+        timeout=config["EVENT_STALE_TIMEOUT"],
+        category_timeouts=config["EVENT_STALE_CATEGORY_TIMEOUTS"],
+        batch_size=batch_size,
+    )
+    click.echo(f"Closed {nb_events} event(s)")
+
+
+@click.command()
+@click.option(
+    "--older-than",
+    help="Interval (PostgreSQL). Defaults to EVENT_ARCHIVE_AFTER.",
+)
+@click.option(
+    "--batch-size", default=1000, show_default=True,
+    help="Maximum number of events moved per transaction",
+)
+@flask.cli.with_appcontext
+def archive_events(older_than, batch_size):
+    """Move closed events to archive"""
+    if older_than is None:
+        older_than = flask.current_app.config["EVENT_ARCHIVE_AFTER"]
+    if older_than is None:
+        raise click.UsageError("Missing interval")
+    nb_events = Event.archive(older_than, batch_size=batch_size)
+    click.echo(f"Archived {nb_events} event(s)")
+
+
+COMMANDS = (
+    setup_db,
+    setup_compression,
+    compress_chunks,
+    maintain_chunks,
+    chunk_sizes,
+    apply_retention,
+    purge_timeseries,
+    close_stale_events,
+    archive_events,
+)
+
+
+def init_app(app):
+    """Register commands"""
+    for command in COMMANDS:
+        app.cli.add_command(command)
@@ -1,14 +1,35 @@
 """Database access"""
 from bemserver.core.database import db
+from bemserver.core.model import EventCategory, Timeseries
+from bemserver.core.model.event import REFERENCE_CACHES
 
 
 def init_app(app):
     """Init DB accessor with app
 
-    Sets DB engine using app config.
+    Sets DB engine and caches using app config.
     Adds app contextteardown method to close DB session.
     """
-    db.set_db_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    db.set_db_url(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        replica_urls=app.config["SQLALCHEMY_REPLICA_URIS"],
+        pool_size=app.config["SQLALCHEMY_POOL_SIZE"],
+        max_overflow=app.config["SQLALCHEMY_MAX_OVERFLOW"],
+        pool_pre_ping=app.config["SQLALCHEMY_POOL_PRE_PING"],
+        pool_recycle=app.config["SQLALCHEMY_POOL_RECYCLE"],
+        statement_timeout=app.config["SQLALCHEMY_STATEMENT_TIMEOUT"],
+        idle_in_transaction_session_timeout=app.config[
+            "SQLALCHEMY_IDLE_IN_TRANSACTION_SESSION_TIMEOUT"
+        ],
+    )
+
+    for cache in REFERENCE_CACHES:
+        cache.ttl = app.config["EVENT_REFERENCE_CACHE_TTL"]
+        cache.invalidate()
+    EventCategory.subcategories_cache_enabled = app.config[
+        "EVENT_SUBCATEGORIES_CACHE"]
+    Timeseries.cache.ttl = app.config["TIMESERIES_CACHE_TTL"]
+    Timeseries.cache.invalidate()
 
     @app.teardown_appcontext
     def cleanup(_):
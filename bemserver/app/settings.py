@@ -6,9 +6,55 @@ class Config:
 
     # SQLAlchemy parameters
     SQLALCHEMY_DATABASE_URI = ""
+    # Read-only replicas used for read-only routes
+    SQLALCHEMY_REPLICA_URIS = []
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_POOL_SIZE = 5
+    SQLALCHEMY_MAX_OVERFLOW = 10
+    SQLALCHEMY_POOL_PRE_PING = False
+    SQLALCHEMY_POOL_RECYCLE = -1
+    # Timeouts in milliseconds (None: no timeout)
+    SQLALCHEMY_STATEMENT_TIMEOUT = None
+    SQLALCHEMY_IDLE_IN_TRANSACTION_SESSION_TIMEOUT = None
+
+    # Timeseries data parameters
+    # Statement timeout override for exports, in milliseconds
+    TIMESERIES_DATA_EXPORT_STATEMENT_TIMEOUT = None
+    # Chunk time interval (None: TimescaleDB default)
+    TIMESERIES_DATA_CHUNK_TIME_INTERVAL = None
+    # Number of hash partitions on timeseries ID (None: no space partitioning)
+    TIMESERIES_DATA_SPACE_PARTITIONS = None
+    # Compress chunks older than this interval (None: no compression)
+    TIMESERIES_DATA_COMPRESS_AFTER = None
+    # Default raw data retention, overridden by timeseries retention
+    # (None: keep forever)
+    TIMESERIES_DATA_RETENTION = None
+    # Expired raw data is rolled up in buckets of this width
+    TIMESERIES_DATA_ROLLUP_INTERVAL = "15 minutes"
+
+    # Event parameters
+    # NEW or ONGOING events not updated for this interval are closed
+    # (None: never closed)
+    EVENT_STALE_TIMEOUT = None
+    # Stale event timeouts by category ID, overriding default timeout
+    EVENT_STALE_CATEGORY_TIMEOUTS = {}
+    # CLOSED events are archived after this interval (None: never archived)
+    EVENT_ARCHIVE_AFTER = None
+    # Event reference tables (categories, states, levels, targets) cache time
+    # to live in seconds (None: never expire)
+    EVENT_REFERENCE_CACHE_TTL = 60
+    # Expand event subcategories from categories cache rather than with a
+    # recursive query (cache is invalidated by DB notifications)
+    EVENT_SUBCATEGORIES_CACHE = False
+    # Timeseries metadata cache time to live in seconds (None: never expire)
+    # The cache is also invalidated by DB notifications
+    TIMESERIES_CACHE_TTL = 300
+    # Interval in seconds between keepalive messages in event stream
+    EVENT_STREAM_KEEPALIVE = 15
 
     # API parameters
+    # Encode JSON with orjson (optional dependency)
+    JSON_USE_ORJSON = False
     API_TITLE = "BEMServer API"
     API_VERSION = 0.1
     OPENAPI_VERSION = '3.0.2'
@@ -2,3 +2,5 @@
 from . import model  # noqa
 from . import database  # noqa
 from . import csv_io  # noqa
+from . import timescale  # noqa
+from . import notifications  # noqa
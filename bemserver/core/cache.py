@@ -0,0 +1,184 @@
+"""In-process caches"""
+import hashlib
+import json
+import threading
+import time
+
+import sqlalchemy as sqla
+
+from .database import db
+from .notifications import notifier
+
+
+class TableCache:
+    """In-process cache of a small, almost static table
+
+    Rows are loaded on first access and reloaded when expired or
+    invalidated. The cache is invalidated when rows are modified through the
+    ORM in this process. Other processes see changes after TTL, unless a
+    notification channel is given, in which case the cache is invalidated
+    on each notification on this channel.
+
+    Looking up a missing key reloads rows, in case the row was inserted by
+    another process, but at most once per miss_reload_interval, so that
+    unknown keys can not trigger a reload on each lookup.
+
+    Rows are always loaded from the primary database, not from a replica
+    that may lag.
+
+    The version is incremented each time reloaded rows differ from cached
+    rows. The ETag is a hash of cached rows.
+
+    :param Base model: Mapped class
+    :param int ttl: (optional, default None)
+        Time to live in seconds. If None, rows never expire.
+    :param tuple indexes: (optional, default ())
+        Unique columns rows can be fetched by, see :meth:`get_by`
+    :param str channel: (optional, default None)
+        Notification channel signaling table modifications
+    :param float miss_reload_interval: (optional, default 1)
+        Minimum time in seconds between last load and a reload caused by a
+        missing key
+    """
+    def __init__(
+            self, model, ttl=None, *, indexes=(), channel=None,
+            miss_reload_interval=1):
+        self._table = model.__table__
+        self.ttl = ttl
+        self.miss_reload_interval = miss_reload_interval
+        self._channel = channel
+        self._lock = threading.Lock()
+        self._rows = None
+        self._ids = None
+        self._by_id = None
+        self._indexes = {col: None for col in indexes}
+        self._etag = None
+        self._expiration = None
+        self._loaded_at = None
+        self.version = 0
+        for event_name in ("after_insert", "after_update", "after_delete"):
+            sqla.event.listen(model, event_name, self._on_change)
+
+    def _on_change(self, mapper, connection, target):
+        self.invalidate()
+
+    def _on_notify(self, payload):
+        self.invalidate()
+
+    def invalidate(self):
+        """Force reload on next access"""
+        self._expiration = None
+
+    def _is_valid(self):
+        return self._expiration is not None and (
+            self.ttl is None or time.monotonic() < self._expiration)
+
+    def _load(self):
+        # Subscribe before loading not to miss modifications. This also
+        # restarts listener if needed (e.g. after fork).
+        if self._channel is not None:
+            notifier.subscribe(self._channel, callback=self._on_notify)
+        primary_key = self._table.primary_key.columns
+        with db.force_primary():
+            rows = [
+                dict(row) for row in db.session.execute(
+                    sqla.select(self._table).order_by(*primary_key)
+                ).mappings()
+            ]
+        etag = hashlib.sha1(
+            json.dumps(rows, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            if etag != self._etag:
+                self._rows = rows
+                self._by_id = {
+                    tuple(row[col.name] for col in primary_key)
+                    if len(primary_key) > 1
+                    else row[primary_key[0].name]: row
+                    for row in rows
+                }
+                self._ids = frozenset(self._by_id)
+                self._indexes = {
+                    col: {row[col]: row for row in rows}
+                    for col in self._indexes
+                }
+                self._etag = etag
+                self.version += 1
+            self._loaded_at = time.monotonic()
+            self._expiration = self._loaded_at + (self.ttl or 0)
+
+    def _ensure_valid(self):
+        if not self._is_valid():
+            self._load()
+
+    def _reload_on_miss(self):
+        """Reload rows after a missing key, unless loaded recently
+
+        Returns True if rows were reloaded.
+        """
+        if (
+                self._loaded_at is not None and
+                time.monotonic() - self._loaded_at <
+                self.miss_reload_interval
+        ):
+            return False
+        self.invalidate()
+        self._ensure_valid()
+        return True
+
+    @property
+    def rows(self):
+        """Cached rows as dicts, ordered by primary key"""
+        self._ensure_valid()
+        return self._rows
+
+    @property
+    def ids(self):
+        """Set of cached primary keys"""
+        self._ensure_valid()
+        return self._ids
+
+    @property
+    def etag(self):
+        """Hash of cached rows"""
+        self._ensure_valid()
+        return self._etag
+
+    def __contains__(self, item_id):
+        """Check primary key exists
+
+        Rows are reloaded once if the key is not found in cache, in case the
+        row was inserted by another process, see miss_reload_interval.
+        """
+        if item_id in self.ids:
+            return True
+        return self._reload_on_miss() and item_id in self.ids
+
+    def get(self, item_id):
+        """Get cached row by primary key
+
+        Rows are reloaded once if the key is not found in cache, see
+        miss_reload_interval.
+
+        Returns the row as a dict, or None if not found.
+        """
+        if item_id not in self:
+            return None
+        return self._by_id.get(item_id)
+
+    def get_by(self, column, value):
+        """Get cached row by unique column value
+
+        Rows are reloaded once if the value is not found in cache, see
+        miss_reload_interval.
+
+        :param str column: Column name, must be in cache indexes
+        :param value: Column value
+
+        Returns the row as a dict, or None if not found.
+        """
+        self._ensure_valid()
+        row = self._indexes[column].get(value)
+        if row is None and self._reload_on_miss():
+            row = self._indexes[column].get(value)
+        return row
@@ -8,10 +8,35 @@ import pandas as pd
 from .database import db
 from .exceptions import TimeseriesCSVIOError
 from .model import Timeseries, TimeseriesData
+from .timescale import decompress_chunks, recompress_chunks
 
 
 AGGREGATION_FUNCTIONS = ("avg", "sum", "min", "max")
 
+# Aggregate partial (raw data or rollup) buckets sums, counts, mins and maxs
+BUCKET_AGGREGATES = {
+    "avg": "sum(sum) / NULLIF(sum(count), 0)",
+    "sum": "sum(sum)",
+    "min": "min(min)",
+    "max": "max(max)",
+}
+
+
+def check_timeseries(timeseries):
+    """Check timeseries IDs exist and are not deleted, using timeseries cache
+
+    Returns the IDs as integers.
+    """
+    try:
+        timeseries = [int(ts_id) for ts_id in timeseries]
+    except ValueError as exc:
+        raise TimeseriesCSVIOError('Invalid timeseries ID') from exc
+    for ts_id in timeseries:
+        ts_row = Timeseries.cache.get(ts_id)
+        if ts_row is None or ts_row["deleted"]:
+            raise TimeseriesCSVIOError('Unknown timeseries ID')
+    return timeseries
+
 
 class TimeseriesCSVIO:
 
@@ -34,15 +59,10 @@ class TimeseriesCSVIO:
             raise TimeseriesCSVIOError('Missing headers line') from exc
         if header[0] != "Datetime":
             raise TimeseriesCSVIOError('First column must be "Datetime"')
-        try:
-            ts_ids = [
-                db.session.get(Timeseries, col).id
-                for col in header[1:]
-            ]
-        except AttributeError as exc:
-            raise TimeseriesCSVIOError('Unknown timeseries ID') from exc
+        ts_ids = check_timeseries(header[1:])
 
         datas = []
+        timestamps = []
         for row in reader:
             try:
                 datas.extend([
@@ -55,6 +75,7 @@ class TimeseriesCSVIO:
                 ])
             except IndexError as exc:
                 raise TimeseriesCSVIOError('Missing column') from exc
+            timestamps.append(row[0])
 
         query = (
             sqla.dialects.postgresql
@@ -64,8 +85,11 @@ class TimeseriesCSVIO:
 
         try:
             with db.session() as session:
+                # ON CONFLICT is not supported on compressed chunks
+                chunks = decompress_chunks(session, timestamps)
                 session.execute(query)
                 session.commit()
+                recompress_chunks(session, chunks)
         # TODO: filter server and client errors (constraint violation)
         except sqla.exc.DBAPIError as exc:
             raise TimeseriesCSVIOError('Error writing to DB') from exc
@@ -76,9 +100,11 @@ class TimeseriesCSVIO:
 
         :param datetime start_dt: Time interval lower bound (tz-aware)
         :param datetime end_dt: Time interval exclusive upper bound (tz-aware)
+        :param list timeseries: List of timeseries IDs
 
         Returns csv as a string.
         """
+        check_timeseries(timeseries)
         data = db.session.execute(
             sqla.select(
                 sqla.func.timezone("UTC", TimeseriesData.timestamp),
@@ -128,18 +154,40 @@ class TimeseriesCSVIO:
         :param str aggreagation: Aggregation function. Must be one of
             "avg", "sum", "min" and "max".
 
+        Expired data is read from rollups. Rollup buckets are selected by
+        their start timestamp. Bucket width should be a multiple of rollup
+        bucket width.
+
         Returns csv as a string.
         """
         if aggregation not in AGGREGATION_FUNCTIONS:
             raise ValueError(f'Invalid aggregation method "{aggregation}"')
+        check_timeseries(timeseries)
 
+        # Expired raw data is replaced by rollups: aggregate both
         query = sqla.text(
-            "SELECT time_bucket("
-            " :bucket_width, timestamp AT TIME ZONE :timezone)"
-            f"  AS bucket, timeseries_id, {aggregation}(value) "
-            "FROM timeseries_data "
-            "WHERE timeseries_id IN :timeseries "
-            "  AND timestamp >= :start_dt AND timestamp < :end_dt "
+            "SELECT bucket, timeseries_id,"
+            f"  {BUCKET_AGGREGATES[aggregation]} "
+            "FROM ("
+            "  SELECT time_bucket("
+            "   :bucket_width, timestamp AT TIME ZONE :timezone)"
+            "    AS bucket, timeseries_id,"
+            "    sum(value) AS sum, count(value) AS count,"
+            "    min(value) AS min, max(value) AS max"
+            "  FROM timeseries_data"
+            "  WHERE timeseries_id IN :timeseries"
+            "    AND timestamp >= :start_dt AND timestamp < :end_dt"
+            "  GROUP BY bucket, timeseries_id"
+            "  UNION ALL"
+            "  SELECT time_bucket("
+            "   :bucket_width, timestamp AT TIME ZONE :timezone)"
+            "    AS bucket, timeseries_id,"
+            "    sum(avg * count), sum(count), min(min), max(max)"
+            "  FROM timeseries_data_rollup"
+            "  WHERE timeseries_id IN :timeseries"
+            "    AND timestamp >= :start_dt AND timestamp < :end_dt"
+            "  GROUP BY bucket, timeseries_id"
+            ") AS buckets "
             "GROUP BY bucket, timeseries_id "
             "ORDER BY bucket;"
         )
@@ -1,29 +1,236 @@
 """Databases: SQLAlchemy database access"""
+import os
+import itertools
+from contextlib import contextmanager
 
 import sqlalchemy as sqla
-from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
+from sqlalchemy.orm import (
+    Session, sessionmaker, scoped_session, declarative_base)
 
 
-SESSION_FACTORY = sessionmaker(autocommit=False, autoflush=False)
+class RoutingSession(Session):
+    """Session routing reads to a replica in read-only mode
+
+    See :meth:`DBConnection.read_only`. Flushes and INSERT, UPDATE and
+    DELETE statements always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            self.info.get("read_only") and
+            not self.info.get("force_primary") and
+            not self._flushing and
+            not isinstance(clause, sqla.sql.expression.UpdateBase)
+        ):
+            if "replica" not in self.info:
+                self.info["replica"] = db.next_replica_engine()
+            return self.info["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+SESSION_FACTORY = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False)
 DB_SESSION = scoped_session(SESSION_FACTORY)
 Base = declarative_base()
 
 
 class DBConnection:
-    """Database accessor"""
+    """Database accessor
+
+    The engines are created lazily, on first use, in each process. Engines
+    inherited from a parent process (e.g. app preloaded before forking
+    workers) are discarded without closing their connections, which belong
+    to the parent process.
+    """
 
     def __init__(self):
-        self.engine = None
+        self._db_url = None
+        self._replica_urls = []
+        self._engine_options = {}
+        self._engine = None
+        self._replica_engines = None
+        self._replica_counter = itertools.count()
+        self._pid = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
 
-    def set_db_url(self, db_url):
-        """Set DB URL"""
-        self.engine = sqla.create_engine(db_url, future=True)
-        SESSION_FACTORY.configure(bind=self.engine)
+    def set_db_url(
+            self, db_url, *, replica_urls=(), pool_size=5, max_overflow=10,
+            pool_pre_ping=False, pool_recycle=-1, statement_timeout=None,
+            idle_in_transaction_session_timeout=None):
+        """Set DB URL
+
+        :param str db_url: Database URL
+        :param list replica_urls: (optional, default ())
+            Read-only replica database URLs.
+        :param int pool_size: (optional, default 5)
+            Number of connections kept open in the pool.
+        :param int max_overflow: (optional, default 10)
+            Number of connections allowed on top of pool_size.
+        :param bool pool_pre_ping: (optional, default False)
+            Test connections for liveness upon checkout.
+        :param int pool_recycle: (optional, default -1)
+            Recycle connections after this number of seconds (-1: never).
+        :param int statement_timeout: (optional, default None)
+            Default statement timeout, in milliseconds (None: no timeout).
+        :param int idle_in_transaction_session_timeout: (optional,
+            default None) Terminate sessions left idle in a transaction
+            for longer than this, in milliseconds (None: no timeout).
+        """
+        connect_args = {}
+        options = " ".join(
+            f"-c {name}={value}" for name, value in (
+                ("statement_timeout", statement_timeout),
+                (
+                    "idle_in_transaction_session_timeout",
+                    idle_in_transaction_session_timeout
+                ),
+            ) if value is not None
+        )
+        if options:
+            connect_args["options"] = options
+        if self._engine is not None:
+            self.dispose()
+        self._db_url = db_url
+        self._replica_urls = list(replica_urls)
+        self._engine_options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_pre_ping": pool_pre_ping,
+            "pool_recycle": pool_recycle,
+            "connect_args": connect_args,
+        }
+
+    @property
+    def engine(self):
+        """Engine for current process"""
+        if self._db_url is None:
+            return None
+        if self._engine is None or self._pid != os.getpid():
+            self._discard_inherited_engine()
+            self._engine = sqla.create_engine(
+                self._db_url, future=True, **self._engine_options
+            )
+            self._pid = os.getpid()
+            SESSION_FACTORY.configure(bind=self._engine)
+        return self._engine
+
+    @property
+    def replica_engines(self):
+        """Replica engines for current process"""
+        if self.engine is None:
+            return []
+        if self._replica_engines is None:
+            self._replica_engines = [
+                sqla.create_engine(url, future=True, **self._engine_options)
+                for url in self._replica_urls
+            ]
+        return self._replica_engines
+
+    def next_replica_engine(self):
+        """Pick a replica engine, round-robin
+
+        Falls back to primary engine if no replica is configured.
+        """
+        replica_engines = self.replica_engines
+        if not replica_engines:
+            return self.engine
+        return replica_engines[
+            next(self._replica_counter) % len(replica_engines)
+        ]
+
+    def _discard_inherited_engine(self):
+        if self._engine is not None and self._pid != os.getpid():
+            # Drop pooled connections without closing them
+            for engine in [self._engine, *(self._replica_engines or [])]:
+                engine.dispose(close=False)
+            self._engine = None
+            self._replica_engines = None
+            # Forget session inherited from parent process
+            DB_SESSION.registry.clear()
+
+    def _after_fork_in_child(self):
+        self._discard_inherited_engine()
 
     @property
     def session(self):
+        # Ensure session factory is bound to current process engine
+        self.engine  # pylint: disable=pointless-statement
         return DB_SESSION
 
+    @contextmanager
+    def read_only(self):
+        """Route reads of current session to a replica
+
+        A replica is picked (round-robin) for the whole context. Writes still
+        go to the primary.
+
+        Can be used as a decorator.
+        """
+        # Nested context: keep replica picked by outer context
+        if self.session().info.get("read_only"):
+            yield
+            return
+        with self._session_info_flag("read_only"):
+            try:
+                yield
+            finally:
+                self.session().info.pop("replica", None)
+
+    @contextmanager
+    def force_primary(self):
+        """Route reads of current session to the primary
+
+        Overrides :meth:`read_only`. Use this when reads must see writes
+        that may not have been replicated yet.
+
+        Can be used as a decorator.
+        """
+        with self._session_info_flag("force_primary"):
+            yield
+
+    @contextmanager
+    def _session_info_flag(self, flag):
+        info = self.session().info
+        previous = info.get(flag, False)
+        info[flag] = True
+        try:
+            yield
+        finally:
+            # Session may have been removed in the meantime
+            self.session().info[flag] = previous
+
+    @contextmanager
+    def statement_timeout(self, timeout):
+        """Override statement timeout in current session transaction
+
+        The previous value is restored when leaving the context, unless the
+        transaction was ended in the meantime.
+
+        :param int timeout: Statement timeout, in milliseconds. If None,
+            the default timeout is kept.
+        """
+        if timeout is None:
+            yield
+            return
+        previous = self.session.execute(
+            sqla.text("SELECT current_setting('statement_timeout');")
+        ).scalar()
+        self._set_statement_timeout(timeout)
+        try:
+            yield
+        finally:
+            if self.session().in_transaction():
+                self._set_statement_timeout(previous)
+
+    def _set_statement_timeout(self, timeout):
+        self.session.execute(
+            sqla.text(
+                "SELECT set_config('statement_timeout', :timeout, true);"
+            ),
+            {"timeout": str(timeout)},
+        )
+
     def create_all(self):
         """Create all tables"""
         Base.metadata.create_all(bind=self.engine)
@@ -41,8 +248,12 @@ class DBConnection:
         self.create_all()
 
     def dispose(self):
-        self.engine.dispose()
-        self.engine = None
+        self._discard_inherited_engine()
+        if self._engine is not None:
+            for engine in [self._engine, *(self._replica_engines or [])]:
+                engine.dispose()
+            self._engine = None
+            self._replica_engines = None
 
 
 db = DBConnection()
@@ -124,3 +335,64 @@ class BaseMixin:
             if raise_errors:
                 raise exc
         return None
+
+
+def add_version_trigger(table):
+    """Set version column from a sequence on each insert and update
+
+    The version is unique in the table and increases on each modification.
+    It is meant to compute ETags without loading rows: max version and row
+    count change when rows are inserted, updated or deleted.
+
+    The column should be defined with FetchedValue server default and
+    server onupdate, for the ORM to fetch it after writes.
+
+    :param Table table: Table with a "version" column
+    """
+    sequence = sqla.Sequence(
+        f"{table.name}_version_seq", metadata=table.metadata)
+    sqla.event.listen(
+        table,
+        "after_create",
+        sqla.DDL(
+            "CREATE OR REPLACE FUNCTION set_%(table)s_version() "
+            "RETURNS trigger AS $$ "
+            "BEGIN "
+            f"  NEW.version = nextval('{sequence.name}');"
+            "  RETURN NEW;"
+            "END; "
+            "$$ LANGUAGE plpgsql; "
+            "CREATE TRIGGER set_%(table)s_version "
+            "BEFORE INSERT OR UPDATE ON %(table)s "
+            "FOR EACH ROW EXECUTE PROCEDURE set_%(table)s_version();"
+        )
+    )
+
+
+def add_notify_trigger(table):
+    """Notify modifications of a table on a channel named after the table
+
+    A notification is sent once per modifying statement, with the
+    operation as payload. Meant to invalidate caches, see `TableCache`.
+
+    :param Table table: Table
+    """
+    sqla.event.listen(
+        table,
+        "after_create",
+        sqla.DDL(
+            "CREATE OR REPLACE FUNCTION notify_%(table)s() "
+            "RETURNS trigger AS $$ "
+            "BEGIN "
+            "  PERFORM pg_notify("
+            "    '%(table)s',"
+            "    json_build_object('operation', lower(TG_OP))::text"
+            "  );"
+            "  RETURN NULL;"
+            "END; "
+            "$$ LANGUAGE plpgsql; "
+            "CREATE TRIGGER notify_%(table)s "
+            "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %(table)s "
+            "FOR EACH STATEMENT EXECUTE PROCEDURE notify_%(table)s();"
+        )
+    )
@@ -1,5 +1,6 @@
 """Model"""
 from .timeseries import Timeseries  # noqa
-from .timeseries_data import TimeseriesData  # noqa
+from .timeseries_data import TimeseriesData, TimeseriesDataRollup  # noqa
 from .event import \
-    Event, EventCategory, EventState, EventLevel, EventTarget  # noqa
+    Event, EventArchive, EventCategory, EventState, EventLevel, \
+    EventTarget  # noqa
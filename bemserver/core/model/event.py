@@ -1,10 +1,15 @@
 """Event"""
 
 import datetime as dt
+
 import sqlalchemy as sqla
+from sqlalchemy.dialects.postgresql import insert
 
-from bemserver.core.database import Base, BaseMixin, db
-from bemserver.core.model.exceptions import EventError
+from bemserver.core.database import (
+    Base, BaseMixin, db, add_version_trigger, add_notify_trigger)
+from bemserver.core.cache import TableCache
+from bemserver.core.model.exceptions import (
+    EventError, EventNotFoundError, EventConflictError)
 
 
 class EventCategory(Base, BaseMixin):
@@ -18,6 +23,45 @@ class EventCategory(Base, BaseMixin):
         nullable=True
     )
 
+    # Expand subcategories from categories cache rather than with a
+    # recursive CTE when filtering events
+    subcategories_cache_enabled = False
+
+    @classmethod
+    def select_subcategories(cls, category):
+        """Select the IDs of a category and all its descendants
+
+        :param str category: Category ID.
+        :returns Select: Select statement using a recursive CTE.
+        """
+        tree = (
+            sqla.select(cls.id)
+            .where(cls.id == category)
+            .cte("category_tree", recursive=True)
+        )
+        child = sqla.orm.aliased(cls)
+        tree = tree.union_all(
+            sqla.select(child.id).where(child.parent == tree.c.id)
+        )
+        return sqla.select(tree.c.id)
+
+    @classmethod
+    def get_subcategories(cls, category):
+        """Get the IDs of a category and all its descendants
+
+        The category tree is read from categories cache.
+
+        :param str category: Category ID.
+        :returns list: Category ID and descendant category IDs.
+        """
+        children = {}
+        for row in cls.cache.rows:
+            children.setdefault(row["parent"], []).append(row["id"])
+        subcategories = [category]
+        for parent in subcategories:
+            subcategories.extend(children.get(parent, ()))
+        return subcategories
+
 
 class EventState(Base, BaseMixin):
     __tablename__ = "event_state"
@@ -40,6 +84,28 @@ class EventTarget(Base, BaseMixin):
     description = sqla.Column(sqla.String(250))
 
 
+# Reference tables are cached in-process
+# Categories cache is invalidated by notifications on "event_category"
+# channel as it is used to filter on subcategories
+EventCategory.cache = TableCache(EventCategory, channel="event_category")
+EventState.cache = TableCache(EventState)
+EventLevel.cache = TableCache(EventLevel)
+EventTarget.cache = TableCache(EventTarget)
+REFERENCE_CACHES = (
+    EventCategory.cache,
+    EventState.cache,
+    EventLevel.cache,
+    EventTarget.cache,
+)
+
+
+OPEN_STATES = ("NEW", "ONGOING")
+# Only one event may be open for a given key
+OPEN_EVENT_KEY = ("target_type", "target_id", "category", "source")
+# Fields events statistics can be grouped by
+STATS_GROUP_BY = ("category", "level", "state", "target_type")
+
+
 # Event state could be deduced on the fly:
 #   1/ if no timestamp_end is defined then it can be NEW or ONGOING:
 #       a/ if time elapsed between timestamp_start and timestamp_last_update
@@ -69,7 +135,8 @@ class Event(Base, BaseMixin):
         nullable=False
     )
 
-    timestamp_start = sqla.Column(sqla.DateTime(timezone=True), nullable=False)
+    timestamp_start = sqla.Column(
+        sqla.DateTime(timezone=True), nullable=False, index=True)
     timestamp_end = sqla.Column(sqla.DateTime(timezone=True))
 
     source = sqla.Column(sqla.String, nullable=False)
@@ -87,10 +154,28 @@ class Event(Base, BaseMixin):
     )
 
     timestamp_last_update = sqla.Column(
-        sqla.DateTime(timezone=True), nullable=False)
+        sqla.DateTime(timezone=True), nullable=False, index=True)
 
     description = sqla.Column(sqla.String(250))
 
+    # Set by trigger on each modification
+    version = sqla.Column(
+        sqla.BigInteger, nullable=False, index=True,
+        server_default=sqla.FetchedValue(),
+        server_onupdate=sqla.FetchedValue(),
+    )
+
+    __table_args__ = (
+        # Open events by target (most events are eventually closed)
+        sqla.Index(
+            "ix_event_open",
+            *OPEN_EVENT_KEY,
+            unique=True,
+            postgresql_where=state.in_(OPEN_STATES),
+        ),
+        sqla.Index("ix_event_target", target_type, target_id),
+    )
+
     @property
     def duration(self):
         if self.timestamp_start is not None:
@@ -139,6 +224,119 @@ class Event(Base, BaseMixin):
             self.timestamp_end = timestamp_end or ts_now
             self.save()
 
+    @classmethod
+    def _update_open_by_id(cls, item_id, values, precondition=None):
+        """Update a NEW or ONGOING event in a single query
+
+        The event row is locked and its values before update are returned
+        along with the update, so that they can be checked before commit.
+
+        :param int item_id: Event ID.
+        :param dict values: Values to update.
+        :param callable precondition: (optional, default None)
+            Function called with the event before update. It may raise to
+            cancel the update.
+        :returns Event: The instance of the event updated,
+            None if no NEW or ONGOING event matches the ID.
+        """
+        table = cls.__table__
+        old = (
+            sqla.select(table)
+            .where(table.c.id == item_id)
+            .with_for_update()
+            .subquery("old")
+        )
+        stmt = (
+            sqla.update(table)
+            .where(table.c.id == old.c.id)
+            .where(old.c.state != "CLOSED")
+            .values(values)
+            .returning(*old.c, *table.c)
+        )
+        row = db.session.execute(stmt).first()
+        if row is None:
+            db.session.rollback()
+            return None
+        keys = table.c.keys()
+        if precondition is not None:
+            try:
+                precondition(cls(**dict(zip(keys, row[:len(keys)]))))
+            except Exception:
+                db.session.rollback()
+                raise
+        db.session.commit()
+        return cls._merge_values(dict(zip(keys, row[len(keys):])))
+
+    @classmethod
+    def _merge_values(cls, values):
+        """Get an event in session from values returned by a query
+
+        This avoids loading the event again from the database.
+        """
+        item = cls(**values)
+        sqla.orm.make_transient_to_detached(item)
+        return db.session.merge(item, load=False)
+
+    @classmethod
+    def extend_by_id(cls, item_id, *, precondition=None):
+        """Extend an event in a single query.
+
+        See `extend`.
+
+        :param int item_id: Event ID.
+        :param callable precondition: (optional, default None)
+            Function called with the event before update. It may raise to
+            cancel the update.
+        :returns Event: The instance of the event extended,
+            None if the event does not exist.
+        :raises EventError: When trying to extend a CLOSED event.
+        """
+        ts_now = dt.datetime.now(dt.timezone.utc)
+        item = cls._update_open_by_id(
+            item_id,
+            {"state": "ONGOING", "timestamp_last_update": ts_now},
+            precondition=precondition,
+        )
+        if item is None:
+            item = cls.get_by_id(item_id)
+            if item is None:
+                return None
+            if precondition is not None:
+                precondition(item)
+            raise EventError("A closed event can not be extended.")
+        return item
+
+    @classmethod
+    def close_by_id(cls, item_id, timestamp_end=None, *, precondition=None):
+        """Close an event in a single query.
+
+        See `close`. Nothing is done if the event is already CLOSED.
+
+        :param int item_id: Event ID.
+        :param datetime timestamp_end: (optional, default None)
+            Time (tz-aware) of when the event is CLOSED. Set to NOW if None.
+        :param callable precondition: (optional, default None)
+            Function called with the event before update. It may raise to
+            cancel the update.
+        :returns Event: The instance of the event closed,
+            None if the event does not exist.
+        """
+        ts_now = dt.datetime.now(dt.timezone.utc)
+        item = cls._update_open_by_id(
+            item_id,
+            {
+                "state": "CLOSED",
+                "timestamp_last_update": ts_now,
+                "timestamp_end": timestamp_end or ts_now,
+            },
+            precondition=precondition,
+        )
+        if item is None:
+            item = cls.get_by_id(item_id)
+            if item is not None and precondition is not None:
+                precondition(item)
+        return item
+
     @classmethod
     def open(
             cls, category, source, target_type, target_id, level="ERROR",
@@ -167,27 +365,559 @@ class Event(Base, BaseMixin):
         evt.save()
         return evt
 
+    @classmethod
+    def open_or_extend(
+            cls, category, source, target_type, target_id, level="ERROR",
+            timestamp_start=None, description=None):
+        """Create a NEW event or extend the open event with the same
+        category, source and target.
+
+        This is done atomically in a single query, so concurrent calls
+        never create duplicate open events.
+
+        :param string category: The category of the event. See `EventCategory`.
+        :param string source: The source name of the event (service name...).
+        :param string target_type: The target type of the event.
+            Can be "TIMESERIES" for a timeseries target. See `EventTarget`.
+        :param int target_id: The target unique ID (can be a timeseries ID).
+        :param string level: (optional, default "ERROR")
+            The level name of the event, if created. See `EventLevel`.
+        :param datetime timestamp_start: (optional, default None)
+            Time (tz-aware) of when the event is opened, if created.
+            Set to NOW if None.
+        :param string description: (optional, default None)
+            Text to describe the event, if created.
+        :returns Event: The instance of the event created or extended.
+        """
+        ts_now = dt.datetime.now(dt.timezone.utc)
+        stmt = insert(cls).values(
+            category=category, source=source, level=level, state="NEW",
+            target_type=target_type, target_id=target_id,
+            timestamp_start=timestamp_start or ts_now,
+            timestamp_last_update=ts_now, description=description,
+        ).on_conflict_do_update(
+            index_elements=OPEN_EVENT_KEY,
+            index_where=cls.state.in_(OPEN_STATES),
+            set_={"state": "ONGOING", "timestamp_last_update": ts_now},
+        ).returning(*cls.__table__.columns)
+        evt = db.session.execute(
+            sqla.select(cls).from_statement(stmt),
+            execution_options={"populate_existing": True},
+        ).scalar_one()
+        db.session.commit()
+        return evt
+
+    @classmethod
+    def bulk(cls, operations):
+        """Apply event operations in a single transaction.
+
+        Operations are grouped by action and each group is applied in a
+        single query: events are opened first, then extended, then closed.
+
+        :param list operations: Operations as dicts with an "action" key
+            ("open", "extend" or "close") and the parameters of `open`,
+            or of `extend_by_id` or `close_by_id` (with event ID as "id").
+        :returns list: (event, error) tuples, in operations order.
+            error is None or an `EventError`:
+            - `EventConflictError` if opening an event while an event with
+              same category, source and target is NEW or ONGOING
+            - `EventNotFoundError` if the event to extend/close is not found
+            - `EventError` if extending a CLOSED event
+        """
+        ts_now = dt.datetime.now(dt.timezone.utc)
+        results = [None] * len(operations)
+        actions = {"open": [], "extend": [], "close": []}
+        for idx, operation in enumerate(operations):
+            actions[operation["action"]].append((idx, operation))
+        try:
+            rows = cls._bulk_open(actions["open"], results, ts_now)
+            rows += cls._bulk_update(actions["extend"], results, ts_now)
+            rows += cls._bulk_update(
+                actions["close"], results, ts_now, close=True)
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.commit()
+        # Rows are merged in session after commit to avoid reloading them
+        items = {
+            row["id"]: cls._merge_values(dict(row))
+            for row in rows
+        }
+        return [
+            (None if item_id is None else items[item_id], error)
+            for item_id, error in results
+        ]
+
+    @classmethod
+    def _bulk_open(cls, operations, results, ts_now):
+        """Open events in a single query
+
+        Events conflicting with an open event are not created.
+
+        Sets (event ID, error) results and returns event rows.
+        """
+        if not operations:
+            return []
+        table = cls.__table__
+        stmt = insert(table).values([
+            {
+                "category": operation["category"],
+                "source": operation["source"],
+                "level": operation.get("level", "ERROR"),
+                "state": "NEW",
+                "target_type": operation["target_type"],
+                "target_id": operation["target_id"],
+                "timestamp_start": (
+                    operation.get("timestamp_start") or ts_now),
+                "timestamp_last_update": ts_now,
+                "description": operation.get("description"),
+            }
+            for _, operation in operations
+        ]).on_conflict_do_nothing(
+            index_elements=OPEN_EVENT_KEY,
+            index_where=cls.state.in_(OPEN_STATES),
+        ).returning(*table.c)
+        rows = db.session.execute(stmt).mappings().all()
+        opened = {
+            tuple(row[k] for k in OPEN_EVENT_KEY): row["id"] for row in rows
+        }
+        for idx, operation in operations:
+            item_id = opened.pop(
+                tuple(operation[k] for k in OPEN_EVENT_KEY), None)
+            if item_id is None:
+                results[idx] = (
+                    None, EventConflictError("An open event already exists.")
+                )
+            else:
+                results[idx] = (item_id, None)
+        return rows
+
+    @classmethod
+    def _bulk_update(cls, operations, results, ts_now, close=False):
+        """Extend or close NEW or ONGOING events in a single query
+
+        Sets (event ID, error) results and returns event rows.
+        """
+        if not operations:
+            return []
+        table = cls.__table__
+        values = sqla.values(
+            sqla.column("id", sqla.Integer),
+            sqla.column("timestamp_end", sqla.DateTime(timezone=True)),
+            name="v",
+        ).data([
+            (operation["id"], operation.get("timestamp_end"))
+            for _, operation in operations
+        ])
+        if close:
+            new_values = {
+                "state": "CLOSED",
+                "timestamp_last_update": ts_now,
+                "timestamp_end": sqla.func.coalesce(
+                    sqla.cast(
+                        values.c.timestamp_end, sqla.DateTime(timezone=True)
+                    ),
+                    ts_now,
+                ),
+            }
+        else:
+            new_values = {
+                "state": "ONGOING",
+                "timestamp_last_update": ts_now,
+            }
+        stmt = (
+            sqla.update(table)
+            .where(table.c.id == values.c.id)
+            .where(table.c.state != "CLOSED")
+            .values(new_values)
+            .returning(*table.c)
+        )
+        rows = db.session.execute(stmt).mappings().all()
+        updated = {row["id"] for row in rows}
+        missing = {operation["id"] for _, operation in operations} - updated
+        # Events not updated are either not found or CLOSED
+        closed = {}
+        if missing:
+            closed = {
+                row["id"]: row for row in db.session.execute(
+                    sqla.select(table).where(table.c.id.in_(missing))
+                ).mappings()
+            }
+        if close:
+            # Closing a CLOSED event does nothing
+            rows += closed.values()
+            updated |= closed.keys()
+        for idx, operation in operations:
+            item_id = operation["id"]
+            if item_id in updated:
+                results[idx] = (item_id, None)
+            elif item_id in closed:
+                results[idx] = (
+                    None, EventError("A closed event can not be extended.")
+                )
+            else:
+                results[idx] = (
+                    None, EventNotFoundError("Event not found.")
+                )
+        return rows
+
+    @classmethod
+    def close_stale(
+            cls, timeout=None, category_timeouts=None, batch_size=1000):
+        """Close NEW or ONGOING events not updated for a while.
+
+        Events are closed by batches, each batch in its own transaction, to
+        bound lock time. Events locked by another transaction are skipped.
+        The end time of a stale event is its last update time.
+
+        :param str timeout: (optional, default None)
+            Default timeout (PostgreSQL interval). If None, only events in
+            categories with a specific timeout are closed.
+        :param dict category_timeouts: (optional, default None)
+            Timeouts (PostgreSQL interval) by category ID, overriding default
+            timeout.
+        :param int batch_size: (optional, default 1000)
+            Maximum number of events closed per transaction.
+        :returns int: The number of events closed.
+        """
+        category_timeouts = category_timeouts or {}
+        stmt = sqla.text(
+            "WITH timeouts AS ("
+            "  SELECT * FROM unnest("
+            "    CAST(:categories AS text[]), CAST(:timeouts AS interval[])"
+            "  ) AS timeouts(category, timeout)"
+            "), "
+            "stale AS ("
+            "  SELECT event.id FROM event "
+            "  LEFT JOIN timeouts ON timeouts.category = event.category "
+            "  WHERE event.state IN :open_states"
+            "    AND event.timestamp_last_update < now() - COALESCE("
+            "      timeouts.timeout, CAST(:timeout AS interval)"
+            "    ) "
+            "  LIMIT :batch_size "
+            "  FOR UPDATE OF event SKIP LOCKED"
+            ") "
+            "UPDATE event SET"
+            "  state = 'CLOSED',"
+            "  timestamp_end = event.timestamp_last_update,"
+            "  timestamp_last_update = now() "
+            "FROM stale WHERE event.id = stale.id;"
+        ).bindparams(sqla.bindparam("open_states", expanding=True))
+        params = {
+            "categories": list(category_timeouts.keys()),
+            "timeouts": list(category_timeouts.values()),
+            "timeout": timeout,
+            "open_states": OPEN_STATES,
+            "batch_size": batch_size,
+        }
+        nb_closed = 0
+        while True:
+            nb_rows = db.session.execute(stmt, params).rowcount
+            db.session.commit()
+            nb_closed += nb_rows
+            if nb_rows < batch_size:
+                return nb_closed
+
+    @classmethod
+    def get_stats(
+            cls, group_by=(), bucket_width=None, timezone="UTC",
+            include_subcategories=False, **filters):
+        """Compute events statistics.
+
+        Duration of NEW or ONGOING events is computed up to their last
+        update.
+
+        :param list group_by: (optional, default ())
+            Fields to group events by. See `STATS_GROUP_BY`.
+        :param str bucket_width: (optional, default None)
+            Bucket width (ISO 8601 or PostgreSQL interval). If not None,
+            events are also grouped by bucket of start time.
+        :param str timezone: (optional, default "UTC")
+            IANA timezone used to compute buckets.
+        :param bool include_subcategories: (optional, default False)
+            Category filter also matches descendant categories.
+        :param filters: Filters on event fields and time filters
+            (see `filter_time`).
+        :returns list: Rows with group fields, "bucket" if bucket width is
+            set, and event "count", "total_duration" and "mean_duration" in
+            seconds.
+        """
+        for name in group_by:
+            if name not in STATS_GROUP_BY:
+                raise ValueError(f'Invalid group by field "{name}"')
+        time_filters = {
+            name: filters.pop(name)
+            for name in ("start_time", "end_time", "updated_since")
+            if name in filters
+        }
+        entity = cls.get_source(
+            states=[filters["state"]] if "state" in filters else None,
+            start_time=time_filters.get("start_time"),
+            updated_since=time_filters.get("updated_since"),
+        )
+        conditions = cls.filter_time(**time_filters, entity=entity)
+        category = filters.pop("category", None)
+        if category is not None:
+            conditions.append(cls.filter_category(
+                category, include_subcategories, entity=entity))
+        columns = [getattr(entity, name) for name in group_by]
+        if bucket_width is not None:
+            columns.insert(0, sqla.func.timezone(
+                timezone,
+                sqla.func.time_bucket(
+                    sqla.cast(bucket_width, sqla.Interval),
+                    sqla.func.timezone(timezone, entity.timestamp_start),
+                ),
+            ).label("bucket"))
+        duration = (
+            sqla.func.coalesce(
+                entity.timestamp_end, entity.timestamp_last_update) -
+            entity.timestamp_start
+        )
+        stmt = (
+            sqla.select(
+                *columns,
+                sqla.func.count().label("count"),
+                sqla.cast(
+                    sqla.func.extract("epoch", sqla.func.sum(duration)),
+                    sqla.Float,
+                ).label("total_duration"),
+                sqla.cast(
+                    sqla.func.extract("epoch", sqla.func.avg(duration)),
+                    sqla.Float,
+                ).label("mean_duration"),
+            )
+            .select_from(entity)
+            .filter_by(**filters)
+            .filter(*conditions)
+            .group_by(*columns)
+            .order_by(*columns)
+        )
+        return db.session.execute(stmt).mappings().all()
+
+    @classmethod
+    def filter_category(
+            cls, category, include_subcategories=False, entity=None):
+        """Filter on event category
+
+        :param str category: Category ID.
+        :param bool include_subcategories: (optional, default False)
+            Also match descendant categories. Descendants are selected with
+            a recursive CTE, or read from categories cache if
+            `EventCategory.subcategories_cache_enabled` is True.
+        :param entity: (optional, default None)
+            Entity to filter, as returned by `get_source`. Defaults to Event.
+        :returns: Filter clause.
+        """
+        column = (entity or cls).category
+        if include_subcategories:
+            if EventCategory.subcategories_cache_enabled:
+                return column.in_(EventCategory.get_subcategories(category))
+            return column.in_(EventCategory.select_subcategories(category))
+        return column == category
+
+    @classmethod
+    def get_source(cls, states=None, start_time=None, updated_since=None):
+        """Get the entity to query events from
+
+        Archived events are only queried if they may match the filters.
+
+        :param list states: (optional, default None)
+            States filter. If None, all states are queried.
+        :param datetime start_time: (optional, default None)
+            Start time lower bound (tz-aware). If None, no lower bound.
+        :param datetime updated_since: (optional, default None)
+            Last update time lower bound (tz-aware). If None, no lower bound.
+        :returns: Event, or an alias of Event on the union of events and
+            archived events.
+        """
+        if states is not None and "CLOSED" not in states:
+            return cls
+        max_archived_start, max_archived_update = db.session.execute(
+            sqla.select(
+                sqla.func.max(EventArchive.timestamp_start),
+                sqla.func.max(EventArchive.timestamp_last_update),
+            )
+        ).one()
+        if (
+                max_archived_start is None or
+                (start_time is not None and
+                 start_time > max_archived_start) or
+                (updated_since is not None and
+                 updated_since > max_archived_update)
+        ):
+            return cls
+        events = sqla.union_all(
+            sqla.select(cls.__table__),
+            sqla.select(EventArchive.__table__),
+        ).subquery("events")
+        return sqla.orm.aliased(cls, events)
+
+    @classmethod
+    def filter_time(
+            cls, start_time=None, end_time=None, updated_since=None,
+            entity=None):
+        """Filter on event start and last update times
+
+        :param datetime start_time: (optional, default None)
+            Start time lower bound (tz-aware).
+        :param datetime end_time: (optional, default None)
+            Start time exclusive upper bound (tz-aware).
+        :param datetime updated_since: (optional, default None)
+            Last update time lower bound (tz-aware).
+        :param entity: (optional, default None)
+            Entity to filter, as returned by `get_source`. Defaults to Event.
+        :returns list: Filter clauses.
+        """
+        entity = entity or cls
+        conditions = []
+        if start_time is not None:
+            conditions.append(entity.timestamp_start >= start_time)
+        if end_time is not None:
+            conditions.append(entity.timestamp_start < end_time)
+        if updated_since is not None:
+            conditions.append(entity.timestamp_last_update >= updated_since)
+        return conditions
+
+    @classmethod
+    def archive(cls, older_than, batch_size=1000):
+        """Move CLOSED events to archive.
+
+        Events are moved by batches, each batch in its own transaction, to
+        bound lock time.
+
+        :param str older_than: Move events closed before this interval
+            (PostgreSQL interval).
+        :param int batch_size: (optional, default 1000)
+            Maximum number of events moved per transaction.
+        :returns int: The number of events archived.
+        """
+        columns = ", ".join(cls.__table__.columns.keys())
+        stmt = sqla.text(
+            "WITH moved AS ("
+            "  DELETE FROM event WHERE id IN ("
+            "    SELECT id FROM event"
+            "    WHERE state = 'CLOSED'"
+            "      AND timestamp_end < now() - CAST(:older_than AS interval)"
+            "    LIMIT :batch_size"
+            "    FOR UPDATE SKIP LOCKED"
+            "  ) "
+            f"  RETURNING {columns}"
+            ") "
+            f"INSERT INTO event_archive ({columns}) "
+            f"SELECT {columns} FROM moved;"
+        )
+        params = {"older_than": older_than, "batch_size": batch_size}
+        nb_archived = 0
+        while True:
+            nb_rows = db.session.execute(stmt, params).rowcount
+            db.session.commit()
+            nb_archived += nb_rows
+            if nb_rows < batch_size:
+                return nb_archived
+
     @classmethod
     def list_by_state(
-            cls, states=("NEW", "ONGOING",), category=None, source=None,
-            level="ERROR", target_type=None, target_id=None):
+            cls, states=OPEN_STATES, category=None, source=None,
+            level="ERROR", target_type=None, target_id=None,
+            include_subcategories=False, start_time=None, end_time=None,
+            updated_since=None):
         if states is None or len(states) <= 0:
             raise EventError("Missing `state` filter.")
-        state_conditions = tuple((cls.state == x) for x in states)
-        stmt = sqla.select(cls).filter(sqla.or_(*state_conditions))
+        entity = cls.get_source(
+            states=states, start_time=start_time, updated_since=updated_since)
+        stmt = sqla.select(entity).filter(
+            entity.state.in_(states),
+            *cls.filter_time(
+                start_time, end_time, updated_since, entity=entity),
+        )
         if category is not None:
-            stmt = stmt.filter(cls.category == category)
+            stmt = stmt.filter(cls.filter_category(
+                category, include_subcategories, entity=entity))
         if source is not None:
-            stmt = stmt.filter(cls.source == source)
+            stmt = stmt.filter(entity.source == source)
         if level is not None:
-            stmt = stmt.filter(cls.level == level)
+            stmt = stmt.filter(entity.level == level)
         if target_type is not None:
-            stmt = stmt.filter(cls.target_type == target_type)
+            stmt = stmt.filter(entity.target_type == target_type)
         if target_id is not None:
-            stmt = stmt.filter(cls.target_id == target_id)
+            stmt = stmt.filter(entity.target_id == target_id)
         return db.session.execute(stmt).all()
 
 
+class EventArchive(Base, BaseMixin):
+    """Archived CLOSED events
+
+    See `Event.archive`.
+    """
+    __tablename__ = "event_archive"
+
+    # Event ID is kept
+    id = sqla.Column(
+        sqla.Integer, primary_key=True, autoincrement=False, nullable=False)
+    category = sqla.Column(
+        sqla.String,
+        sqla.ForeignKey("event_category.id"),
+        nullable=False
+    )
+    level = sqla.Column(
+        sqla.String,
+        sqla.ForeignKey("event_level.id"),
+        nullable=False
+    )
+    timestamp_start = sqla.Column(
+        sqla.DateTime(timezone=True), nullable=False, index=True)
+    timestamp_end = sqla.Column(sqla.DateTime(timezone=True))
+    source = sqla.Column(sqla.String, nullable=False)
+    target_type = sqla.Column(
+        sqla.String,
+        sqla.ForeignKey("event_target.id"),
+        nullable=False
+    )
+    target_id = sqla.Column(sqla.Integer, nullable=False)
+    state = sqla.Column(
+        sqla.String,
+        sqla.ForeignKey("event_state.id"),
+        nullable=False
+    )
+    timestamp_last_update = sqla.Column(
+        sqla.DateTime(timezone=True), nullable=False, index=True)
+    description = sqla.Column(sqla.String(250))
+    # Event version when archived, same columns order as Event
+    version = sqla.Column(sqla.BigInteger, nullable=False)
+
+    __table_args__ = (
+        sqla.Index("ix_event_archive_target", target_type, target_id),
+    )
+
+
+add_notify_trigger(EventCategory.__table__)
+add_version_trigger(Event.__table__)
+
+
+# Notify event changes on "event" channel, see notifications module
+sqla.event.listen(
+    Event.__table__,
+    "after_create",
+    sqla.DDL(
+        "CREATE OR REPLACE FUNCTION notify_%(table)s() RETURNS trigger AS $$ "
+        "BEGIN "
+        "  PERFORM pg_notify("
+        "    '%(table)s',"
+        "    json_build_object("
+        "      'operation', lower(TG_OP), '%(table)s', row_to_json(NEW)"
+        "    )::text"
+        "  );"
+        "  RETURN NULL;"
+        "END; "
+        "$$ LANGUAGE plpgsql; "
+        "CREATE TRIGGER notify_%(table)s "
+        "AFTER INSERT OR UPDATE ON %(table)s "
+        "FOR EACH ROW EXECUTE PROCEDURE notify_%(table)s();"
+    )
+)
+
+
 # TODO: maybe this is something the concerned service could fill
 @sqla.event.listens_for(EventCategory.__table__, "after_create")
 def _insert_initial_event_categories(target, connection, **kwargs):
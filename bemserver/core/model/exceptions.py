@@ -3,3 +3,11 @@
 
 class EventError(Exception):
     """Event error"""
+
+
+class EventNotFoundError(EventError):
+    """Event not found error"""
+
+
+class EventConflictError(EventError):
+    """Event conflict error"""
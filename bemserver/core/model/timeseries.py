@@ -1,7 +1,10 @@
 """Timeseries"""
 import sqlalchemy as sqla
+from sqlalchemy.dialects.postgresql import insert
 
-from bemserver.core.database import Base
+from bemserver.core.database import (
+    Base, db, add_version_trigger, add_notify_trigger)
+from bemserver.core.cache import TableCache
 
 
 class Timeseries(Base):
@@ -13,3 +16,93 @@ class Timeseries(Base):
     unit = sqla.Column(sqla.String(20))
     min_value = sqla.Column(sqla.Float)
     max_value = sqla.Column(sqla.Float)
+    # Overrides default data retention
+    retention = sqla.Column(sqla.Interval)
+    # Deleted timeseries are hidden until their data is purged
+    deleted = sqla.Column(
+        sqla.Boolean, nullable=False, default=False,
+        server_default=sqla.false(),
+    )
+    # Purge progress: data older than this was deleted
+    purged_until = sqla.Column(sqla.DateTime(timezone=True))
+    # Set by trigger on each modification
+    version = sqla.Column(
+        sqla.BigInteger, nullable=False, index=True,
+        server_default=sqla.FetchedValue(),
+        server_onupdate=sqla.FetchedValue(),
+    )
+
+    @classmethod
+    def upsert_many(cls, items, *, update=True, batch_size=1000):
+        """Insert or update timeseries by name in a single transaction
+
+        Timeseries are written with multi-row statements of batch_size rows.
+        Missing attributes are set to None.
+
+        Names of deleted timeseries can not be reused until they are purged.
+
+        :param list items: Timeseries attributes as dicts, with unique names
+        :param bool update: (optional, default True)
+            Update existing timeseries with same name. If False, an existing
+            name raises an IntegrityError and nothing is written.
+        :param int batch_size: (optional, default 1000)
+            Number of timeseries per statement
+
+        Returns the list of timeseries, in items order.
+        """
+        columns = [
+            col.name for col in cls.__table__.columns
+            if col.name not in ("id", "deleted", "purged_until", "version")
+        ]
+        names = [item["name"] for item in items]
+        if len(set(names)) != len(names):
+            raise ValueError("Duplicate timeseries names")
+
+        rows = []
+        try:
+            for idx in range(0, len(items), batch_size):
+                stmt = insert(cls).values([
+                    {col: item.get(col) for col in columns}
+                    for item in items[idx:idx + batch_size]
+                ])
+                if update:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["name"],
+                        set_={
+                            col: stmt.excluded[col]
+                            for col in columns if col != "name"
+                        },
+                        where=~cls.deleted,
+                    )
+                rows.extend(
+                    db.session.execute(
+                        stmt.returning(*cls.__table__.columns)
+                    ).mappings()
+                )
+        except sqla.exc.DBAPIError:
+            db.session.rollback()
+            raise
+        if len(rows) != len(items):
+            db.session.rollback()
+            raise ValueError("Timeseries name used by a deleted timeseries")
+        db.session.commit()
+        cls.cache.invalidate()
+
+        # Add to session from returned values to avoid loading them again
+        # RETURNING order is not guaranteed
+        ts_by_name = {}
+        for row in rows:
+            item = cls(**row)
+            sqla.orm.make_transient_to_detached(item)
+            ts_by_name[item.name] = db.session.merge(item, load=False)
+        return [ts_by_name[name] for name in names]
+
+
+# Timeseries metadata is cached in-process and invalidated by notifications
+Timeseries.cache = TableCache(
+    Timeseries, indexes=("name", ), channel="timeseries")
+
+
+add_version_trigger(Timeseries.__table__)
+# Notify timeseries modifications on "timeseries" channel
+add_notify_trigger(Timeseries.__table__)
@@ -1,7 +1,7 @@
 """Timeseries data"""
 import sqlalchemy as sqla
 
-from bemserver.core.database import Base
+from bemserver.core.database import Base, db
 
 
 class TimeseriesData(Base):
@@ -21,15 +21,90 @@ class TimeseriesData(Base):
     timeseries = sqla.orm.relationship('Timeseries')
     value = sqla.Column(sqla.Float)
 
+    @classmethod
+    def get_stats(cls, timeseries, start_dt=None, end_dt=None):
+        """Compute timeseries data statistics
 
-sqla.event.listen(
-    TimeseriesData.__table__,
-    "after_create",
-    sqla.DDL(
-        "SELECT create_hypertable("
-        "  '%(table)s',"
-        "  'timestamp',"
-        "  create_default_indexes => False"
-        ");"
+        Statistics are computed in a single pass over the primary key range
+        of each timeseries. Rollups are not included.
+
+        :param list timeseries: List of timeseries IDs
+        :param datetime start_dt: (optional, default None)
+            Time interval lower bound (tz-aware)
+        :param datetime end_dt: (optional, default None)
+            Time interval exclusive upper bound (tz-aware)
+        :returns list: Rows with "timeseries_id", "first_timestamp",
+            "last_timestamp", "count" (including null values), "null_count",
+            "min", "max" and "avg", in timeseries order. Timeseries without
+            data have zero counts and null other statistics.
+        """
+        query = sqla.text(
+            "SELECT ts.id AS timeseries_id,"
+            "  stats.first_timestamp, stats.last_timestamp,"
+            "  COALESCE(stats.count, 0) AS count,"
+            "  COALESCE(stats.null_count, 0) AS null_count,"
+            "  stats.min, stats.max, stats.avg "
+            "FROM unnest(CAST(:timeseries AS integer[]))"
+            "  WITH ORDINALITY AS ts(id, idx) "
+            "LEFT JOIN ("
+            "  SELECT timeseries_id,"
+            "    min(timestamp) AS first_timestamp,"
+            "    max(timestamp) AS last_timestamp,"
+            "    count(*) AS count,"
+            "    count(*) - count(value) AS null_count,"
+            "    min(value) AS min, max(value) AS max, avg(value) AS avg"
+            "  FROM timeseries_data"
+            "  WHERE timeseries_id = ANY(CAST(:timeseries AS integer[]))"
+            "    AND timestamp >= CAST(:start_dt AS timestamptz)"
+            "    AND timestamp < CAST(:end_dt AS timestamptz)"
+            "  GROUP BY timeseries_id"
+            ") AS stats ON stats.timeseries_id = ts.id "
+            "ORDER BY ts.idx;"
+        )
+        params = {
+            "timeseries": list(timeseries),
+            "start_dt": "-infinity" if start_dt is None else start_dt,
+            "end_dt": "infinity" if end_dt is None else end_dt,
+        }
+        return db.session.execute(query, params).mappings().all()
+
+
+class TimeseriesDataRollup(Base):
+    """Timeseries data aggregated over fixed-width buckets
+
+    Raw data is rolled up in this table before being dropped by retention.
+    """
+    __tablename__ = "timeseries_data_rollup"
+    __table_args__ = (
+        sqla.PrimaryKeyConstraint("timeseries_id", "timestamp"),
+    )
+
+    # Bucket start
+    timestamp = sqla.Column(
+        sqla.DateTime(timezone=True)
+    )
+    timeseries_id = sqla.Column(
+        sqla.Integer,
+        sqla.ForeignKey('timeseries.id'),
+        nullable=False,
+    )
+    timeseries = sqla.orm.relationship('Timeseries')
+    min = sqla.Column(sqla.Float)
+    avg = sqla.Column(sqla.Float)
+    max = sqla.Column(sqla.Float)
+    # Number of non-null values
+    count = sqla.Column(sqla.Integer, nullable=False)
+
+
+for table in (TimeseriesData.__table__, TimeseriesDataRollup.__table__):
+    sqla.event.listen(
+        table,
+        "after_create",
+        sqla.DDL(
+            "SELECT create_hypertable("
+            "  '%(table)s',"
+            "  'timestamp',"
+            "  create_default_indexes => False"
+            ");"
+        )
     )
-)
@@ -0,0 +1,199 @@
+"""Database notifications
+
+PostgreSQL notifications (NOTIFY) are received by a single listener
+connection per process and fanned out to subscribers.
+"""
+from contextlib import contextmanager
+import json
+import logging
+import os
+import queue
+import select
+import threading
+
+from .database import db
+
+
+logger = logging.getLogger(__name__)
+
+
+class Notifier:
+    """Fan out PostgreSQL notifications to subscribers
+
+    The listener connection and thread are started on first subscription.
+    Notification payloads are expected to be JSON.
+
+    Each subscriber gets a queue of payloads. Notifications are dropped for
+    subscribers whose queue is full. Alternatively, subscribers may provide a
+    callback, called in the listener thread with each payload.
+
+    :param DBConnection db: DB accessor
+    :param int poll_timeout: (optional, default 1)
+        Max time in seconds between checks for channels to listen to
+    :param int retry_delay: (optional, default 5)
+        Delay in seconds before reconnecting after a connection error
+    """
+    def __init__(self, db, *, poll_timeout=1, retry_delay=5):
+        self._db = db
+        self._poll_timeout = poll_timeout
+        self._retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        # Channels actually listened to
+        self._listening = {}
+        self._thread = None
+        self._stop = None
+        self._pid = None
+
+    def subscribe(self, channel, maxsize=1000, *, callback=None):
+        """Subscribe to a channel
+
+        :param str channel: Notification channel
+        :param int maxsize: (optional, default 1000)
+            Subscriber queue size
+        :param callable callback: (optional, default None)
+            Function called with each payload. It should return quickly.
+
+        Returns a queue of notification payloads, or the callback if given.
+        """
+        subscriber = queue.Queue(maxsize) if callback is None else callback
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+            listening = self._listening.setdefault(
+                channel, threading.Event())
+            self._ensure_listening()
+        # Notifications sent before LISTEN are not received
+        listening.wait(self._poll_timeout + 1)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        """Unsubscribe from a channel
+
+        :param str channel: Notification channel
+        :param Queue|callable subscriber: Value returned by subscribe
+        """
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+                self._listening.pop(channel, None)
+
+    @contextmanager
+    def subscription(self, channel, maxsize=1000):
+        """Context manager subscribing to a channel
+
+        Yields a queue of notification payloads.
+        """
+        subscriber = self.subscribe(channel, maxsize=maxsize)
+        try:
+            yield subscriber
+        finally:
+            self.unsubscribe(channel, subscriber)
+
+    def stop(self):
+        """Stop listening and close listener connection"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None or self._pid != os.getpid():
+                return
+            self._stop.set()
+        thread.join()
+
+    def _ensure_listening(self):
+        # Listener thread does not survive fork
+        if (
+                self._thread is None or
+                self._pid != os.getpid() or
+                not self._thread.is_alive()
+        ):
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop, ), daemon=True,
+                name="bemserver-notifier",
+            )
+            self._thread.start()
+
+    def _run(self, stop):
+        while not stop.is_set():
+            try:
+                self._listen(stop)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Notification listener error")
+                stop.wait(self._retry_delay)
+
+    def _connect(self):
+        # Dedicated connection, not returned to the pool
+        connection = self._db.engine.raw_connection()
+        connection.detach()
+        dbapi_connection = connection.connection
+        dbapi_connection.autocommit = True
+        return dbapi_connection
+
+    def _listen(self, stop):
+        connection = self._connect()
+        try:
+            cursor = connection.cursor()
+            channels = set()
+            while not stop.is_set():
+                with self._lock:
+                    wanted = dict(self._listening)
+                for channel, listening in wanted.items():
+                    if channel not in channels:
+                        cursor.execute(f'LISTEN "{channel}";')
+                    listening.set()
+                for channel in channels - wanted.keys():
+                    cursor.execute(f'UNLISTEN "{channel}";')
+                channels = set(wanted)
+                if select.select(
+                    [connection], [], [], self._poll_timeout
+                ) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    self._dispatch(notify.channel, notify.payload)
+        finally:
+            with self._lock:
+                for listening in self._listening.values():
+                    listening.clear()
+            connection.close()
+
+    def _dispatch(self, channel, payload):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            logger.warning("Invalid notification payload on %s", channel)
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            if callable(subscriber):
+                try:
+                    subscriber(payload)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Notification callback error")
+                continue
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                logger.warning("Notification dropped for slow subscriber")
+
+
+notifier = Notifier(db)
+
+
+def listen(subscriber, timeout):
+    """Iterate over notification payloads
+
+    :param Queue subscriber: Queue returned by subscribe
+    :param int timeout: Timeout in seconds
+
+    Yields None if no notification was received before timeout.
+    """
+    while True:
+        try:
+            yield subscriber.get(timeout=timeout)
+        except queue.Empty:
+            yield None
@@ -0,0 +1,692 @@
+"""TimescaleDB hypertable management"""
+import itertools
+
+import sqlalchemy as sqla
+
+from .database import db
+from .model import Timeseries, TimeseriesData, TimeseriesDataRollup
+
+
+HYPERTABLE = TimeseriesData.__tablename__
+ROLLUP_HYPERTABLE = TimeseriesDataRollup.__tablename__
+# Index used to reorder chunks
+REORDER_INDEX = f"{HYPERTABLE}_pkey"
+
+
+def configure_hypertable(chunk_time_interval=None, number_partitions=None):
+    """Set timeseries data hypertable chunking
+
+    :param str chunk_time_interval: (optional, default None)
+        Chunk time interval (PostgreSQL interval). Only applies to chunks
+        created afterwards. If None, the interval is not modified.
+    :param int number_partitions: (optional, default None)
+        Number of hash partitions on timeseries ID. Space partitioning can
+        only be added while the hypertable is empty. If None, no space
+        partitioning is added.
+    """
+    if chunk_time_interval is not None:
+        db.session.execute(
+            sqla.text(
+                "SELECT set_chunk_time_interval("
+                "  :hypertable, CAST(:chunk_time_interval AS interval)"
+                ");"
+            ),
+            {
+                "hypertable": HYPERTABLE,
+                "chunk_time_interval": chunk_time_interval,
+            },
+        )
+    if number_partitions is not None:
+        db.session.execute(
+            sqla.text(
+                "SELECT add_dimension("
+                "  :hypertable, 'timeseries_id',"
+                "  number_partitions => :number_partitions,"
+                "  if_not_exists => true"
+                ");"
+            ),
+            {
+                "hypertable": HYPERTABLE,
+                "number_partitions": number_partitions,
+            },
+        )
+    db.session.commit()
+
+
+def is_compression_enabled():
+    """Return True if compression is enabled on timeseries data hypertable"""
+    return db.session.execute(
+        sqla.text(
+            "SELECT compression_enabled "
+            "FROM timescaledb_information.hypertables "
+            "WHERE hypertable_name = :hypertable;"
+        ),
+        {"hypertable": HYPERTABLE},
+    ).scalar()
+
+
+def set_compression(compress_after=None):
+    """Enable native compression on timeseries data hypertable
+
+    Data is segmented by timeseries ID and ordered by timestamp.
+
+    :param str compress_after: (optional, default None)
+        Compress chunks older than this interval (PostgreSQL interval).
+        If None, no compression policy is set and chunks must be compressed
+        manually (see :func:`compress_chunks`).
+    """
+    if not is_compression_enabled():
+        db.session.execute(
+            sqla.text(
+                f"ALTER TABLE {HYPERTABLE} SET ("
+                "  timescaledb.compress,"
+                "  timescaledb.compress_segmentby = 'timeseries_id',"
+                "  timescaledb.compress_orderby = 'timestamp'"
+                ");"
+            )
+        )
+    db.session.execute(
+        sqla.text(
+            "SELECT remove_compression_policy("
+            "  :hypertable, if_exists => true"
+            ");"
+        ),
+        {"hypertable": HYPERTABLE},
+    )
+    if compress_after is not None:
+        db.session.execute(
+            sqla.text(
+                "SELECT add_compression_policy("
+                "  :hypertable, CAST(:compress_after AS interval)"
+                ");"
+            ),
+            {"hypertable": HYPERTABLE, "compress_after": compress_after},
+        )
+    db.session.commit()
+
+
+def compress_chunks(older_than):
+    """Compress uncompressed chunks older than an interval
+
+    :param str older_than: Interval (PostgreSQL interval)
+
+    Returns the number of chunks compressed.
+    """
+    ret = db.session.execute(
+        sqla.text(
+            "SELECT compress_chunk("
+            "  format('%I.%I', chunk_schema, chunk_name)::regclass"
+            ") "
+            "FROM timescaledb_information.chunks "
+            "WHERE hypertable_name = :hypertable "
+            "  AND NOT is_compressed "
+            "  AND range_end <= now() - CAST(:older_than AS interval);"
+        ),
+        {"hypertable": HYPERTABLE, "older_than": older_than},
+    ).all()
+    db.session.commit()
+    return len(ret)
+
+
+def decompress_chunks(session, timestamps):
+    """Decompress compressed chunks containing timestamps
+
+    Used before writing into chunks that may be compressed. Decompressed
+    chunks should be compressed again after writing, see
+    :func:`recompress_chunks`.
+
+    Does not commit.
+
+    :param Session session: DB session
+    :param list timestamps: Timestamps (datetimes or strings)
+
+    Returns the list of decompressed chunks.
+    """
+    if not timestamps:
+        return []
+    return session.execute(
+        sqla.text(
+            "SELECT chunk, decompress_chunk(CAST(chunk AS regclass)) "
+            "FROM ("
+            "  SELECT format('%I.%I', chunk_schema, chunk_name) AS chunk"
+            "  FROM timescaledb_information.chunks"
+            "  WHERE hypertable_name = :hypertable"
+            "    AND is_compressed"
+            "    AND EXISTS ("
+            "      SELECT FROM unnest(CAST(:timestamps AS timestamptz[])) ts"
+            "      WHERE ts >= range_start AND ts < range_end"
+            "    )"
+            ") chunks;"
+        ),
+        {"hypertable": HYPERTABLE, "timestamps": list(timestamps)},
+    ).scalars().all()
+
+
+def recompress_chunks(session, chunks):
+    """Compress chunks decompressed by :func:`decompress_chunks`
+
+    Commits.
+
+    :param Session session: DB session
+    :param list chunks: Chunk names
+    """
+    for chunk in chunks:
+        session.execute(
+            sqla.text(
+                "SELECT compress_chunk("
+                "  CAST(:chunk AS regclass), if_not_compressed => true"
+                ");"
+            ),
+            {"chunk": chunk},
+        )
+        session.commit()
+
+
+def maintain_chunks(*, reorder=True):
+    """Analyze and reorder chunks modified since last analyze
+
+    Meant to be run after bulk imports. Compressed chunks are skipped.
+
+    :param bool reorder: (optional, default True)
+        Reorder chunks by timeseries ID and timestamp before analyzing.
+
+    Returns the list of maintained chunks.
+    """
+    chunks = db.session.execute(
+        sqla.text(
+            "SELECT format('%I.%I', chunk_schema, chunk_name) "
+            "FROM timescaledb_information.chunks chunk "
+            "JOIN pg_stat_user_tables stat "
+            "  ON stat.schemaname = chunk.chunk_schema "
+            "  AND stat.relname = chunk.chunk_name "
+            "WHERE hypertable_name = :hypertable "
+            "  AND NOT is_compressed "
+            "  AND stat.n_mod_since_analyze > 0 "
+            "ORDER BY range_start;"
+        ),
+        {"hypertable": HYPERTABLE},
+    ).scalars().all()
+    db.session.commit()
+    for chunk in chunks:
+        if reorder:
+            # reorder_chunk can't run inside a transaction block
+            with db.engine.connect().execution_options(
+                    isolation_level="AUTOCOMMIT"
+            ) as connection:
+                connection.execute(
+                    sqla.text(
+                        "SELECT reorder_chunk("
+                        "  CAST(:chunk AS regclass),"
+                        "  index => CAST(:index AS regclass)"
+                        ");"
+                    ),
+                    {"chunk": chunk, "index": REORDER_INDEX},
+                )
+        # Chunk name is escaped by format above
+        db.session.execute(sqla.text(f"ANALYZE {chunk};"))
+        db.session.commit()
+    return chunks
+
+
+def get_chunk_sizes():
+    """Get timeseries data chunks sizes
+
+    Returns a list of (chunk name, range start, range end, is compressed,
+    total size in bytes) rows.
+    """
+    return db.session.execute(
+        sqla.text(
+            "SELECT chunk.chunk_name, range_start, range_end,"
+            "  is_compressed, total_bytes "
+            "FROM timescaledb_information.chunks chunk "
+            "JOIN chunks_detailed_size(:hypertable) size "
+            "  ON size.chunk_schema = chunk.chunk_schema "
+            "  AND size.chunk_name = chunk.chunk_name "
+            "WHERE hypertable_name = :hypertable "
+            "ORDER BY range_start, chunk.chunk_name;"
+        ),
+        {"hypertable": HYPERTABLE},
+    ).all()
+
+
+# Upsert rollup buckets from a "data" relation. Late data is merged into
+# already rolled up buckets.
+_ROLLUP_UPSERT = (
+    "INSERT INTO timeseries_data_rollup AS rollup"
+    "  (timestamp, timeseries_id, min, avg, max, count) "
+    "SELECT"
+    "  time_bucket("
+    "    CAST(:rollup_interval AS interval), data.timestamp"
+    "  ) AS bucket,"
+    "  data.timeseries_id,"
+    "  min(data.value), avg(data.value), max(data.value),"
+    "  count(data.value) "
+    "FROM {source} "
+    "GROUP BY bucket, data.timeseries_id "
+    "ON CONFLICT (timeseries_id, timestamp) DO UPDATE SET"
+    "  min = LEAST(rollup.min, excluded.min),"
+    "  avg = ("
+    "    COALESCE(rollup.avg * rollup.count, 0) +"
+    "    COALESCE(excluded.avg * excluded.count, 0)"
+    "  ) / NULLIF(rollup.count + excluded.count, 0),"
+    "  max = GREATEST(rollup.max, excluded.max),"
+    "  count = rollup.count + excluded.count"
+)
+
+_CUTOFFS = (
+    "cutoffs AS ("
+    "  SELECT * FROM unnest("
+    "    CAST(:timeseries AS integer[]), CAST(:cutoffs AS timestamptz[])"
+    "  ) AS cutoffs (timeseries_id, cutoff)"
+    ")"
+)
+
+
+def apply_retention(
+        retention=None, rollup_interval="15 minutes", batch_size=10000):
+    """Roll up and delete expired timeseries data
+
+    The retention of a timeseries is its own retention, if set, else the
+    default retention. Timeseries with no retention are kept forever.
+
+    Expired raw data is aggregated (min, avg, max, count) into rollup
+    buckets and deleted chunk by chunk. In each chunk, rows are rolled up
+    and deleted in batches of batch_size rows, each in its own transaction,
+    to avoid long transactions and locks. Expiry dates are aligned on bucket
+    boundaries so that rolled up buckets are complete. Chunks only
+    containing expired data are rolled up and dropped rather than deleted
+    row by row. Compressed chunks containing expired rows are decompressed.
+
+    :param str retention: (optional, default None)
+        Default retention (PostgreSQL interval)
+    :param str rollup_interval: (optional, default "15 minutes")
+        Rollup bucket width (PostgreSQL interval). Must not be changed once
+        data was rolled up.
+    :param int batch_size: (optional, default 10000)
+        Maximum number of rows deleted per transaction
+
+    Returns the number of rollup bucket writes (a bucket spanning several
+    batches is written once per batch), of chunks dropped and of rows
+    deleted.
+    """
+    # Compute expiry dates once for the whole run
+    cutoffs = db.session.execute(
+        sqla.text(
+            "SELECT id,"
+            "  time_bucket("
+            "    CAST(:rollup_interval AS interval),"
+            "    now() - COALESCE(retention, CAST(:retention AS interval))"
+            "  ) "
+            "FROM timeseries;"
+        ),
+        {"retention": retention, "rollup_interval": rollup_interval},
+    ).all()
+    db.session.commit()
+    expired = [(ts_id, cutoff) for ts_id, cutoff in cutoffs if cutoff]
+    if not expired:
+        return 0, 0, 0
+    all_expire = len(expired) == len(cutoffs)
+    min_cutoff = min(cutoff for _, cutoff in expired)
+    max_cutoff = max(cutoff for _, cutoff in expired)
+    params = {
+        "timeseries": [ts_id for ts_id, _ in expired],
+        "cutoffs": [cutoff for _, cutoff in expired],
+        "rollup_interval": rollup_interval,
+        "batch_size": batch_size,
+    }
+
+    nb_buckets = 0
+    nb_chunks = 0
+    nb_rows = 0
+
+    # Space partitions of a time range share range bounds
+    for (start, end), chunks in itertools.groupby(
+            _get_chunks(HYPERTABLE), key=lambda chunk: chunk[1:3]
+    ):
+        if start >= max_cutoff:
+            break
+        chunks = list(chunks)
+
+        # All data in time range expired: roll up and drop chunks
+        if all_expire and end <= min_cutoff:
+            for chunk, *_ in chunks:
+                # Block writes until chunk is dropped
+                # Chunk name is escaped by format in _get_chunks
+                db.session.execute(
+                    sqla.text(
+                        f"LOCK TABLE {chunk} IN SHARE ROW EXCLUSIVE MODE;")
+                )
+            nb_buckets += db.session.execute(
+                sqla.text(
+                    _ROLLUP_UPSERT.format(
+                        source=(
+                            "timeseries_data data "
+                            "WHERE data.timestamp >= :start "
+                            "  AND data.timestamp < :end"
+                        )
+                    ) + ";"
+                ),
+                {
+                    "rollup_interval": rollup_interval,
+                    "start": start,
+                    "end": end,
+                },
+            ).rowcount
+            nb_chunks += len(
+                db.session.execute(
+                    sqla.text(
+                        "SELECT drop_chunks("
+                        "  :hypertable,"
+                        "  older_than => :end, newer_than => :start"
+                        ");"
+                    ),
+                    {"hypertable": HYPERTABLE, "start": start, "end": end},
+                ).all()
+            )
+            db.session.commit()
+            continue
+
+        for chunk, *_, is_compressed in chunks:
+            # Chunk name is escaped by format in _get_chunks
+            expired_rows = (
+                f"SELECT data.ctid FROM {chunk} data "
+                "JOIN cutoffs USING (timeseries_id) "
+                "WHERE data.timestamp < cutoffs.cutoff"
+            )
+            # DELETE is not supported on compressed chunks: only decompress
+            # chunks containing expired rows
+            if is_compressed:
+                has_expired_rows = db.session.execute(
+                    sqla.text(
+                        f"WITH {_CUTOFFS} SELECT EXISTS ({expired_rows});"),
+                    params,
+                ).scalar()
+                db.session.commit()
+                if not has_expired_rows:
+                    continue
+                _decompress_chunk(chunk)
+            # Roll up and delete each batch atomically
+            while True:
+                nb_batch, nb_batch_buckets = db.session.execute(
+                    sqla.text(
+                        f"WITH {_CUTOFFS}, "
+                        "data AS ("
+                        f"  DELETE FROM {chunk} "
+                        "  WHERE ctid = ANY(ARRAY("
+                        f"    {expired_rows} LIMIT :batch_size"
+                        "  ))"
+                        "  RETURNING timestamp, timeseries_id, value"
+                        "), "
+                        "buckets AS ("
+                        f"  {_ROLLUP_UPSERT.format(source='data')}"
+                        "  RETURNING 1"
+                        ") "
+                        "SELECT"
+                        "  (SELECT count(*) FROM data),"
+                        "  (SELECT count(*) FROM buckets);"
+                    ),
+                    params,
+                ).one()
+                db.session.commit()
+                nb_rows += nb_batch
+                nb_buckets += nb_batch_buckets
+                if nb_batch < batch_size:
+                    break
+
+    return nb_buckets, nb_chunks, nb_rows
+
+
+def _get_chunks(hypertable):
+    """Get chunks of a hypertable ordered by range start
+
+    Returns a list of (chunk name, range start, range end, is compressed)
+    rows. Chunk name is escaped.
+    """
+    chunks = db.session.execute(
+        sqla.text(
+            "SELECT format('%I.%I', chunk_schema, chunk_name),"
+            "  range_start, range_end, is_compressed "
+            "FROM timescaledb_information.chunks "
+            "WHERE hypertable_name = :hypertable "
+            "ORDER BY range_start, chunk_name;"
+        ),
+        {"hypertable": hypertable},
+    ).all()
+    db.session.commit()
+    return chunks
+
+
+def _delete_chunk_rows(
+        chunk, timeseries, batch_size,
+        start_dt="-infinity", end_dt="infinity"
+):
+    """Delete timeseries rows from a chunk, committing every batch
+
+    Returns the number of rows deleted.
+    """
+    nb_rows = 0
+    while True:
+        # Chunk name is escaped by format in _get_chunks
+        nb_batch = db.session.execute(
+            sqla.text(
+                f"DELETE FROM {chunk} "
+                "WHERE ctid = ANY(ARRAY("
+                f"  SELECT ctid FROM {chunk}"
+                "  WHERE timeseries_id = ANY(:timeseries)"
+                "    AND timestamp >= CAST(:start_dt AS timestamptz)"
+                "    AND timestamp < CAST(:end_dt AS timestamptz)"
+                "  LIMIT :batch_size"
+                "));"
+            ),
+            {
+                "timeseries": timeseries,
+                "batch_size": batch_size,
+                "start_dt": start_dt,
+                "end_dt": end_dt,
+            },
+        ).rowcount
+        db.session.commit()
+        nb_rows += nb_batch
+        if nb_batch < batch_size:
+            return nb_rows
+
+
+def _chunk_has_rows(
+        chunk, timeseries, start_dt="-infinity", end_dt="infinity"):
+    """Check a chunk contains timeseries rows in a time interval"""
+    # Chunk name is escaped by format in _get_chunks
+    has_rows = db.session.execute(
+        sqla.text(
+            "SELECT EXISTS ("
+            f"  SELECT FROM {chunk}"
+            "  WHERE timeseries_id = ANY(:timeseries)"
+            "    AND timestamp >= CAST(:start_dt AS timestamptz)"
+            "    AND timestamp < CAST(:end_dt AS timestamptz)"
+            ");"
+        ),
+        {"timeseries": timeseries, "start_dt": start_dt, "end_dt": end_dt},
+    ).scalar()
+    db.session.commit()
+    return has_rows
+
+
+def _decompress_chunk(chunk):
+    """Decompress a chunk, committing"""
+    db.session.execute(
+        sqla.text("SELECT decompress_chunk(CAST(:chunk AS regclass));"),
+        {"chunk": chunk},
+    )
+    db.session.commit()
+
+
+def purge_deleted_timeseries(batch_size=10000):
+    """Delete data of deleted timeseries, then deleted timeseries
+
+    Data is deleted chunk by chunk in batches of batch_size rows, each in
+    its own transaction, to avoid long transactions and locks. Compressed
+    chunks containing data to delete are decompressed.
+
+    Progress is saved in timeseries purged_until attribute after each time
+    range, so an interrupted purge resumes where it stopped.
+
+    Timeseries are deleted once all their data is deleted.
+
+    :param int batch_size: (optional, default 10000)
+        Maximum number of rows deleted per transaction
+
+    Returns the number of timeseries and of data rows deleted.
+    """
+    table = Timeseries.__table__
+    progress = dict(
+        db.session.execute(
+            sqla.select(table.c.id, table.c.purged_until)
+            .where(table.c.deleted)
+        ).all()
+    )
+    db.session.commit()
+    if not progress:
+        return 0, 0
+
+    nb_rows = 0
+
+    # Space partitions of a time range share range bounds
+    for (start, end), chunks in itertools.groupby(
+            _get_chunks(HYPERTABLE), key=lambda chunk: chunk[1:3]
+    ):
+        chunks = list(chunks)
+        timeseries = [
+            ts_id for ts_id, purged_until in progress.items()
+            if purged_until is None or purged_until < end
+        ]
+        if not timeseries:
+            continue
+        for chunk, *_, is_compressed in chunks:
+            # DELETE is not supported on compressed chunks: only
+            # decompress chunks containing data to delete
+            if is_compressed:
+                if not _chunk_has_rows(chunk, timeseries):
+                    continue
+                _decompress_chunk(chunk)
+            nb_rows += _delete_chunk_rows(chunk, timeseries, batch_size)
+        db.session.execute(
+            sqla.update(table)
+            .where(table.c.id.in_(timeseries))
+            .values(purged_until=end)
+        )
+        db.session.commit()
+        progress.update({ts_id: end for ts_id in timeseries})
+
+    for chunk, *_ in _get_chunks(ROLLUP_HYPERTABLE):
+        nb_rows += _delete_chunk_rows(chunk, list(progress), batch_size)
+
+    nb_timeseries = db.session.execute(
+        sqla.delete(table).where(
+            table.c.id.in_(list(progress)),
+            ~sqla.exists().where(
+                TimeseriesData.timeseries_id == table.c.id),
+            ~sqla.exists().where(
+                TimeseriesDataRollup.timeseries_id == table.c.id),
+        )
+    ).rowcount
+    # Data written during purge: start over on next purge
+    db.session.execute(
+        sqla.update(table)
+        .where(table.c.id.in_(list(progress)))
+        .values(purged_until=None)
+    )
+    db.session.commit()
+    Timeseries.cache.invalidate()
+
+    return nb_timeseries, nb_rows
+
+
+def delete_data(start_dt, end_dt, timeseries, batch_size=10000):
+    """Delete timeseries data in a time interval
+
+    Data is deleted chunk by chunk. Chunks fully covered by the interval
+    and only containing data of the timeseries are dropped. In other chunks,
+    rows are deleted in batches of batch_size rows, each in its own
+    transaction, to avoid long transactions and locks. Compressed chunks
+    containing rows to delete are decompressed.
+
+    Rollup buckets starting in the interval are deleted as well. Buckets
+    starting before the interval are kept.
+
+    :param datetime start_dt: Time interval lower bound (tz-aware)
+    :param datetime end_dt: Time interval exclusive upper bound (tz-aware)
+    :param list timeseries: List of timeseries IDs
+    :param int batch_size: (optional, default 10000)
+        Maximum number of rows deleted per transaction
+
+    Returns the number of chunks dropped and of rows deleted, including
+    rollup rows.
+    """
+    timeseries = list(timeseries)
+    params = {
+        "timeseries": timeseries,
+        "start_dt": start_dt,
+        "end_dt": end_dt,
+    }
+    nb_chunks = 0
+    nb_rows = 0
+    for chunk, range_start, range_end, is_compressed in _get_chunks(
+            HYPERTABLE):
+        if range_end <= start_dt or range_start >= end_dt:
+            continue
+        # Chunk name is escaped by format in _get_chunks
+        if start_dt <= range_start and range_end <= end_dt:
+            # Block writes until chunk is dropped
+            db.session.execute(
+                sqla.text(f"LOCK TABLE {chunk} IN SHARE ROW EXCLUSIVE MODE;")
+            )
+            has_other_data = db.session.execute(
+                sqla.text(
+                    "SELECT EXISTS ("
+                    f"  SELECT FROM {chunk}"
+                    "  WHERE timeseries_id <> ALL(:timeseries)"
+                    ");"
+                ),
+                params,
+            ).scalar()
+            if not has_other_data:
+                db.session.execute(sqla.text(f"DROP TABLE {chunk};"))
+                db.session.commit()
+                nb_chunks += 1
+                continue
+            db.session.commit()
+        # DELETE is not supported on compressed chunks: only decompress
+        # chunks containing rows to delete
+        if is_compressed:
+            if not _chunk_has_rows(chunk, timeseries, start_dt, end_dt):
+                continue
+            _decompress_chunk(chunk)
+        nb_rows += _delete_chunk_rows(
+            chunk, timeseries, batch_size, start_dt, end_dt)
+
+    for chunk, range_start, range_end, _ in _get_chunks(ROLLUP_HYPERTABLE):
+        if range_end <= start_dt or range_start >= end_dt:
+            continue
+        nb_rows += _delete_chunk_rows(
+            chunk, timeseries, batch_size, start_dt, end_dt)
+
+    return nb_chunks, nb_rows
+
+
+def get_purge_progress(purged_until):
+    """Get timeseries data purge progress
+
+    :param datetime purged_until: Timeseries purged_until attribute
+
+    Returns the number of timeseries data chunks purged and the total
+    number of chunks.
+    """
+    return db.session.execute(
+        sqla.text(
+            "SELECT"
+            "  count(*) FILTER (WHERE range_end <= :purged_until),"
+            "  count(*) "
+            "FROM timescaledb_information.chunks "
+            "WHERE hypertable_name = :hypertable;"
+        ),
+        {"hypertable": HYPERTABLE, "purged_until": purged_until},
+    ).one()
@@ -0,0 +1,124 @@
+"""Event queries benchmark
+
+Measures event query latency as the event table grows.
+
+Tables are recreated in the target database: do not run on production data.
+
+    python benchmarks/event_queries.py postgresql://user@localhost/bench
+
+Use --drop-indexes to compare with the primary key index only.
+"""
+import argparse
+import datetime as dt
+import statistics
+import time
+
+import sqlalchemy as sqla
+
+from bemserver.core.database import db
+from bemserver.core.model import Event
+
+
+# Events are spread over NB_TARGETS timeseries, 1% of them are open
+NB_TARGETS = 1000
+OPEN_RATIO = 100
+
+
+def populate(start, stop):
+    """Insert events with IDs in [start, stop)"""
+    db.session.execute(
+        sqla.text(
+            "INSERT INTO event ("
+            "  category, level, timestamp_start, timestamp_end, source,"
+            "  target_type, target_id, state, timestamp_last_update"
+            ") "
+            "SELECT"
+            "  'observation_missing', 'ERROR',"
+            "  ts, CASE WHEN i % :open_ratio = 0 THEN NULL ELSE ts END,"
+            "  'src', 'TIMESERIES', i % :nb_targets,"
+            "  CASE WHEN i % :open_ratio = 0 THEN 'ONGOING' ELSE 'CLOSED' END,"
+            "  ts "
+            "FROM generate_series(:start, :stop - 1) i,"
+            "  LATERAL (SELECT :origin + i * interval '1 minute' AS ts) t;"
+        ),
+        {
+            "start": start,
+            "stop": stop,
+            "open_ratio": OPEN_RATIO,
+            "nb_targets": NB_TARGETS,
+            "origin": dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc),
+        },
+    )
+    db.session.commit()
+    db.session.execute(sqla.text("ANALYZE event;"))
+    db.session.commit()
+
+
+QUERIES = {
+    "open events by target": lambda: Event.list_by_state(
+        target_type="TIMESERIES", target_id=NB_TARGETS // 2),
+    "events by target": lambda: db.session.query(Event).filter_by(
+        target_type="TIMESERIES", target_id=NB_TARGETS // 2).all(),
+    "events by start time": lambda: db.session.query(Event).filter(
+        Event.timestamp_start >= dt.datetime(
+            2020, 1, 2, tzinfo=dt.timezone.utc),
+        Event.timestamp_start < dt.datetime(
+            2020, 1, 2, 1, tzinfo=dt.timezone.utc),
+    ).all(),
+}
+
+
+def measure(query, repeat):
+    """Return median query duration in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        durations.append(time.perf_counter() - start)
+        db.session.rollback()
+    return statistics.median(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("db_url", help="Database URL")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+",
+        default=(10_000, 100_000, 1_000_000, 5_000_000),
+        help="Table sizes to measure",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Runs per query")
+    parser.add_argument(
+        "--drop-indexes", action="store_true",
+        help="Drop event indexes (except primary key)",
+    )
+    args = parser.parse_args()
+
+    db.set_db_url(args.db_url)
+    db.setup_tables()
+    if args.drop_indexes:
+        for index in Event.__table__.indexes:
+            db.session.execute(sqla.text(f"DROP INDEX {index.name};"))
+        db.session.commit()
+
+    print("rows", *QUERIES, sep="\t")
+    size = 0
+    for target_size in sorted(args.sizes):
+        populate(size, target_size)
+        size = target_size
+        print(
+            size,
+            *(
+                f"{measure(query, args.repeat):.2f} ms"
+                for query in QUERIES.values()
+            ),
+            sep="\t",
+        )
+
+    db.session.remove()
+    db.dispose()
+
+
+if __name__ == "__main__":
+    main()
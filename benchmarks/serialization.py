@@ -0,0 +1,124 @@
+"""Serialization benchmark
+
+Measures event list response serialization time: schema dump, ETag
+computation and JSON encoding. Compares marshmallow's default dump with a
+post_dump hook removing None values (previous implementation) with the
+optimized dump, and Flask's JSON encoder with orjson encoder.
+
+No database is needed.
+
+    python benchmarks/serialization.py
+"""
+import argparse
+import datetime as dt
+import statistics
+import time
+
+import flask
+import marshmallow as ma
+
+from bemserver.core.model import Event
+from bemserver.app.api import Blueprint
+from bemserver.app.api.extensions.json_encoder import ORJSONEncoder, orjson
+from bemserver.app.api.resources.events.schemas import EventSchema
+
+
+class LegacyEventSchema(EventSchema):
+    """Event schema with marshmallow's dump and None removal hook"""
+
+    def _serialize(self, obj, *, many=False):
+        return ma.Schema._serialize(self, obj, many=many)
+
+    @ma.post_dump
+    def remove_none_values(self, data, **kwargs):
+        return {
+            key: value for key, value in data.items() if value is not None
+        }
+
+
+def make_events(nb_events):
+    """Build events, half of them closed"""
+    origin = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+    return [
+        Event(
+            id=idx,
+            category="observation_missing",
+            level="ERROR",
+            state="CLOSED" if idx % 2 else "ONGOING",
+            source="src",
+            target_type="TIMESERIES",
+            target_id=idx % 100,
+            timestamp_start=origin + dt.timedelta(minutes=idx),
+            timestamp_last_update=origin + dt.timedelta(minutes=idx + 1),
+            timestamp_end=(
+                origin + dt.timedelta(minutes=idx + 1) if idx % 2 else None
+            ),
+            description=None,
+        )
+        for idx in range(nb_events)
+    ]
+
+
+def measure(func, repeat):
+    """Return median duration in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=(10, 100, 1000, 10_000),
+        help="Page sizes to measure",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Runs per measure")
+    args = parser.parse_args()
+
+    app = flask.Flask(__name__)
+    encoders = {"json": flask.json.JSONEncoder}
+    if orjson is not None:
+        encoders["orjson"] = ORJSONEncoder
+    schemas = {
+        "legacy": LegacyEventSchema(many=True),
+        "optimized": EventSchema(many=True),
+    }
+
+    def response(schema, events):
+        # Same steps as an ETag-enabled list endpoint
+        data = schema.dump(events)
+        Blueprint._generate_etag(data)
+        return flask.jsonify(data)
+
+    print(
+        "items",
+        *(f"dump {name}" for name in schemas),
+        *(
+            f"response {schema_name} {encoder_name}"
+            for schema_name in schemas
+            for encoder_name in encoders
+        ),
+        sep="\t",
+    )
+    for size in args.sizes:
+        events = make_events(size)
+        durations = [
+            measure(lambda: schema.dump(events), args.repeat)
+            for schema in schemas.values()
+        ]
+        for schema in schemas.values():
+            for encoder in encoders.values():
+                app.json_encoder = encoder
+                with app.app_context():
+                    durations.append(
+                        measure(lambda: response(schema, events), args.repeat)
+                    )
+        print(size, *(f"{ms:.2f} ms" for ms in durations), sep="\t")
+
+
+if __name__ == "__main__":
+    main()
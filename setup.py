@@ -32,11 +32,14 @@ setup(
         "flask>=1.1.0",
         "python-dotenv>=0.9.0",
         "psycopg2>=2.8.0",
-        "sqlalchemy>=1.4.0",
-        "marshmallow>=3.10.0,<4.0",
+        "sqlalchemy>=1.4.33",
+        "marshmallow>=3.13.0,<4.0",
         "marshmallow-sqlalchemy>=0.24.0",
         "flask_smorest>=0.29.0<0.30",
         "pandas>=1.2.3",
     ],
+    extras_require={
+        "orjson": ["orjson>=3.6.0"],
+    },
     packages=find_packages(exclude=["tests*"]),
 )
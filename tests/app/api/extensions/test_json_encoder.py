@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import datetime as dt
+import enum
+import json
+import uuid
+
+import flask
+from flask.json import JSONEncoder
+import pytest
+
+from bemserver.app.api.extensions.json_encoder import (
+    ORJSONEncoder, init_app)
+
+
+class TestJSONEncoder:
+
+    def test_orjson_encoder(self):
+
+        pytest.importorskip("orjson")
+
+        data = {
+            "b": [1, 1.5, None, True, "é"],
+            "a": {
+                "date": dt.date(2020, 1, 1),
+                "datetime": dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc),
+                "uuid": uuid.UUID(int=1),
+            },
+        }
+
+        app = flask.Flask(__name__)
+        app.config["JSON_AS_ASCII"] = False
+        outputs = []
+        for encoder in (JSONEncoder, ORJSONEncoder):
+            app.json_encoder = encoder
+            with app.app_context():
+                outputs.append(
+                    (flask.json.dumps(data), flask.jsonify(data).data)
+                )
+        # Same JSON, compact output
+        assert json.loads(outputs[0][0]) == json.loads(outputs[1][0])
+        assert outputs[0][1] == outputs[1][1]
+
+        with app.app_context():
+            with pytest.raises(TypeError):
+                flask.json.dumps({"set": {1}})
+
+    def test_orjson_encoder_subclasses(self):
+
+        pytest.importorskip("orjson")
+
+        class Level(enum.IntEnum):
+            ERROR = 1
+
+        app = flask.Flask(__name__)
+        app.config["JSON_USE_ORJSON"] = True
+        init_app(app)
+        assert app.json_encoder is ORJSONEncoder
+        with app.app_context():
+            assert flask.json.dumps(OrderedDict(a=1)) == '{"a":1}'
+            assert flask.json.dumps({"level": Level.ERROR}) == '{"level":1}'
+            assert flask.json.dumps([OrderedDict(b=Level.ERROR)]) == (
+                '[{"b":1}]')
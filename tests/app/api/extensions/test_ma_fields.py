@@ -2,7 +2,8 @@ import marshmallow as ma
 
 import pytest
 
-from bemserver.app.api.extensions.ma_fields import Timezone
+from bemserver.app.api.extensions.ma_fields import (
+    Timezone, BucketWidth, Cursor)
 
 
 class TestMaFields:
@@ -13,3 +14,27 @@ class TestMaFields:
         assert field.deserialize("Europe/Paris") == "Europe/Paris"
         with pytest.raises(ma.ValidationError):
             field.deserialize("Dordogne/Boulazac")
+
+    def test_ma_fields_bucket_width(self):
+        field = BucketWidth()
+        for value in (
+                "1 day", "15 minutes", "1 hour 30 min", "2 Weeks",
+                "P1D", "PT15M", "P1DT12H", "PT0.5S",
+        ):
+            assert field.deserialize(value) == value
+        for value in (
+                "dummy", "", "day", "-1 day", "0 days", "1 dummy",
+                "P", "PT", "P0D", "1 day; DROP TABLE timeseries",
+        ):
+            with pytest.raises(ma.ValidationError):
+                field.deserialize(value)
+
+    def test_ma_fields_cursor(self):
+        field = Cursor()
+        for value in (42, "test", [1, "a"]):
+            assert field.deserialize(field.serialize("c", {"c": value})) == (
+                value
+            )
+        assert field.serialize("c", {"c": None}) is None
+        with pytest.raises(ma.ValidationError):
+            field.deserialize("Dummy")
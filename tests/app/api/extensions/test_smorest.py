@@ -0,0 +1,73 @@
+import datetime as dt
+
+import marshmallow as ma
+
+from bemserver.app.api.extensions.smorest import Schema
+
+
+class TestSchema:
+
+    def test_schema_dump(self):
+
+        class DocSchema(Schema):
+            id = ma.fields.Int()
+            name = ma.fields.Str(data_key="label")
+            value = ma.fields.Float(attribute="raw_value")
+            timestamp = ma.fields.AwareDateTime()
+            unit = ma.fields.Str(dump_default="°C")
+            nested_name = ma.fields.Str(attribute="nested.name")
+            upper = ma.fields.Method("get_upper")
+
+            def get_upper(self, obj):
+                return obj["name"].upper() if isinstance(obj, dict) else None
+
+        class Nested:
+            name = "nested"
+
+        class Doc:
+            id = 1
+            name = "doc"
+            raw_value = None
+            timestamp = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+            nested = Nested()
+
+        doc = Doc()
+        doc_dict = {
+            "id": 2,
+            "name": "doc",
+            "raw_value": 12,
+            "timestamp": None,
+            "unit": "K",
+        }
+        schema = DocSchema()
+
+        # None values are not dumped
+        assert schema.dump(doc) == {
+            "id": 1,
+            "label": "doc",
+            "timestamp": "2020-01-01T00:00:00+00:00",
+            "unit": "°C",
+            "nested_name": "nested",
+        }
+        assert schema.dump(doc_dict) == {
+            "id": 2,
+            "label": "doc",
+            "value": 12.0,
+            "unit": "K",
+            "upper": "DOC",
+        }
+        assert DocSchema(many=True).dump([doc, doc_dict]) == [
+            schema.dump(doc), schema.dump(doc_dict)
+        ]
+        assert DocSchema(only=("id", )).dump(doc) == {"id": 1}
+
+        # Same output as marshmallow, except None values
+        class RefSchema(DocSchema):
+            def _serialize(self, obj, *, many=False):
+                return ma.Schema._serialize(self, obj, many=many)
+
+        for obj in (doc, doc_dict):
+            assert schema.dump(obj) == {
+                key: value for key, value in RefSchema().dump(obj).items()
+                if value is not None
+            }
@@ -1,6 +1,14 @@
 """Events tests"""
 
 import datetime as dt
+import json
+
+import pytest
+
+import sqlalchemy as sqla
+
+from bemserver.core.database import db
+from bemserver.core.model import Event
 
 
 DUMMY_ID = "69"
@@ -21,6 +29,13 @@ class TestEventsApi:
         for x in ret.json:
             assert x["id"] in ("NEW", "ONGOING", "CLOSED",)
 
+        # GET state list with ETag
+        ret = client.get(
+            f"{EVENTS_URL}states",
+            headers={"If-None-Match": ret.headers["ETag"]}
+        )
+        assert ret.status_code == 304
+
     def test_event_levels_api(self, app):
 
         client = app.test_client()
@@ -95,6 +110,11 @@ class TestEventsApi:
         ret_val = ret.json
         assert len(ret_val) == 1
         assert ret_val[0]["id"] == event_1_id
+        list_etag = ret.headers["ETag"]
+
+        # GET list with ETag
+        ret = client.get(EVENTS_URL, headers={"If-None-Match": list_etag})
+        assert ret.status_code == 304
 
         # GET by id
         ret = client.get(f"{EVENTS_URL}{event_1_id}")
@@ -113,6 +133,10 @@ class TestEventsApi:
         assert ret.status_code == 201
         assert ret.headers["ETag"] != event_1_etag
         event_1_etag = ret.headers["ETag"]
+
+        # GET list with ETag, event modified
+        ret = client.get(EVENTS_URL, headers={"If-None-Match": list_etag})
+        assert ret.status_code == 200
         ret_val = ret.json
         ret_val.pop("id")
         for k, v in event_1.items():
@@ -179,3 +203,362 @@ class TestEventsApi:
         # GET by id -> 404
         ret = client.get(f"{EVENTS_URL}{event_1_id}")
         assert ret.status_code == 404
+
+    def test_events_open_or_extend_api(self, app):
+
+        client = app.test_client()
+
+        event_1 = {
+            "source": "timestamp-guardian",
+            "category": "observation_missing",
+            "target_type": "TIMESERIES",
+            "target_id": 42,
+        }
+
+        # POST open or extend -> open
+        ret = client.post(f"{EVENTS_URL}open-or-extend", json=event_1)
+        assert ret.status_code == 201
+        ret_val = ret.json
+        event_1_id = ret_val["id"]
+        assert ret_val["state"] == "NEW"
+
+        # POST open or extend -> extend
+        ret = client.post(f"{EVENTS_URL}open-or-extend", json=event_1)
+        assert ret.status_code == 200
+        ret_val = ret.json
+        assert ret_val["id"] == event_1_id
+        assert ret_val["state"] == "ONGOING"
+
+        # GET list
+        ret = client.get(EVENTS_URL)
+        assert ret.status_code == 200
+        assert len(ret.json) == 1
+
+        # POST same key as open event -> 409
+        ret = client.post(EVENTS_URL, json=event_1)
+        assert ret.status_code == 409
+
+    def test_events_bulk_api(self, app):
+
+        client = app.test_client()
+
+        event_1 = {
+            "source": "timestamp-guardian",
+            "category": "observation_missing",
+            "target_type": "TIMESERIES",
+            "target_id": 42,
+        }
+
+        # POST bulk
+        ret = client.post(
+            f"{EVENTS_URL}bulk",
+            json=[
+                {"action": "open", **event_1},
+                {"action": "open", **event_1},
+                {"action": "extend", "id": int(DUMMY_ID)},
+            ]
+        )
+        assert ret.status_code == 200
+        ret_val = ret.json
+        assert ret_val[0]["status"] == 201
+        assert ret_val[0]["event"]["state"] == "NEW"
+        event_1_id = ret_val[0]["event"]["id"]
+        assert ret_val[1]["status"] == 409
+        assert "event" not in ret_val[1]
+        assert ret_val[2]["status"] == 404
+
+        ret = client.post(
+            f"{EVENTS_URL}bulk",
+            json=[
+                {"action": "extend", "id": event_1_id},
+                {"action": "close", "id": event_1_id},
+            ]
+        )
+        assert ret.status_code == 200
+        ret_val = ret.json
+        assert [res["status"] for res in ret_val] == [201, 201]
+        assert ret_val[1]["event"]["state"] == "CLOSED"
+
+        # POST bulk with invalid data -> nothing applied
+        ret = client.post(
+            f"{EVENTS_URL}bulk",
+            json=[
+                {"action": "open", **event_1},
+                {"action": "open", **event_1, "category": "dummy"},
+            ]
+        )
+        assert ret.status_code == 422
+        ret = client.get(EVENTS_URL, query_string={"state": "NEW"})
+        assert ret.json == []
+
+        # POST bulk with missing fields
+        ret = client.post(
+            f"{EVENTS_URL}bulk", json=[{"action": "close"}]
+        )
+        assert ret.status_code == 422
+
+    def test_events_api_integrity_errors(self, app, monkeypatch):
+
+        client = app.test_client()
+
+        event_1 = {
+            "source": "timestamp-guardian",
+            "category": "observation_missing",
+            "target_type": "TIMESERIES",
+            "target_id": 42,
+        }
+
+        def get_integrity_error(**kwargs):
+            try:
+                db.session.execute(
+                    sqla.insert(Event.__table__).values(
+                        state="NEW", level="ERROR",
+                        timestamp_start=dt.datetime.now(dt.timezone.utc),
+                        timestamp_last_update=dt.datetime.now(
+                            dt.timezone.utc),
+                        **{**event_1, **kwargs},
+                    )
+                )
+            except sqla.exc.IntegrityError as exc:
+                db.session.rollback()
+                return exc
+            raise AssertionError("No IntegrityError raised")
+
+        Event.open(**event_1)
+        # Open event created by a concurrent request
+        conflict_error = get_integrity_error()
+        # Category deleted by a concurrent request
+        other_error = get_integrity_error(category="dummy")
+
+        def raise_error(error):
+            def func(*args, **kwargs):
+                raise error
+            return func
+
+        monkeypatch.setattr(Event, "open", raise_error(conflict_error))
+        ret = client.post(EVENTS_URL, json=event_1)
+        assert ret.status_code == 409
+        monkeypatch.setattr(Event, "open", raise_error(other_error))
+        with pytest.raises(sqla.exc.IntegrityError):
+            client.post(EVENTS_URL, json=event_1)
+
+        bulk = [{"action": "open", **event_1}]
+        monkeypatch.setattr(Event, "bulk", raise_error(conflict_error))
+        ret = client.post(f"{EVENTS_URL}bulk", json=bulk)
+        assert ret.status_code == 409
+        monkeypatch.setattr(Event, "bulk", raise_error(other_error))
+        ret = client.post(f"{EVENTS_URL}bulk", json=bulk)
+        assert ret.status_code == 422
+
+    def test_events_stats_api(self, app):
+
+        client = app.test_client()
+
+        # GET stats
+        ret = client.get(f"{EVENTS_URL}stats")
+        assert ret.status_code == 200
+        assert ret.json == [{"count": 0}]
+
+        for target_id in (1, 2):
+            ret = client.post(
+                EVENTS_URL,
+                json={
+                    "source": "timestamp-guardian",
+                    "category": "observation_missing",
+                    "target_type": "TIMESERIES",
+                    "target_id": target_id,
+                }
+            )
+            assert ret.status_code == 201
+
+        # GET stats
+        ret = client.get(
+            f"{EVENTS_URL}stats",
+            query_string={"group_by": ["category", "state"]}
+        )
+        assert ret.status_code == 200
+        ret_val = ret.json
+        assert len(ret_val) == 1
+        assert ret_val[0]["category"] == "observation_missing"
+        assert ret_val[0]["state"] == "NEW"
+        assert ret_val[0]["count"] == 2
+        assert "bucket" not in ret_val[0]
+
+        ret = client.get(
+            f"{EVENTS_URL}stats", query_string={"bucket_width": "1 day"}
+        )
+        assert ret.status_code == 200
+        assert len(ret.json) == 1
+        assert "bucket" in ret.json[0]
+
+        # GET stats with invalid group by field
+        ret = client.get(
+            f"{EVENTS_URL}stats", query_string={"group_by": "dummy"}
+        )
+        assert ret.status_code == 422
+
+    def test_events_stream_api(self, app):
+
+        client = app.test_client()
+
+        ret = client.get(f"{EVENTS_URL}stream", query_string={"state": "NEW"})
+        assert ret.status_code == 200
+        assert ret.mimetype == "text/event-stream"
+        stream = iter(ret.response)
+        assert next(stream) == b": connected\n\n"
+
+        event_1 = {
+            "source": "timestamp-guardian",
+            "category": "observation_missing",
+            "target_type": "TIMESERIES",
+            "target_id": 42,
+        }
+        ret_post = client.post(EVENTS_URL, json=event_1)
+        assert ret_post.status_code == 201
+        event_1_id = ret_post.json["id"]
+
+        event_type, data = next(stream).decode().split("\n", 1)
+        assert event_type == "event: insert"
+        assert data.startswith("data: ")
+        event = json.loads(data[len("data: "):])
+        assert event["id"] == event_1_id
+        assert event["state"] == "NEW"
+        assert "timestamp_end" not in event
+
+        ret.close()
+
+    def test_events_api_include_subcategories(self, app):
+
+        client = app.test_client()
+
+        for category in ("observation_missing", "out_of_range"):
+            ret = client.post(
+                EVENTS_URL,
+                json={
+                    "source": "timestamp-guardian",
+                    "category": category,
+                    "target_type": "TIMESERIES",
+                    "target_id": 42,
+                }
+            )
+            assert ret.status_code == 201
+
+        ret = client.get(
+            EVENTS_URL, query_string={"category": "ABNORMAL_TIMESTAMPS"})
+        assert ret.status_code == 200
+        assert ret.json == []
+
+        ret = client.get(
+            EVENTS_URL,
+            query_string={
+                "category": "ABNORMAL_TIMESTAMPS",
+                "include_subcategories": True,
+            }
+        )
+        assert ret.status_code == 200
+        assert [evt["category"] for evt in ret.json] == [
+            "observation_missing"]
+
+        # Estimated count with subcategories (IN filter)
+        ret = client.get(
+            EVENTS_URL,
+            query_string={
+                "category": "ABNORMAL_TIMESTAMPS",
+                "include_subcategories": True,
+                "count": "estimate",
+            }
+        )
+        assert ret.status_code == 200
+        pagination = json.loads(ret.headers["X-Pagination"])
+        assert isinstance(pagination["total"], int)
+
+    def test_events_api_invalid_reference(self, app):
+
+        client = app.test_client()
+
+        event_1 = {
+            "source": "timestamp-guardian",
+            "category": "observation_missing",
+            "target_type": "TIMESERIES",
+            "target_id": 42,
+        }
+
+        for field in ("category", "target_type", "level"):
+            ret = client.post(EVENTS_URL, json={**event_1, field: "dummy"})
+            assert ret.status_code == 422
+            assert field in ret.json["errors"]["json"]
+
+    def test_events_api_archive(self, app):
+
+        client = app.test_client()
+
+        ret = client.post(
+            EVENTS_URL,
+            json={
+                "source": "timestamp-guardian",
+                "category": "observation_missing",
+                "target_type": "TIMESERIES",
+                "target_id": 42,
+                "timestamp_start": "2020-01-01T00:00:00+00:00",
+            }
+        )
+        event_1_id = ret.json["id"]
+        ret = client.put(
+            f"{EVENTS_URL}{event_1_id}/close",
+            json={"timestamp_end": "2020-01-02T00:00:00+00:00"},
+            headers={"If-Match": ret.headers["ETag"]}
+        )
+        assert ret.status_code == 201
+        assert Event.archive("1 day") == 1
+
+        # GET list
+        ret = client.get(EVENTS_URL)
+        assert ret.status_code == 200
+        assert [evt["id"] for evt in ret.json] == [event_1_id]
+        ret = client.get(EVENTS_URL, query_string={"state": "NEW"})
+        assert ret.status_code == 200
+        assert ret.json == []
+
+        # GET by id
+        ret = client.get(f"{EVENTS_URL}{event_1_id}")
+        assert ret.status_code == 200
+        assert ret.json["state"] == "CLOSED"
+
+    def test_events_api_time_filters(self, app):
+
+        client = app.test_client()
+
+        event_ids = []
+        for idx in range(2):
+            ret = client.post(
+                EVENTS_URL,
+                json={
+                    "source": "timestamp-guardian",
+                    "category": "observation_missing",
+                    "target_type": "TIMESERIES",
+                    "target_id": idx,
+                    "timestamp_start": f"2020-01-0{idx + 1}T00:00:00+00:00",
+                }
+            )
+            event_ids.append(ret.json["id"])
+        ts_update = dt.datetime.now(dt.timezone.utc)
+        ret = client.put(
+            f"{EVENTS_URL}{event_ids[0]}/extend",
+            headers={"If-Match": ret.headers["ETag"]}
+        )
+
+        ret = client.get(
+            EVENTS_URL,
+            query_string={
+                "start_time": "2020-01-02T00:00:00+00:00",
+                "end_time": "2020-01-03T00:00:00+00:00",
+            }
+        )
+        assert ret.status_code == 200
+        assert [evt["id"] for evt in ret.json] == [event_ids[1]]
+
+        ret = client.get(
+            EVENTS_URL, query_string={"updated_since": ts_update.isoformat()}
+        )
+        assert ret.status_code == 200
+        assert [evt["id"] for evt in ret.json] == [event_ids[0]]
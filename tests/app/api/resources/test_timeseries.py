@@ -1,4 +1,12 @@
 """Timeseries tests"""
+import base64
+import io
+import json
+
+import pytest
+
+from bemserver.core import timescale
+
 DUMMY_ID = '69'
 
 TIMESERIES_URL = '/timeseries/'
@@ -34,6 +42,17 @@ class TestTimeseriesApi:
         ret_val = ret.json
         assert len(ret_val) == 1
         assert ret_val[0]['id'] == timeseries_1_id
+        list_etag = ret.headers['ETag']
+
+        # GET list with ETag
+        ret = client.get(TIMESERIES_URL, headers={'If-None-Match': list_etag})
+        assert ret.status_code == 304
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={'page_size': 1},
+            headers={'If-None-Match': list_etag}
+        )
+        assert ret.status_code == 200
 
         # GET by id
         ret = client.get(f"{TIMESERIES_URL}{timeseries_1_id}")
@@ -56,6 +75,10 @@ class TestTimeseriesApi:
         timeseries_1_etag = ret.headers['ETag']
         assert ret_val == timeseries_1
 
+        # GET list with ETag, list modified
+        ret = client.get(TIMESERIES_URL, headers={'If-None-Match': list_etag})
+        assert ret.status_code == 200
+
         # PUT wrong ID -> 404
         ret = client.put(
             f"{TIMESERIES_URL}{DUMMY_ID}",
@@ -79,3 +102,224 @@ class TestTimeseriesApi:
         # GET by id -> 404
         ret = client.get(f"{TIMESERIES_URL}{timeseries_1_id}")
         assert ret.status_code == 404
+
+    def test_timeseries_api_pagination(self, app):
+
+        client = app.test_client()
+
+        for idx in range(5):
+            ret = client.post(TIMESERIES_URL, json={'name': f'TS {idx}'})
+            assert ret.status_code == 201
+
+        # Offset pagination
+        ret = client.get(TIMESERIES_URL, query_string={'page_size': 2})
+        assert ret.status_code == 200
+        assert [ts['name'] for ts in ret.json] == ['TS 0', 'TS 1']
+        pagination = json.loads(ret.headers['X-Pagination'])
+        assert pagination['total'] == 5
+        assert pagination['total_pages'] == 3
+        cursor = pagination['next_cursor']
+
+        # Keyset pagination
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={'page_size': 2, 'cursor': cursor}
+        )
+        assert ret.status_code == 200
+        assert [ts['name'] for ts in ret.json] == ['TS 2', 'TS 3']
+        pagination = json.loads(ret.headers['X-Pagination'])
+        assert pagination == {
+            'total': 5, 'next_cursor': pagination['next_cursor']
+        }
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={
+                'page_size': 2,
+                'cursor': pagination['next_cursor'],
+                'count': 'none',
+            }
+        )
+        assert ret.status_code == 200
+        assert [ts['name'] for ts in ret.json] == ['TS 4']
+        assert json.loads(ret.headers['X-Pagination']) == {}
+
+        # Full last page: no next page
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={'page_size': 5, 'count': 'none'}
+        )
+        assert ret.status_code == 200
+        assert len(ret.json) == 5
+        assert json.loads(ret.headers['X-Pagination']) == {}
+
+        # ETag depends on page content and item count
+        ts_ids = {
+            ts['name']: ts['id'] for ts in client.get(TIMESERIES_URL).json}
+        ret = client.get(
+            TIMESERIES_URL, query_string={'page_size': 2, 'count': 'none'})
+        page_etag = ret.headers['ETag']
+        ret = client.get(f"{TIMESERIES_URL}{ts_ids['TS 3']}")
+        ret = client.put(
+            f"{TIMESERIES_URL}{ts_ids['TS 3']}",
+            json={'name': 'TS 3', 'unit': 'K'},
+            headers={'If-Match': ret.headers['ETag']}
+        )
+        assert ret.status_code == 200
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={'page_size': 2, 'count': 'none'},
+            headers={'If-None-Match': page_etag}
+        )
+        assert ret.status_code == 304
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={'page_size': 2},
+            headers={'If-None-Match': page_etag}
+        )
+        assert ret.status_code == 200
+        ret = client.get(f"{TIMESERIES_URL}{ts_ids['TS 0']}")
+        ret = client.put(
+            f"{TIMESERIES_URL}{ts_ids['TS 0']}",
+            json={'name': 'TS 0', 'unit': 'K'},
+            headers={'If-Match': ret.headers['ETag']}
+        )
+        assert ret.status_code == 200
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={'page_size': 2, 'count': 'none'},
+            headers={'If-None-Match': page_etag}
+        )
+        assert ret.status_code == 200
+
+        # Estimated count
+        ret = client.get(TIMESERIES_URL, query_string={'count': 'estimate'})
+        assert ret.status_code == 200
+        pagination = json.loads(ret.headers['X-Pagination'])
+        assert isinstance(pagination['total'], int)
+
+        # Invalid cursor or count mode
+        ret = client.get(TIMESERIES_URL, query_string={'cursor': 'dummy'})
+        assert ret.status_code == 422
+        ret = client.get(TIMESERIES_URL, query_string={'count': 'dummy'})
+        assert ret.status_code == 422
+        # Crafted cursors of wrong type
+        for value in (b'"dummy"', b'1.5', b'true'):
+            ret = client.get(
+                TIMESERIES_URL,
+                query_string={
+                    'cursor': base64.urlsafe_b64encode(value).decode()
+                }
+            )
+            assert ret.status_code == 400
+
+    def test_timeseries_api_bulk(self, app):
+
+        client = app.test_client()
+
+        ret = client.post(
+            f"{TIMESERIES_URL}bulk",
+            json=[
+                {'name': 'TS 1', 'unit': '°C'},
+                {'name': 'TS 2'},
+            ]
+        )
+        assert ret.status_code == 201
+        assert [ts['name'] for ts in ret.json] == ['TS 1', 'TS 2']
+        ts_1_id = ret.json[0]['id']
+
+        # Upsert from CSV file
+        csv_str = "name,description,unit\nTS 1,Timeseries 1,\nTS 3,,kW\n"
+        ret = client.post(
+            f"{TIMESERIES_URL}bulk/csv",
+            data={
+                "csv_file": (io.BytesIO(csv_str.encode()), 'timeseries.csv')
+            }
+        )
+        assert ret.status_code == 201
+        assert ret.json[0] == {
+            'id': ts_1_id, 'name': 'TS 1', 'description': 'Timeseries 1'
+        }
+        assert ret.json[1]['unit'] == 'kW'
+        ret = client.get(TIMESERIES_URL)
+        assert len(ret.json) == 3
+
+        # Insert only
+        ret = client.post(
+            f"{TIMESERIES_URL}bulk",
+            query_string={'update': False},
+            json=[{'name': 'TS 4'}, {'name': 'TS 1'}]
+        )
+        assert ret.status_code == 409
+        ret = client.get(TIMESERIES_URL)
+        assert len(ret.json) == 3
+
+        # Duplicate names
+        ret = client.post(
+            f"{TIMESERIES_URL}bulk",
+            json=[{'name': 'TS 5'}, {'name': 'TS 5'}]
+        )
+        assert ret.status_code == 422
+
+        # Invalid CSV content
+        csv_str = "name,dummy\nTS 6,dummy\n"
+        ret = client.post(
+            f"{TIMESERIES_URL}bulk/csv",
+            data={
+                "csv_file": (io.BytesIO(csv_str.encode()), 'timeseries.csv')
+            }
+        )
+        assert ret.status_code == 422
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 4}, ),
+            indirect=True
+    )
+    def test_timeseries_api_delete_background(self, app, timeseries_data):
+
+        client = app.test_client()
+
+        ts_0_id, _, _, _ = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+        ret = client.get(f"{TIMESERIES_URL}{ts_0_id}")
+        ts_0_etag = ret.headers['ETag']
+
+        # Timeseries with data
+        ret = client.delete(
+            f"{TIMESERIES_URL}{ts_0_id}", headers={'If-Match': ts_0_etag}
+        )
+        assert ret.status_code == 409
+
+        # Not being deleted
+        ret = client.get(f"{TIMESERIES_URL}{ts_0_id}/deletion")
+        assert ret.status_code == 404
+
+        ret = client.delete(
+            f"{TIMESERIES_URL}{ts_0_id}",
+            query_string={'background': True},
+            headers={'If-Match': ts_0_etag}
+        )
+        assert ret.status_code == 202
+
+        # Deleted timeseries are hidden
+        ret = client.get(f"{TIMESERIES_URL}{ts_0_id}")
+        assert ret.status_code == 404
+        ret = client.get(TIMESERIES_URL)
+        assert [ts['id'] for ts in ret.json] == [ts_1_id]
+
+        ret = client.get(f"{TIMESERIES_URL}{ts_0_id}/deletion")
+        assert ret.status_code == 200
+        assert ret.json['id'] == ts_0_id
+        assert 'purged_until' not in ret.json
+        assert ret.json['chunks_purged'] == 0
+        assert ret.json['chunks_total'] > 0
+
+        # Background deletion is documented
+        ret = client.get('/api-spec.json')
+        responses = ret.json['paths']['/timeseries/{item_id}']['delete'][
+            'responses']
+        assert {'202', '204', '409'} <= set(responses)
+
+        timescale.purge_deleted_timeseries()
+        ret = client.get(f"{TIMESERIES_URL}{ts_0_id}/deletion")
+        assert ret.status_code == 404
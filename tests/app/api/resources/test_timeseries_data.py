@@ -43,6 +43,132 @@ class TestTimeseriesDataApi:
             "2020-01-01T03:00:00+0000,3.0,3.0\n"
         )
 
+        # Unknown timeseries ID
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "timeseries": [ts_0_id, ts_1_id + 1],
+            }
+        )
+        assert ret.status_code == 422
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 4}, ),
+            indirect=True
+    )
+    def test_timeseries_data_get_stats(self, app, timeseries_data):
+
+        client = app.test_client()
+
+        ts_0_id, _, start_time, _ = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+
+        ret = client.get(
+            TIMESERIES_URL + "stats",
+            query_string={
+                "start_time": (start_time + dt.timedelta(hours=1)).isoformat(),
+                "timeseries": [ts_0_id, ts_1_id],
+            }
+        )
+        assert ret.status_code == 200
+        assert ret.json[0] == {
+            "timeseries_id": ts_0_id,
+            "first_timestamp": "2020-01-01T01:00:00+00:00",
+            "last_timestamp": "2020-01-01T03:00:00+00:00",
+            "count": 3,
+            "null_count": 0,
+            "min": 1.0,
+            "max": 3.0,
+            "avg": 2.0,
+        }
+        assert ret.json[1]["timeseries_id"] == ts_1_id
+
+        # Unknown timeseries ID
+        ret = client.get(
+            TIMESERIES_URL + "stats",
+            query_string={"timeseries": [ts_0_id, ts_1_id + 1]}
+        )
+        assert ret.status_code == 422
+
+        # Deleted timeseries
+        ret = client.get(f"/timeseries/{ts_1_id}")
+        ret = client.delete(
+            f"/timeseries/{ts_1_id}",
+            query_string={"background": True},
+            headers={"If-Match": ret.headers["ETag"]},
+        )
+        assert ret.status_code == 202
+        ret = client.get(
+            TIMESERIES_URL + "stats",
+            query_string={"timeseries": [ts_0_id, ts_1_id]}
+        )
+        assert ret.status_code == 422
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 4}, ),
+            indirect=True
+    )
+    def test_timeseries_data_delete(self, app, timeseries_data):
+
+        client = app.test_client()
+
+        ts_0_id, _, start_time, end_time = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+
+        ret = client.delete(
+            TIMESERIES_URL,
+            query_string={
+                "start_time": (start_time + dt.timedelta(hours=1)).isoformat(),
+                "end_time": end_time.isoformat(),
+                "timeseries": [ts_0_id],
+            }
+        )
+        assert ret.status_code == 204
+
+        ret = client.get(
+            TIMESERIES_URL,
+            query_string={
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "timeseries": [ts_0_id, ts_1_id],
+            }
+        )
+        assert ret.data.decode("utf-8") == (
+            f"Datetime,{ts_0_id},{ts_1_id}\n"
+            "2020-01-01T00:00:00+0000,0.0,0.0\n"
+            "2020-01-01T01:00:00+0000,,1.0\n"
+            "2020-01-01T02:00:00+0000,,2.0\n"
+            "2020-01-01T03:00:00+0000,,3.0\n"
+        )
+
+        # Unknown timeseries ID: nothing deleted
+        query_string = {
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat(),
+            "timeseries": [ts_1_id, ts_1_id + 1],
+        }
+        ret = client.delete(TIMESERIES_URL, query_string=query_string)
+        assert ret.status_code == 422
+        ret = client.get(TIMESERIES_URL + "stats", query_string={
+            "timeseries": [ts_1_id]})
+        assert ret.json[0]["count"] == 4
+
+        # Deleted timeseries
+        ret = client.get(f"/timeseries/{ts_1_id}")
+        ret = client.delete(
+            f"/timeseries/{ts_1_id}",
+            query_string={"background": True},
+            headers={"If-Match": ret.headers["ETag"]},
+        )
+        assert ret.status_code == 202
+        query_string["timeseries"] = [ts_1_id]
+        ret = client.delete(TIMESERIES_URL, query_string=query_string)
+        assert ret.status_code == 422
+
     @pytest.mark.parametrize(
             'timeseries_data',
             ({"nb_ts": 2, "nb_tsd": 48}, ),
@@ -126,6 +252,19 @@ class TestTimeseriesDataApi:
             "2020-01-02T00:00:00+0000,852.0,852.0\n"
         )
 
+        # Invalid or non-positive bucket width
+        for bucket_width in ("dummy", "0 days", "-1 day"):
+            ret = client.get(
+                TIMESERIES_URL + "aggregate",
+                query_string={
+                    "start_time": start_time.isoformat(),
+                    "end_time": end_time.isoformat(),
+                    "timeseries": [ts_0_id, ts_1_id],
+                    "bucket_width": bucket_width,
+                }
+            )
+            assert ret.status_code == 422
+
     @pytest.mark.parametrize(
             'timeseries_data',
             ({"nb_ts": 2, "nb_tsd": 0}, ),
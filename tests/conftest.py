@@ -17,6 +17,10 @@ load_dotenv('.env')
 def database():
     db.set_db_url(os.getenv("TEST_SQLALCHEMY_DATABASE_URI"))
     db.setup_tables()
+    # Tables were recreated: IDs may be reused
+    model.Timeseries.cache.invalidate()
+    for cache in model.event.REFERENCE_CACHES:
+        cache.invalidate()
     yield db
     db.session.remove()
     # Destroy DB engine, mainly for threaded code (as MQTT service).
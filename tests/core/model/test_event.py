@@ -1,8 +1,22 @@
 """Event tests"""
 
 import datetime as dt
+import time
 
-from bemserver.core.model import Event
+import pytest
+
+import sqlalchemy as sqla
+
+from bemserver.core.model import Event, EventArchive, EventCategory
+from bemserver.core.model.exceptions import (
+    EventError, EventNotFoundError, EventConflictError)
+from bemserver.core.notifications import notifier
+
+
+@pytest.fixture
+def cache_notifier(database):
+    yield notifier
+    notifier.stop()
 
 
 class TestEventModel:
@@ -26,9 +40,14 @@ class TestEventModel:
         assert Event.get_by_id(evt_1.id) == evt_1
 
         # Open with timestamp start.
+        # Same key as an open event: conflict.
         ts_start = dt.datetime.now(dt.timezone.utc)
+        with pytest.raises(sqla.exc.IntegrityError):
+            Event.open(
+                "observation_missing", "src", "TIMESERIES", 42,
+                timestamp_start=ts_start)
         evt_2 = Event.open(
-            "observation_missing", "src", "TIMESERIES", 42,
+            "observation_missing", "src_2", "TIMESERIES", 42,
             timestamp_start=ts_start)
         assert evt_2.id is not None
         assert evt_2.timestamp_start == ts_start
@@ -65,6 +84,251 @@ class TestEventModel:
         assert evt_2.timestamp_last_update > evt_2.timestamp_end
         assert evt_2.duration == ts_end - ts_start
 
+    def test_event_extend_close_by_id(self, database):
+
+        evt_1 = Event.open("observation_missing", "src", "TIMESERIES", 42)
+        evt_1_id = evt_1.id
+        ts_last_update = evt_1.timestamp_last_update
+
+        # Unknown ID
+        assert Event.extend_by_id(evt_1_id + 1) is None
+        assert Event.close_by_id(evt_1_id + 1) is None
+
+        # Precondition failure cancels update
+        def failing_precondition(item):
+            assert item.state == "NEW"
+            raise ValueError
+
+        with pytest.raises(ValueError):
+            Event.extend_by_id(evt_1_id, precondition=failing_precondition)
+        evt = Event.get_by_id(evt_1_id)
+        assert evt.state == "NEW"
+        assert evt.timestamp_last_update == ts_last_update
+
+        # Extend
+        old_items = []
+        evt = Event.extend_by_id(evt_1_id, precondition=old_items.append)
+        assert old_items[0].state == "NEW"
+        assert old_items[0].timestamp_last_update == ts_last_update
+        assert evt.id == evt_1_id
+        assert evt.state == "ONGOING"
+        assert evt.timestamp_last_update > ts_last_update
+        ts_last_update = evt.timestamp_last_update
+
+        # Close
+        ts_end = dt.datetime.now(dt.timezone.utc)
+        evt = Event.close_by_id(evt_1_id, timestamp_end=ts_end)
+        assert evt.state == "CLOSED"
+        assert evt.timestamp_end == ts_end
+        assert evt.timestamp_last_update > ts_last_update
+        ts_last_update = evt.timestamp_last_update
+
+        # Closing again does nothing
+        old_items = []
+        evt = Event.close_by_id(evt_1_id, precondition=old_items.append)
+        assert old_items[0].state == "CLOSED"
+        assert evt.timestamp_end == ts_end
+        assert evt.timestamp_last_update == ts_last_update
+
+        # Closed event can not be extended
+        with pytest.raises(EventError):
+            Event.extend_by_id(evt_1_id)
+
+    def test_event_bulk(self, database):
+
+        evt_1 = Event.open("observation_missing", "src", "TIMESERIES", 1)
+        evt_2 = Event.open("observation_missing", "src", "TIMESERIES", 2)
+        evt_3 = Event.open("observation_missing", "src", "TIMESERIES", 3)
+        evt_3.close()
+        evt_1_id, evt_2_id, evt_3_id = evt_1.id, evt_2.id, evt_3.id
+        ts_end = dt.datetime.now(dt.timezone.utc)
+        open_args = {
+            "category": "observation_missing",
+            "source": "src",
+            "target_type": "TIMESERIES",
+        }
+
+        results = Event.bulk([
+            {"action": "open", **open_args, "target_id": 4},
+            {"action": "open", **open_args, "target_id": 1},
+            {"action": "open", **open_args, "target_id": 4},
+            {"action": "extend", "id": evt_1_id},
+            {"action": "extend", "id": evt_3_id},
+            {"action": "extend", "id": 0},
+            {"action": "close", "id": evt_2_id, "timestamp_end": ts_end},
+            {"action": "close", "id": evt_3_id},
+            {"action": "close", "id": 0},
+        ])
+        assert len(results) == 9
+
+        evt_4, error = results[0]
+        assert error is None
+        assert evt_4.target_id == 4
+        assert evt_4.state == "NEW"
+        for idx in (1, 2):
+            evt, error = results[idx]
+            assert evt is None
+            assert isinstance(error, EventConflictError)
+        evt, error = results[3]
+        assert error is None
+        assert evt.id == evt_1_id
+        assert evt.state == "ONGOING"
+        evt, error = results[4]
+        assert evt is None
+        assert type(error) is EventError
+        evt, error = results[5]
+        assert evt is None
+        assert isinstance(error, EventNotFoundError)
+        evt, error = results[6]
+        assert error is None
+        assert evt.id == evt_2_id
+        assert evt.state == "CLOSED"
+        assert evt.timestamp_end == ts_end
+        evt, error = results[7]
+        assert error is None
+        assert evt.id == evt_3_id
+        assert evt.state == "CLOSED"
+        evt, error = results[8]
+        assert evt is None
+        assert isinstance(error, EventNotFoundError)
+
+        evts = Event.list_by_state()
+        assert {evt.id for evt, in evts} == {evt_1_id, evt_4.id}
+
+    def test_event_close_stale(self, database):
+
+        ts_now = dt.datetime.now(dt.timezone.utc)
+        evts = []
+        for idx, (category, age) in enumerate((
+                ("observation_missing", 1),
+                ("observation_missing", 3),
+                ("observation_missing", 5),
+                ("out_of_range", 3),
+        )):
+            evt = Event.open(category, "src", "TIMESERIES", idx)
+            evt.timestamp_last_update = ts_now - dt.timedelta(hours=age)
+            evt.save()
+            evts.append(evt)
+        evts[3].extend()
+        evts[3].timestamp_last_update = ts_now - dt.timedelta(hours=3)
+        evts[3].save()
+
+        # No timeout
+        assert Event.close_stale() == 0
+
+        # Category timeout
+        assert Event.close_stale(
+            category_timeouts={"observation_missing": "4 hours"}) == 1
+        assert evts[2].state == "CLOSED"
+        assert evts[2].timestamp_end == ts_now - dt.timedelta(hours=5)
+        assert evts[2].timestamp_last_update > ts_now
+
+        # Default timeout overridden by category timeout, small batches
+        assert Event.close_stale(
+            timeout="2 hours",
+            category_timeouts={"observation_missing": "4 hours"},
+            batch_size=1,
+        ) == 1
+        assert [evt.state for evt in evts] == [
+            "NEW", "NEW", "CLOSED", "CLOSED"]
+
+        assert Event.close_stale(timeout="2 hours", batch_size=1) == 1
+        assert [evt.state for evt in evts] == [
+            "NEW", "CLOSED", "CLOSED", "CLOSED"]
+
+    def test_event_get_stats(self, database):
+
+        ts_start = dt.datetime(2020, 1, 1, 12, tzinfo=dt.timezone.utc)
+        for idx, (category, level, start, hours) in enumerate((
+                ("observation_missing", "ERROR", 0, 1),
+                ("observation_missing", "ERROR", 1, 3),
+                ("observation_missing", "WARNING", 24, 2),
+                ("out_of_range", "ERROR", 25, 4),
+        )):
+            evt = Event.open(
+                category, "src", "TIMESERIES", idx, level=level,
+                timestamp_start=ts_start + dt.timedelta(hours=start))
+            evt.close(
+                timestamp_end=evt.timestamp_start + dt.timedelta(hours=hours))
+
+        stats = Event.get_stats()
+        assert [dict(row) for row in stats] == [
+            {"count": 4, "total_duration": 36000, "mean_duration": 9000},
+        ]
+
+        stats = Event.get_stats(group_by=("category", ), level="ERROR")
+        assert [dict(row) for row in stats] == [
+            {
+                "category": "observation_missing",
+                "count": 2,
+                "total_duration": 14400,
+                "mean_duration": 7200,
+            },
+            {
+                "category": "out_of_range",
+                "count": 1,
+                "total_duration": 14400,
+                "mean_duration": 14400,
+            },
+        ]
+
+        stats = Event.get_stats(
+            group_by=("level", ), bucket_width="1 day",
+            timezone="Europe/Paris")
+        assert [
+            (row["bucket"], row["level"], row["count"]) for row in stats
+        ] == [
+            (dt.datetime(2019, 12, 31, 23, tzinfo=dt.timezone.utc),
+             "ERROR", 2),
+            (dt.datetime(2020, 1, 1, 23, tzinfo=dt.timezone.utc),
+             "ERROR", 1),
+            (dt.datetime(2020, 1, 1, 23, tzinfo=dt.timezone.utc),
+             "WARNING", 1),
+        ]
+
+        with pytest.raises(ValueError):
+            Event.get_stats(group_by=("dummy", ))
+
+    def test_event_open_or_extend(self, database):
+
+        # Open a new event.
+        ts_start = dt.datetime.now(dt.timezone.utc)
+        evt_1 = Event.open_or_extend(
+            "observation_missing", "src", "TIMESERIES", 42,
+            timestamp_start=ts_start)
+        assert evt_1.id is not None
+        assert evt_1.state == "NEW"
+        assert evt_1.level == "ERROR"
+        assert evt_1.timestamp_start == ts_start
+        assert evt_1.timestamp_end is None
+        ts_last_update = evt_1.timestamp_last_update
+
+        # Same key: extend open event.
+        evt = Event.open_or_extend(
+            "observation_missing", "src", "TIMESERIES", 42, level="INFO")
+        assert evt is evt_1
+        assert evt_1.state == "ONGOING"
+        assert evt_1.level == "ERROR"
+        assert evt_1.timestamp_start == ts_start
+        assert evt_1.timestamp_last_update > ts_last_update
+
+        # Other key: open a new event.
+        evt_2 = Event.open_or_extend(
+            "observation_missing", "other_src", "TIMESERIES", 42)
+        assert evt_2.id != evt_1.id
+        assert evt_2.state == "NEW"
+
+        # Closed event is not extended.
+        evt_1.close()
+        evt_3 = Event.open_or_extend(
+            "observation_missing", "src", "TIMESERIES", 42)
+        assert evt_3.id not in (evt_1.id, evt_2.id)
+        assert evt_3.state == "NEW"
+        assert evt_1.state == "CLOSED"
+
+        evts = Event.list_by_state(states=("NEW", "ONGOING", "CLOSED"))
+        assert len(evts) == 3
+
     def test_event_list_by_state(self, database):
 
         # no events at all
@@ -103,3 +367,156 @@ class TestEventModel:
         # one is closed
         evts = Event.list_by_state(states=("CLOSED",))
         assert evts == [(evt_2,)]
+
+    @pytest.mark.parametrize("cache_enabled", (False, True))
+    def test_event_list_by_state_include_subcategories(
+            self, database, monkeypatch, cache_enabled):
+
+        monkeypatch.setattr(
+            EventCategory, "subcategories_cache_enabled", cache_enabled)
+        evt_1 = Event.open("observation_missing", "src", "TIMESERIES", 1)
+        evt_2 = Event.open("out_of_range", "src", "TIMESERIES", 2)
+        evt_3 = Event.open("ABNORMAL_TIMESTAMPS", "src", "TIMESERIES", 3)
+
+        evts = Event.list_by_state(category="ABNORMAL_TIMESTAMPS")
+        assert evts == [(evt_3,)]
+        evts = Event.list_by_state(
+            category="ABNORMAL_TIMESTAMPS", include_subcategories=True)
+        assert evts == [(evt_1,), (evt_3,)]
+        evts = Event.list_by_state(
+            category="ABNORMAL_MEASURE_VALUES", include_subcategories=True)
+        assert evts == [(evt_2,)]
+
+    def test_event_archive(self, database):
+
+        ts_now = dt.datetime.now(dt.timezone.utc)
+        evt_1 = Event.open("observation_missing", "src", "TIMESERIES", 1)
+        evt_1.close(timestamp_end=ts_now - dt.timedelta(days=10))
+        evt_2 = Event.open("observation_missing", "src", "TIMESERIES", 2)
+        evt_2.close(timestamp_end=ts_now - dt.timedelta(days=20))
+        evt_3 = Event.open("observation_missing", "src", "TIMESERIES", 3)
+        evt_3.close()
+        evt_4 = Event.open("observation_missing", "src", "TIMESERIES", 4)
+        evt_ids = [evt.id for evt in (evt_1, evt_2, evt_3, evt_4)]
+        evt_1_version = evt_1.version
+
+        # No archived event: archive not queried
+        assert Event.get_source() is Event
+
+        assert Event.archive("15 days", batch_size=1) == 1
+        assert Event.archive("5 days", batch_size=1) == 1
+        assert Event.archive("5 days") == 0
+        database.session.expunge_all()
+        assert Event.get_by_id(evt_ids[0]) is None
+        assert Event.get_by_id(evt_ids[1]) is None
+        archived = EventArchive.get_by_id(evt_ids[0])
+        assert archived.state == "CLOSED"
+        assert archived.target_id == 1
+        assert archived.version == evt_1_version
+
+        # Archive only queried if needed
+        assert Event.get_source(states=("NEW", "ONGOING")) is Event
+        assert Event.get_source(
+            start_time=ts_now + dt.timedelta(days=1)) is Event
+        assert Event.get_source() is not Event
+
+        evts = Event.list_by_state(states=("CLOSED", ))
+        assert sorted(evt.id for evt, in evts) == evt_ids[:3]
+        assert all(isinstance(evt, Event) for evt, in evts)
+        evts = Event.list_by_state()
+        assert [evt.id for evt, in evts] == evt_ids[3:]
+
+        stats = Event.get_stats(group_by=("state", ))
+        assert [(row["state"], row["count"]) for row in stats] == [
+            ("CLOSED", 3), ("NEW", 1)]
+
+    def test_event_list_by_state_time_filters(self, database):
+
+        ts_start = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+        evts = [
+            Event.open(
+                "observation_missing", "src", "TIMESERIES", idx,
+                timestamp_start=ts_start + dt.timedelta(days=idx))
+            for idx in range(3)
+        ]
+        ts_update = dt.datetime.now(dt.timezone.utc)
+        evts[1].extend()
+
+        ret = Event.list_by_state(start_time=ts_start + dt.timedelta(days=1))
+        assert ret == [(evts[1],), (evts[2],)]
+        ret = Event.list_by_state(end_time=ts_start + dt.timedelta(days=1))
+        assert ret == [(evts[0],)]
+        ret = Event.list_by_state(
+            start_time=ts_start + dt.timedelta(days=1),
+            end_time=ts_start + dt.timedelta(days=2),
+        )
+        assert ret == [(evts[1],)]
+        ret = Event.list_by_state(updated_since=ts_update)
+        assert ret == [(evts[1],)]
+
+
+class TestEventCategoryModel:
+
+    def test_event_category_select_subcategories(self, database):
+
+        assert set(
+            database.session.execute(
+                EventCategory.select_subcategories("ABNORMAL_TIMESTAMPS")
+            ).scalars()
+        ) == {
+            "ABNORMAL_TIMESTAMPS",
+            "observation_missing",
+            "observation_interval_too_large",
+            "observation_interval_too_short",
+            "reception_interval_too_large",
+            "reception_interval_too_short",
+        }
+        assert set(
+            database.session.execute(
+                EventCategory.select_subcategories("out_of_range")
+            ).scalars()
+        ) == {"out_of_range"}
+
+    @pytest.mark.usefixtures("cache_notifier")
+    def test_event_category_get_subcategories(self, database):
+
+        assert set(
+            EventCategory.get_subcategories("ABNORMAL_TIMESTAMPS")
+        ) == {
+            "ABNORMAL_TIMESTAMPS",
+            "observation_missing",
+            "observation_interval_too_large",
+            "observation_interval_too_short",
+            "reception_interval_too_large",
+            "reception_interval_too_short",
+        }
+        assert set(
+            EventCategory.get_subcategories("ABNORMAL_MEASURE_VALUES")
+        ) == {"ABNORMAL_MEASURE_VALUES", "out_of_range"}
+
+        # Cache is invalidated when categories are modified
+        EventCategory(id="out_of_range_high", parent="out_of_range").save()
+        assert set(
+            EventCategory.get_subcategories("ABNORMAL_MEASURE_VALUES")
+        ) == {
+            "ABNORMAL_MEASURE_VALUES", "out_of_range", "out_of_range_high"
+        }
+
+        # Modification from another process: cache invalidated by
+        # notification
+        version = EventCategory.cache.version
+        database.session.execute(
+            sqla.text(
+                "INSERT INTO event_category (id, parent) "
+                "VALUES ('out_of_range_low', 'out_of_range');"
+            )
+        )
+        database.session.commit()
+        for _ in range(50):
+            if "out_of_range_low" in EventCategory.get_subcategories(
+                    "ABNORMAL_MEASURE_VALUES"):
+                break
+            time.sleep(0.1)
+        else:
+            pytest.fail("Cache not invalidated")
+        assert EventCategory.cache.version > version
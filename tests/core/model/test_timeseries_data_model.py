@@ -0,0 +1,67 @@
+"""Timeseries data tests"""
+import datetime as dt
+
+import pytest
+
+from bemserver.core.database import db
+from bemserver.core.model import TimeseriesData
+
+
+class TestTimeseriesDataModel:
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 24}, ),
+            indirect=True
+    )
+    def test_timeseries_data_get_stats(self, timeseries_data):
+
+        ts_0_id, nb_tsd, start_dt, end_dt = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+        db.session.get(TimeseriesData, (ts_1_id, start_dt)).value = None
+        db.session.commit()
+
+        stats = TimeseriesData.get_stats([ts_1_id, ts_0_id, ts_1_id + 1])
+        assert [dict(row) for row in stats] == [
+            {
+                "timeseries_id": ts_1_id,
+                "first_timestamp": start_dt,
+                "last_timestamp": end_dt - dt.timedelta(hours=1),
+                "count": nb_tsd,
+                "null_count": 1,
+                "min": 1,
+                "max": 23,
+                "avg": 12,
+            },
+            {
+                "timeseries_id": ts_0_id,
+                "first_timestamp": start_dt,
+                "last_timestamp": end_dt - dt.timedelta(hours=1),
+                "count": nb_tsd,
+                "null_count": 0,
+                "min": 0,
+                "max": 23,
+                "avg": 11.5,
+            },
+            {
+                "timeseries_id": ts_1_id + 1,
+                "first_timestamp": None,
+                "last_timestamp": None,
+                "count": 0,
+                "null_count": 0,
+                "min": None,
+                "max": None,
+                "avg": None,
+            },
+        ]
+
+        # Time interval
+        stats = TimeseriesData.get_stats(
+            [ts_0_id],
+            start_dt + dt.timedelta(hours=2),
+            start_dt + dt.timedelta(hours=4),
+        )
+        assert stats[0]["first_timestamp"] == start_dt + dt.timedelta(hours=2)
+        assert stats[0]["last_timestamp"] == start_dt + dt.timedelta(hours=3)
+        assert stats[0]["count"] == 2
+        assert stats[0]["avg"] == 2.5
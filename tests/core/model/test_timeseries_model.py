@@ -0,0 +1,59 @@
+"""Timeseries tests"""
+import pytest
+
+import sqlalchemy as sqla
+
+from bemserver.core.model import Timeseries
+
+
+class TestTimeseriesModel:
+
+    def test_timeseries_upsert_many(self, database):
+
+        ts_l = Timeseries.upsert_many([
+            {"name": "TS 1", "unit": "°C"},
+            {"name": "TS 2", "description": "Timeseries 2"},
+        ])
+        assert [ts.name for ts in ts_l] == ["TS 1", "TS 2"]
+        assert all(ts.id is not None for ts in ts_l)
+        assert ts_l[0].unit == "°C"
+
+        # Update existing, missing attributes set to None
+        ts_l_2 = Timeseries.upsert_many([
+            {"name": "TS 3"},
+            {"name": "TS 1", "description": "Timeseries 1"},
+        ], batch_size=1)
+        assert [ts.name for ts in ts_l_2] == ["TS 3", "TS 1"]
+        assert ts_l_2[1].id == ts_l[0].id
+        assert ts_l_2[1].description == "Timeseries 1"
+        assert ts_l_2[1].unit is None
+        assert database.session.query(Timeseries).count() == 3
+
+        # Insert only
+        with pytest.raises(sqla.exc.IntegrityError):
+            Timeseries.upsert_many(
+                [{"name": "TS 4"}, {"name": "TS 1"}], update=False)
+        assert database.session.query(Timeseries).count() == 3
+
+        # Duplicate names
+        with pytest.raises(ValueError):
+            Timeseries.upsert_many([{"name": "TS 5"}, {"name": "TS 5"}])
+
+        assert Timeseries.upsert_many([]) == []
+
+    def test_timeseries_version(self, database):
+
+        ts_1 = Timeseries(name="TS 1")
+        ts_2 = Timeseries(name="TS 2")
+        database.session.add_all((ts_1, ts_2))
+        database.session.commit()
+        assert ts_1.version != ts_2.version
+        version_1, version_2 = ts_1.version, ts_2.version
+
+        # Incremented on update, whatever the write path
+        ts_1.description = "Timeseries 1"
+        database.session.commit()
+        assert ts_1.version > max(version_1, version_2)
+        version_1 = ts_1.version
+        ts_l = Timeseries.upsert_many([{"name": "TS 2", "unit": "°C"}])
+        assert ts_l[0].version > version_1
@@ -0,0 +1,140 @@
+"""Cache tests"""
+import os
+import time
+
+import pytest
+import sqlalchemy as sqla
+
+from bemserver.core.cache import TableCache
+from bemserver.core.model import EventLevel, Timeseries
+from bemserver.core.notifications import notifier
+
+
+@pytest.fixture
+def cache_notifier(database):
+    yield notifier
+    notifier.stop()
+
+
+class TestTableCache:
+
+    def test_table_cache(self, database):
+
+        cache = TableCache(EventLevel, miss_reload_interval=0)
+        assert cache.version == 0
+
+        rows = cache.rows
+        assert cache.version == 1
+        assert [row["id"] for row in rows] == [
+            "CRITICAL", "ERROR", "INFO", "WARNING"]
+        assert cache.ids == {"CRITICAL", "ERROR", "INFO", "WARNING"}
+        etag = cache.etag
+        assert "ERROR" in cache
+        assert "DUMMY" not in cache
+
+        # Reload with same content: same version and ETag
+        cache.invalidate()
+        assert cache.rows == rows
+        assert cache.version == 1
+        assert cache.etag == etag
+
+        # ORM modification invalidates cache
+        EventLevel(id="DEBUG", description="Debug").save()
+        assert "DEBUG" in cache.ids
+        assert cache.version == 2
+        assert cache.etag != etag
+
+        # Modification from another process: cache is stale until TTL...
+        database.session.execute(
+            sqla.text(
+                "INSERT INTO event_level (id) VALUES ('TRACE');"
+            )
+        )
+        database.session.commit()
+        assert "TRACE" not in cache.ids
+        # ...unless a key is missing
+        assert "TRACE" in cache
+        assert cache.version == 3
+
+        # No TTL: reload on each access
+        cache.ttl = 0
+        database.session.execute(
+            sqla.text("DELETE FROM event_level WHERE id = 'TRACE';")
+        )
+        database.session.commit()
+        assert "TRACE" not in cache.ids
+        assert cache.version == 4
+
+    def test_table_cache_get(self, database):
+
+        cache = TableCache(
+            Timeseries, indexes=("name", ), miss_reload_interval=0)
+        ts_1 = Timeseries(name="TS 1", unit="°C")
+        database.session.add(ts_1)
+        database.session.commit()
+
+        assert cache.get(ts_1.id)["unit"] == "°C"
+        assert cache.get_by("name", "TS 1")["id"] == ts_1.id
+        assert cache.get(ts_1.id + 1) is None
+        assert cache.get_by("name", "TS 2") is None
+
+        # Missing key or value: reload once
+        database.session.execute(
+            sqla.text("INSERT INTO timeseries (name) VALUES ('TS 2');")
+        )
+        database.session.commit()
+        ts_2_id = cache.get_by("name", "TS 2")["id"]
+        assert cache.get(ts_2_id)["name"] == "TS 2"
+
+    def test_table_cache_miss_reload_interval(self, database):
+
+        cache = TableCache(EventLevel, miss_reload_interval=60)
+        assert "ERROR" in cache
+        assert cache.version == 1
+
+        # Missing keys do not reload rows loaded recently
+        database.session.execute(
+            sqla.text("INSERT INTO event_level (id) VALUES ('TRACE');")
+        )
+        database.session.commit()
+        assert "TRACE" not in cache
+        assert cache.get("TRACE") is None
+        assert cache.version == 1
+
+        # Reload once interval elapsed
+        cache.miss_reload_interval = 0
+        assert "TRACE" in cache
+        assert cache.version == 2
+
+    def test_table_cache_read_only(self, database):
+
+        # Unreachable replica: reading from replica would fail
+        database.session.remove()
+        database.set_db_url(
+            os.getenv("TEST_SQLALCHEMY_DATABASE_URI"),
+            replica_urls=("postgresql://user@replica.invalid/bemserver", ),
+        )
+        cache = TableCache(EventLevel)
+        # Loaded from primary, even in read only context
+        with database.read_only():
+            assert "ERROR" in cache
+
+    @pytest.mark.usefixtures("cache_notifier")
+    def test_table_cache_notifications(self, database):
+
+        cache = TableCache(Timeseries, channel="timeseries")
+        ts_1 = Timeseries(name="TS 1", unit="°C")
+        database.session.add(ts_1)
+        database.session.commit()
+        assert cache.get(ts_1.id)["unit"] == "°C"
+
+        # Modification from another process: notification invalidates cache
+        database.session.execute(
+            sqla.text("UPDATE timeseries SET unit = 'K';")
+        )
+        database.session.commit()
+        for _ in range(50):
+            if cache.get(ts_1.id)["unit"] == "K":
+                break
+            time.sleep(0.1)
+        assert cache.get(ts_1.id)["unit"] == "K"
@@ -73,6 +73,7 @@ class TestTimeseriesCSVIO:
             "",
             "Dummy,\n",
             "Datetime,1324564",
+            "Datetime,a",
             "Datetime,1\n2020-01-01T00:00:00+00:00",
             "Datetime,1\n2020-01-01T00:00:00+00:00,",
             "Datetime,1\n2020-01-01T00:00:00+00:00,a",
@@ -131,6 +132,10 @@ class TestTimeseriesCSVIO:
             "2020-01-01T02:00:00+0000,2.0,,\n"
         )
 
+        # Unknown timeseries ID
+        with pytest.raises(TimeseriesCSVIOError):
+            tscsvio.export_csv(start_dt, end_dt, (ts_0_id, ts_3_id + 1))
+
     @pytest.mark.parametrize(
             'timeseries_data',
             ({"nb_ts": 4, "nb_tsd": 0}, ),
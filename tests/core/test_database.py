@@ -0,0 +1,115 @@
+"""Database tests"""
+import os
+
+import sqlalchemy as sqla
+
+from bemserver.core.database import DBConnection, db
+from bemserver.core.model import Event
+
+
+def _get_statement_timeout(db):
+    return db.session.execute(
+        sqla.text("SELECT current_setting('statement_timeout');")
+    ).scalar()
+
+
+class TestDBConnection:
+
+    def test_db_connection_statement_timeout(self, database):
+
+        assert _get_statement_timeout(database) == "0"
+
+        with database.statement_timeout(1000):
+            assert _get_statement_timeout(database) == "1s"
+            with database.statement_timeout(None):
+                assert _get_statement_timeout(database) == "1s"
+        assert _get_statement_timeout(database) == "0"
+
+        # Timeout only applies to current transaction
+        with database.statement_timeout(1000):
+            database.session.commit()
+            assert _get_statement_timeout(database) == "0"
+        assert _get_statement_timeout(database) == "0"
+
+    def test_db_connection_lazy_engine(self):
+        db = DBConnection()
+        assert db.engine is None
+        db.set_db_url("postgresql://user@localhost/bemserver", pool_size=2)
+        engine = db.engine
+        assert engine.pool.size() == 2
+        assert db.engine is engine
+
+        pid = os.fork()
+        if pid == 0:
+            # Child process gets its own engine
+            child_engine = db.engine
+            os._exit(
+                0 if child_engine is not engine and
+                child_engine is db.engine else 1
+            )
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+        assert db.engine is engine
+
+        db.dispose()
+        assert db.engine is not engine
+
+    def test_db_connection_read_only(self):
+        db.set_db_url(
+            "postgresql://user@primary/bemserver",
+            replica_urls=(
+                "postgresql://user@replica_1/bemserver",
+                "postgresql://user@replica_2/bemserver",
+            ),
+        )
+        primary = db.engine
+        replica_1, replica_2 = db.replica_engines
+        select = sqla.select(Event)
+        insert = sqla.insert(Event)
+
+        assert db.session.get_bind(clause=select) is primary
+        with db.read_only():
+            replica = db.session.get_bind(clause=select)
+            assert replica in (replica_1, replica_2)
+            # Same replica for the whole context
+            assert db.session.get_bind(clause=select) is replica
+            # Writes go to primary
+            assert db.session.get_bind(clause=insert) is primary
+            with db.force_primary():
+                assert db.session.get_bind(clause=select) is primary
+            assert db.session.get_bind(clause=select) is replica
+        assert db.session.get_bind(clause=select) is primary
+        # Round-robin
+        with db.read_only():
+            assert db.session.get_bind(clause=select) is not replica
+        db.session.remove()
+        db.dispose()
+
+        # No replica: fall back to primary
+        db.set_db_url("postgresql://user@primary/bemserver")
+        with db.read_only():
+            assert db.session.get_bind(clause=select) is db.engine
+        db.session.remove()
+        db.dispose()
+
+    def test_db_connection_fork(self, database):
+
+        # Open a connection in parent process and give it back to the pool
+        assert database.session.execute(sqla.text("SELECT 1;")).scalar() == 1
+        database.session.commit()
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ret = database.session.execute(
+                    sqla.text("SELECT 1;")
+                ).scalar()
+                database.session.commit()
+                os._exit(0 if ret == 1 else 1)
+            except Exception:  # pylint: disable=broad-except
+                os._exit(1)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+
+        # Parent pooled connection was not closed by child
+        assert database.session.execute(sqla.text("SELECT 1;")).scalar() == 1
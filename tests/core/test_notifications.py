@@ -0,0 +1,59 @@
+"""Notifications tests"""
+import queue
+
+import pytest
+
+from bemserver.core.model import Event
+from bemserver.core.notifications import notifier, listen
+
+
+@pytest.fixture
+def event_notifier(database):
+    yield notifier
+    notifier.stop()
+
+
+class TestNotifier:
+
+    def test_notifier_event(self, event_notifier):
+
+        with event_notifier.subscription("event") as subscriber_1:
+            with event_notifier.subscription("event") as subscriber_2:
+
+                evt = Event.open(
+                    "observation_missing", "src", "TIMESERIES", 42)
+                for subscriber in (subscriber_1, subscriber_2):
+                    payload = subscriber.get(timeout=5)
+                    assert payload["operation"] == "insert"
+                    assert payload["event"]["id"] == evt.id
+                    assert payload["event"]["state"] == "NEW"
+
+            evt.extend()
+            payload = subscriber_1.get(timeout=5)
+            assert payload["operation"] == "update"
+            assert payload["event"]["state"] == "ONGOING"
+            # Unsubscribed
+            assert subscriber_2.empty()
+
+        # No notification before timeout
+        assert next(listen(subscriber_1, 0.1)) is None
+
+    def test_notifier_full_queue(self, event_notifier):
+
+        with event_notifier.subscription("event", maxsize=1) as subscriber:
+            Event.open("observation_missing", "src", "TIMESERIES", 1)
+            Event.open("observation_missing", "src", "TIMESERIES", 2)
+            payload = subscriber.get(timeout=5)
+            assert payload["event"]["target_id"] == 1
+            # Second notification is dropped
+            with pytest.raises(queue.Empty):
+                subscriber.get(timeout=1)
+
+    def test_notifier_callback(self, event_notifier):
+
+        payloads = queue.Queue()
+        callback = event_notifier.subscribe("event", callback=payloads.put)
+        assert callback is payloads.put
+        evt = Event.open("observation_missing", "src", "TIMESERIES", 42)
+        assert payloads.get(timeout=5)["event"]["id"] == evt.id
+        event_notifier.unsubscribe("event", callback)
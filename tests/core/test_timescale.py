@@ -0,0 +1,386 @@
+"""TimescaleDB hypertable management tests"""
+import datetime as dt
+
+import pytest
+
+import sqlalchemy as sqla
+
+from bemserver.core import timescale
+from bemserver.core.csv_io import tscsvio
+from bemserver.core.database import db
+from bemserver.core.model import (
+    Timeseries, TimeseriesData, TimeseriesDataRollup)
+
+
+def _get_compressed_chunks():
+    return db.session.execute(
+        sqla.text(
+            "SELECT chunk_name FROM timescaledb_information.chunks "
+            "WHERE hypertable_name = 'timeseries_data' AND is_compressed;"
+        )
+    ).all()
+
+
+class TestTimescale:
+
+    def test_timescale_configure_hypertable(self, database):
+
+        timescale.configure_hypertable(
+            chunk_time_interval="1 day", number_partitions=2
+        )
+        dimensions = db.session.execute(
+            sqla.text(
+                "SELECT column_name, time_interval, num_partitions "
+                "FROM timescaledb_information.dimensions "
+                "WHERE hypertable_name = 'timeseries_data' "
+                "ORDER BY dimension_number;"
+            )
+        ).all()
+        assert dimensions == [
+            ("timestamp", dt.timedelta(days=1), None),
+            ("timeseries_id", None, 2),
+        ]
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 24 * 30}, ),
+            indirect=True
+    )
+    def test_timescale_maintain_chunks(self, timeseries_data):
+
+        chunk_sizes = timescale.get_chunk_sizes()
+        assert len(chunk_sizes) > 1
+        for _, start, end, is_compressed, size in chunk_sizes:
+            assert start < end
+            assert not is_compressed
+            assert size > 0
+
+        chunk_names = {
+            f"_timescaledb_internal.{name}" for name, *_ in chunk_sizes
+        }
+        # Chunks modified by data insertion are maintained once
+        maintained = timescale.maintain_chunks()
+        assert maintained
+        assert set(maintained) <= chunk_names
+        assert timescale.maintain_chunks() == []
+
+        ts_0_id, _, start_dt, _ = timeseries_data[0]
+        tscsvio.import_csv(
+            f"Datetime,{ts_0_id}\n{start_dt.isoformat()},42\n"
+        )
+        maintained = timescale.maintain_chunks(reorder=False)
+        assert maintained
+        assert set(maintained) <= chunk_names
+        assert timescale.maintain_chunks(reorder=False) == []
+
+    def test_timescale_compression(self, timeseries_data):
+
+        ts_0_id, nb_tsd, start_dt, _ = timeseries_data[0]
+
+        assert not timescale.is_compression_enabled()
+        timescale.set_compression("7 days")
+        assert timescale.is_compression_enabled()
+        # Idempotent, policy is replaced
+        timescale.set_compression("30 days")
+        assert db.session.execute(
+            sqla.text(
+                "SELECT count(*) FROM timescaledb_information.jobs "
+                "WHERE hypertable_name = 'timeseries_data' "
+                "AND proc_name = 'policy_compression';"
+            )
+        ).scalar() == 1
+
+        assert timescale.compress_chunks("7 days") > 0
+        assert _get_compressed_chunks()
+        assert timescale.compress_chunks("7 days") == 0
+
+        # Data is still readable
+        assert db.session.query(TimeseriesData).count() == nb_tsd
+
+        # Only chunks containing timestamps are decompressed
+        compressed_chunks = _get_compressed_chunks()
+        chunks = timescale.decompress_chunks(db.session, [start_dt])
+        assert len(chunks) == 1
+        assert len(_get_compressed_chunks()) == len(compressed_chunks) - 1
+        timescale.recompress_chunks(db.session, chunks)
+        assert _get_compressed_chunks() == compressed_chunks
+
+        # Import in compressed chunks, including conflicting rows
+        tscsvio.import_csv(
+            "Datetime,{}\n{},69\n{},42\n".format(
+                ts_0_id,
+                start_dt.isoformat(),
+                (start_dt - dt.timedelta(days=1)).isoformat(),
+            )
+        )
+        assert db.session.query(TimeseriesData).count() == nb_tsd + 1
+        assert db.session.get(
+            TimeseriesData, (ts_0_id, start_dt)
+        ).value == 0
+        # Decompressed chunks are compressed again
+        assert _get_compressed_chunks() == compressed_chunks
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 48}, ),
+            indirect=True
+    )
+    def test_timescale_apply_retention(self, timeseries_data):
+
+        ts_0_id, _, start_dt, end_dt = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+
+        # Keep forever
+        assert timescale.apply_retention(rollup_interval="1 day") == (0, 0, 0)
+
+        # Timeseries 1 retention overrides default retention
+        db.session.get(Timeseries, ts_1_id).retention = (
+            dt.timedelta(days=365 * 100)
+        )
+        db.session.commit()
+
+        # Buckets spanning several batches are written once per batch
+        nb_buckets, nb_chunks, nb_rows = timescale.apply_retention(
+            retention="1 day", rollup_interval="1 day", batch_size=10
+        )
+        assert nb_buckets >= 2
+        assert (nb_chunks, nb_rows) == (0, 48)
+        assert not db.session.query(TimeseriesData).filter_by(
+            timeseries_id=ts_0_id).all()
+        assert db.session.query(TimeseriesData).filter_by(
+            timeseries_id=ts_1_id).count() == 48
+        rollups = db.session.query(
+            TimeseriesDataRollup.min,
+            TimeseriesDataRollup.avg,
+            TimeseriesDataRollup.max,
+            TimeseriesDataRollup.count,
+        ).filter_by(timeseries_id=ts_0_id).order_by(
+            TimeseriesDataRollup.timestamp).all()
+        assert rollups == [(0, 11.5, 23, 24), (24, 35.5, 47, 24)]
+
+        # Nothing left to roll up
+        assert timescale.apply_retention(
+            retention="1 day", rollup_interval="1 day"
+        ) == (0, 0, 0)
+
+        # Late data is merged into existing buckets
+        db.session.add(
+            TimeseriesData(
+                timestamp=start_dt + dt.timedelta(minutes=30),
+                timeseries_id=ts_0_id,
+                value=24,
+            )
+        )
+        db.session.commit()
+        assert timescale.apply_retention(
+            retention="1 day", rollup_interval="1 day"
+        ) == (1, 0, 1)
+        assert db.session.query(
+            TimeseriesDataRollup.min,
+            TimeseriesDataRollup.avg,
+            TimeseriesDataRollup.max,
+            TimeseriesDataRollup.count,
+        ).filter_by(timeseries_id=ts_0_id).order_by(
+            TimeseriesDataRollup.timestamp).first() == (0, 12, 24, 25)
+
+        # Aggregate export reads rollups
+        assert tscsvio.export_csv_bucket(
+            start_dt, end_dt, [ts_0_id, ts_1_id], "1 day", aggregation="max"
+        ) == (
+            f"Datetime,{ts_0_id},{ts_1_id}\n"
+            "2020-01-01T00:00:00+0000,24.0,23.0\n"
+            "2020-01-02T00:00:00+0000,47.0,47.0\n"
+        )
+
+        # All timeseries expire: chunks are dropped
+        db.session.get(Timeseries, ts_1_id).retention = None
+        db.session.commit()
+        nb_buckets, nb_chunks, nb_rows = timescale.apply_retention(
+            retention="1 day", rollup_interval="1 day"
+        )
+        assert nb_buckets == 2
+        assert nb_chunks > 0
+        assert nb_rows == 0
+        assert not db.session.query(TimeseriesData).all()
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 24 * 30}, ),
+            indirect=True
+    )
+    def test_timescale_apply_retention_compressed(self, timeseries_data):
+
+        ts_0_id, _, start_dt, _ = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+
+        # Timeseries 0 is kept, timeseries 1 expires 10 days after start
+        cutoff = start_dt + dt.timedelta(days=10)
+        db.session.get(Timeseries, ts_0_id).retention = (
+            dt.timedelta(days=365 * 100)
+        )
+        db.session.get(Timeseries, ts_1_id).retention = (
+            dt.datetime.now(dt.timezone.utc) - cutoff
+        )
+        db.session.commit()
+        timescale.set_compression()
+        assert timescale.compress_chunks("7 days") > 0
+
+        # Only chunks containing expired data are decompressed
+        assert timescale.apply_retention(rollup_interval="1 day") == (
+            10, 0, 24 * 10)
+        chunks = timescale.get_chunk_sizes()
+        assert [is_compressed for _, _, _, is_compressed, _ in chunks] == [
+            start >= cutoff for _, start, _, _, _ in chunks]
+
+        # Nothing expired: no chunk is decompressed
+        nb_compressed = len(_get_compressed_chunks())
+        assert timescale.apply_retention(rollup_interval="1 day") == (
+            0, 0, 0)
+        assert len(_get_compressed_chunks()) == nb_compressed
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 24 * 30}, ),
+            indirect=True
+    )
+    def test_timescale_purge_deleted_timeseries(self, timeseries_data):
+
+        ts_0_id, nb_tsd, start_dt, _ = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+
+        # Nothing to purge
+        assert timescale.purge_deleted_timeseries() == (0, 0)
+
+        # Data in compressed chunks and rollups
+        timescale.set_compression()
+        assert timescale.compress_chunks("7 days") > 0
+        db.session.add(
+            TimeseriesDataRollup(
+                timestamp=start_dt, timeseries_id=ts_0_id, count=1)
+        )
+        ts_0 = db.session.get(Timeseries, ts_0_id)
+        ts_0.deleted = True
+        db.session.commit()
+        assert timescale.get_purge_progress(None)[0] == 0
+
+        assert timescale.purge_deleted_timeseries(batch_size=100) == (
+            1, nb_tsd + 1)
+        assert db.session.get(Timeseries, ts_0_id) is None
+        assert db.session.query(TimeseriesData).count() == nb_tsd
+        assert not db.session.query(TimeseriesDataRollup).all()
+
+        # Data written to a deleted timeseries during purge
+        ts_1 = db.session.get(Timeseries, ts_1_id)
+        ts_1.deleted = True
+        ts_1.purged_until = start_dt + dt.timedelta(days=365)
+        db.session.commit()
+        chunks_purged, chunks_total = timescale.get_purge_progress(
+            ts_1.purged_until)
+        assert chunks_purged == chunks_total
+        assert timescale.purge_deleted_timeseries() == (0, 0)
+        assert db.session.get(Timeseries, ts_1_id).purged_until is None
+        assert timescale.purge_deleted_timeseries() == (1, nb_tsd)
+        assert not db.session.query(Timeseries).all()
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 24 * 30}, ),
+            indirect=True
+    )
+    def test_timescale_purge_deleted_timeseries_compressed(
+            self, timeseries_data):
+
+        ts_0_id, nb_tsd, _, _ = timeseries_data[0]
+
+        # First chunk contains no data of timeseries 0
+        chunk_name, _, chunk_end, _, _ = timescale.get_chunk_sizes()[0]
+        nb_chunk_rows = db.session.query(TimeseriesData).filter(
+            TimeseriesData.timeseries_id == ts_0_id,
+            TimeseriesData.timestamp < chunk_end,
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        assert nb_chunk_rows > 0
+        timescale.set_compression()
+        assert timescale.compress_chunks("7 days") > 0
+        assert (chunk_name, ) in _get_compressed_chunks()
+
+        db.session.get(Timeseries, ts_0_id).deleted = True
+        db.session.commit()
+        assert timescale.purge_deleted_timeseries() == (
+            1, nb_tsd - nb_chunk_rows)
+        # Chunk without data to purge is left compressed
+        assert (chunk_name, ) in _get_compressed_chunks()
+
+    @pytest.mark.parametrize(
+            'timeseries_data',
+            ({"nb_ts": 2, "nb_tsd": 24 * 30}, ),
+            indirect=True
+    )
+    def test_timescale_delete_data(self, timeseries_data):
+
+        ts_0_id, nb_tsd, start_dt, end_dt = timeseries_data[0]
+        ts_1_id, _, _, _ = timeseries_data[1]
+
+        def count(ts_id):
+            return db.session.query(TimeseriesData).filter_by(
+                timeseries_id=ts_id).count()
+
+        # Part of a chunk
+        assert timescale.delete_data(
+            start_dt, start_dt + dt.timedelta(hours=3), [ts_0_id]
+        ) == (0, 3)
+        assert count(ts_0_id) == nb_tsd - 3
+        assert count(ts_1_id) == nb_tsd
+
+        # Whole chunk: chunk is dropped
+        chunks = timescale.get_chunk_sizes()
+        _, chunk_start, chunk_end, _, _ = chunks[1]
+        nb_chunk_rows = db.session.query(TimeseriesData).filter(
+            TimeseriesData.timestamp >= chunk_start,
+            TimeseriesData.timestamp < chunk_end,
+        ).count()
+        assert timescale.delete_data(
+            chunk_start, chunk_end, [ts_0_id, ts_1_id]
+        ) == (1, 0)
+        assert len(timescale.get_chunk_sizes()) == len(chunks) - 1
+        assert count(ts_0_id) + count(ts_1_id) == (
+            2 * nb_tsd - 3 - nb_chunk_rows)
+
+        # Compressed chunks, with data of other timeseries
+        timescale.set_compression()
+        assert timescale.compress_chunks("7 days") > 0
+        nb_rows = count(ts_0_id)
+        assert timescale.delete_data(
+            start_dt, end_dt, [ts_0_id], batch_size=100
+        ) == (0, nb_rows)
+        assert count(ts_0_id) == 0
+        assert count(ts_1_id) == nb_tsd - nb_chunk_rows // 2
+
+        # Compressed chunks without data to delete are not decompressed
+        # Rollups starting in interval are deleted
+        db.session.add_all((
+            TimeseriesDataRollup(
+                timestamp=start_dt - dt.timedelta(days=1),
+                timeseries_id=ts_0_id,
+                count=1,
+            ),
+            TimeseriesDataRollup(
+                timestamp=start_dt, timeseries_id=ts_0_id, count=1),
+            TimeseriesDataRollup(
+                timestamp=start_dt, timeseries_id=ts_1_id, count=1),
+        ))
+        db.session.commit()
+        assert timescale.compress_chunks("7 days") > 0
+        nb_compressed = len(_get_compressed_chunks())
+        assert timescale.delete_data(start_dt, end_dt, [ts_0_id]) == (0, 1)
+        assert len(_get_compressed_chunks()) == nb_compressed
+        assert db.session.query(
+            TimeseriesDataRollup.timeseries_id,
+            TimeseriesDataRollup.timestamp,
+        ).order_by(
+            TimeseriesDataRollup.timeseries_id,
+            TimeseriesDataRollup.timestamp,
+        ).all() == [
+            (ts_0_id, start_dt - dt.timedelta(days=1)),
+            (ts_1_id, start_dt),
+        ]